@@ -0,0 +1,53 @@
+"""
+Helpers for timing benchmarks and saving their results.
+
+Results are appended to `benchmarks/results/<suite>.jsonl`, one line per run,
+tagged with the git version, so they can be compared between versions.
+"""
+from pathlib import Path
+import datetime
+import json
+import statistics
+import subprocess
+import time
+
+RESULTS_DIR = Path(__file__).resolve().parent.joinpath("results")
+
+def version():
+    """ Return `git describe` of the working tree, or "unknown" """
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                             text=True, cwd=RESULTS_DIR.parent)
+    except OSError:
+        return "unknown"
+    return out.stdout.strip() or "unknown"
+
+def timeit(func, repeat=5, number=1):
+    """ Call `func` `number` times, `repeat` times over. Returns dict of timing stats in seconds per call. """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+    return summarise(times)
+
+def summarise(times):
+    """ Return dict of min, median and max of `times` """
+    return {"min": min(times), "median": statistics.median(times), "max": max(times)}
+
+def saveResults(suite, results):
+    """ Append `results` dict for `suite` to the results file and print them """
+    RESULTS_DIR.mkdir(exist_ok=True)
+    record = {"version": version(),
+              "date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "results": results}
+    path = RESULTS_DIR.joinpath(f"{suite}.jsonl")
+    with open(path, "a") as fileobj:
+        fileobj.write(json.dumps(record) + "\n")
+    for name, value in results.items():
+        if isinstance(value, dict) and "median" in value:
+            print(f"{name:40s} {value['median']*1e3:10.3f} ms (min {value['min']*1e3:.3f} ms)")
+        else:
+            print(f"{name:40s} {value}")
+    print(f"Results saved to {path}")
@@ -0,0 +1,88 @@
+"""
+Benchmark GUI code paths on the Qt offscreen platform: building the encode
+command from the ffmpeg tab, loading stream info with dozens of streams, and
+the throughput of subprocess output into a :class:`CmdWidget`.
+
+The subprocess is a fake process writing megabytes of output, so no DVD drive
+or encoder is needed. Run from the repository root with
+
+    python -m benchmarks.gui [-n REPEAT] [--megabytes MB]
+"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# keep CmdWidget logs out of the user's state directory
+os.environ["XDG_STATE_HOME"] = tempfile.mkdtemp(prefix="drip-benchmark-")
+
+from .common import saveResults, timeit, summarise
+from . import samples
+from qtpy.QtWidgets import QApplication
+from qtpy.QtCore import QTimer
+import argparse
+import time
+
+_fakeProcess = """
+import sys
+line = ("x" * 99 + "\\n").encode()
+chunk = line * 1000
+for _ in range({count}):
+    sys.stdout.buffer.write(chunk)
+"""
+
+def throughput(app, megabytes=20, repeat=3):
+    """ Return timing stats for `megabytes` of output from a subprocess to a CmdWidget """
+    from drip.cmdwidget import CmdWidget
+    from drip.subprocessthread import ProcessRunner
+    from drip.processmanager import ProcessManager
+
+    count = max(1, megabytes * 10)
+    cmd = [sys.executable, "-c", _fakeProcess.format(count=count)]
+    times = []
+    for _ in range(repeat):
+        widget = CmdWidget(logName="benchmark")
+        runner = ProcessRunner(manager=ProcessManager())
+        runner.connectCmdWidget(widget)
+        runner.finished.connect(app.quit)
+        t0 = time.perf_counter()
+        runner.start(cmd)
+        QTimer.singleShot(600000, app.quit)
+        app.exec_()
+        times.append(time.perf_counter() - t0)
+        widget.closeLog()
+        widget.deleteLater()
+    results = {"cmdwidget.throughput": summarise(times)}
+    results["cmdwidget.throughput.lines"] = count * 1000
+    results["cmdwidget.throughput.MBps"] = count * 1000 * 100 / 1e6 / min(times)
+    return results
+
+def run(repeat=5, megabytes=20):
+    app = QApplication.instance() or QApplication(sys.argv)
+    from drip.ffmpegwidget import FfmpegWidget
+
+    results = {}
+    widget = FfmpegWidget()
+    text = samples.ffprobeOutput()
+
+    def loadStreams():
+        widget.paramWidget.clearStreams()
+        widget._loadProbe(text)
+    results["ffmpegwidget.loadStreams"] = timeit(loadStreams, repeat=repeat)
+
+    for stream in widget.paramWidget.streamInfo:
+        stream.setSelected(2)
+    results["paramview.getParams"] = timeit(widget.paramWidget.getParams, repeat=repeat, number=100)
+
+    results.update(throughput(app, megabytes=megabytes, repeat=min(repeat, 3)))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument("--megabytes", type=int, default=20, help="Size of fake process output")
+    args = parser.parse_args(argv)
+    saveResults("gui", run(args.repeat, args.megabytes))
+
+if __name__ == '__main__':
+    main()
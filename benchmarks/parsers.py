@@ -0,0 +1,79 @@
+"""
+Benchmark parsing tool output and building commands. These don't need Qt.
+
+Run from the repository root with
+
+    python -m benchmarks.parsers [-n REPEAT]
+"""
+from .common import saveResults, timeit
+from . import samples
+from drip.discinfo import parseDiscInfo
+from drip.probe import ProbeResult, ProbeCache
+from drip.ffmpegprogress import FfmpegProgressParser
+from drip import commands
+import argparse
+import json
+import os
+import tempfile
+
+def _progressOutput(numUpdates=10000):
+    lines = []
+    for n in range(numUpdates):
+        lines += [f"frame={n * 25}", "fps=250.0", "bitrate=1500.0kbits/s",
+                  f"total_size={n * 187500}", f"out_time_us={n * 1000000}", "speed=10.0x",
+                  "progress=continue"]
+    return lines
+
+def run(repeat=5):
+    results = {}
+
+    info = samples.dvdbackupInfo()
+    parsed = parseDiscInfo(info)
+    assert parsed.name == "BENCHMARK_DISC" and len(parsed.titles) == 990
+    results["discinfo.parse"] = timeit(lambda: parseDiscInfo(info), repeat=repeat)
+    results["discinfo.parse.bytes"] = len(info)
+
+    text = samples.ffprobeOutput()
+    assert len(ProbeResult.fromJson(text).streams) == 49
+    results["probe.fromJson.text"] = timeit(lambda: ProbeResult.fromJson(text), repeat=repeat, number=10)
+    data = json.loads(text)
+    results["probe.fromJson"] = timeit(lambda: ProbeResult.fromJson(data), repeat=repeat, number=10)
+
+    # reopening a probed input: look up the cached ffprobe output, then parse it
+    with tempfile.TemporaryDirectory() as tmpdir:
+        vob = os.path.join(tmpdir, "output.vob")
+        with open(vob, "wb") as fileobj:
+            fileobj.write(b"\0" * 2048)
+        cache = ProbeCache(os.path.join(tmpdir, "probe.json"))
+        cache.set(vob, data)
+        assert len(ProbeResult.fromJson(cache.get(vob)).streams) == 49
+        results["probe.cachedFromJson"] = timeit(lambda: ProbeResult.fromJson(cache.get(vob)),
+                                                 repeat=repeat, number=10)
+
+    streams = ProbeResult.fromJson(data).streams
+    for stream in streams:
+        stream.setSelected(2)
+        if stream.stype in ["audio", "subtitle"]:
+            stream.setMetadata(language=stream.language, title="Title")
+    results["commands.encodeCmd"] = timeit(
+        lambda: commands.encodeCmd("/tmp/output.vob", "/tmp", streams=streams, threads=8),
+        repeat=repeat, number=100)
+
+    lines = _progressOutput()
+    def parseProgress():
+        parser = FfmpegProgressParser(duration=7200)
+        for line in lines:
+            parser.feed(line)
+    results["ffmpegprogress.feed"] = timeit(parseProgress, repeat=repeat)
+    results["ffmpegprogress.feed.lines"] = len(lines)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    saveResults("parsers", run(args.repeat))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Synthetic tool output for benchmarks, so they run without a DVD drive or ffmpeg.
+"""
+import json
+
+def dvdbackupInfo(numTitleSets=99, titlesPerSet=10, name="BENCHMARK_DISC"):
+    """ Return `dvdbackup -I` output for a disc with `numTitleSets` title sets """
+    lines = [f'DVD-Video information of the DVD with title "{name}"', "", "File Structure DVD:",
+             "VIDEO_TS/", "\tVIDEO_TS.IFO\t    12288\t     12288",
+             "\tVIDEO_TS.VOB\t   157696\t    157696", "\tVIDEO_TS.BUP\t    12288\t     12288"]
+    for ts in range(1, numTitleSets + 1):
+        lines.append(f"\tVTS_{ts:02d}_0.IFO\t    67584\t     67584")
+        for part in range(1, 10):
+            lines.append(f"\tVTS_{ts:02d}_{part}.VOB\t1073709056\t1073709056")
+        lines.append(f"\tVTS_{ts:02d}_0.BUP\t    67584\t     67584")
+    lines += ["", "Main feature:",
+              "\tTitle set containing the main feature is 1",
+              "\tThe aspect ratio of the main feature is 16:9",
+              "\tThe main feature has 1 angle",
+              "\tThe main feature has 8 audio tracks",
+              "\tThe main feature has 32 subpictures",
+              "\tThe main feature has a maximum of 99 chapters in one of its titles",
+              "\tThe main feature has a maximum of 6 audio channels in one of its titles",
+              "", "Title Sets:", ""]
+    title = 1
+    for ts in range(1, numTitleSets + 1):
+        lines += [f"\tTitle set {ts}",
+                  f"\t\tThe aspect ratio of title set {ts} is 16:9",
+                  f"\t\tTitle set {ts} has 1 angle",
+                  f"\t\tTitle set {ts} has 8 audio tracks",
+                  f"\t\tTitle set {ts} has 32 subpictures",
+                  "", f"\t\tTitles included in title set {ts} is/are"]
+        for _ in range(titlesPerSet):
+            lines += [f"\t\t\tTitle {title}:",
+                      f"\t\t\t\tTitle {title} has 99 chapters",
+                      f"\t\t\t\tTitle {title} has 6 audio channels"]
+            title += 1
+        lines.append("")
+    lines.append("Completed with returncode 0")
+    return "\n".join(lines) + "\n"
+
+def ffprobeJson(numAudio=16, numSubtitle=32):
+    """ Return ffprobe JSON output (as a dict) for a title with many streams """
+    streams = [{"index": 0, "codec_name": "mpeg2video", "codec_type": "video", "width": 720,
+                "height": 576, "display_aspect_ratio": "16:9", "avg_frame_rate": "25/1",
+                "duration": "7200.000000", "disposition": {"default": 1, "forced": 0}}]
+    languages = ["eng", "fre", "ger", "spa", "ita", "jpn", "dut", "swe"]
+    for n in range(numAudio):
+        streams.append({"index": len(streams), "codec_name": "ac3", "codec_type": "audio",
+                        "sample_rate": "48000", "channel_layout": "5.1(side)",
+                        "tags": {"language": languages[n % len(languages)]},
+                        "disposition": {"default": int(n == 0), "forced": 0}})
+    for n in range(numSubtitle):
+        streams.append({"index": len(streams), "codec_name": "dvd_subtitle",
+                        "codec_type": "subtitle", "width": 720, "height": 576,
+                        "tags": {"language": languages[n % len(languages)]},
+                        "disposition": {"default": 0, "forced": int(n % 4 == 3)}})
+    return {"streams": streams,
+            "format": {"filename": "output.vob", "nb_streams": len(streams),
+                       "format_name": "mpeg", "duration": "7200.000000", "size": "8589934592"}}
+
+def ffprobeOutput(**kwargs):
+    """ Return ffprobe output text, which is just the JSON, as ffprobe's log is turned off """
+    return json.dumps(ffprobeJson(**kwargs), indent=4)
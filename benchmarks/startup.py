@@ -0,0 +1,65 @@
+"""
+Benchmark DRip GUI startup: time to import, construct the window and first paint.
+
+Each run is a fresh Python process using the Qt offscreen platform. Run from
+the repository root with
+
+    python -m benchmarks.startup [-n RUNS]
+"""
+from .common import saveResults, summarise
+from pathlib import Path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+_child = """
+import time
+t0 = time.perf_counter()
+import json, sys
+from qtpy.QtWidgets import QApplication
+from qtpy.QtCore import QObject, QEvent, QTimer
+app = QApplication(sys.argv)
+t1 = time.perf_counter()
+from drip.drip import DRip
+t2 = time.perf_counter()
+window = DRip()
+t3 = time.perf_counter()
+times = {}
+
+class PaintFilter(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "paint" not in times:
+            times["paint"] = time.perf_counter() - t0
+            QTimer.singleShot(0, app.quit)
+        return False
+
+paintFilter = PaintFilter()
+window.installEventFilter(paintFilter)
+window.show()
+QTimer.singleShot(5000, app.quit)
+app.exec_()
+times.update({"qt": t1 - t0, "import": t2 - t1, "construct": t3 - t2})
+print(json.dumps(times))
+"""
+
+def run(numRuns=5):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    root = Path(__file__).resolve().parent.parent
+    runs = []
+    for _ in range(numRuns):
+        out = subprocess.run([sys.executable, "-c", _child], capture_output=True, text=True,
+                             env=env, cwd=root, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {f"startup.{key}": summarise([r[key] for r in runs if key in r])
+            for key in ["qt", "import", "construct", "paint"]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+    saveResults("startup", run(args.runs))
+
+if __name__ == '__main__':
+    main()
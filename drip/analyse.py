@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detect letterbox bars and interlacing by analysing short samples of a title.
+
+ffmpeg's cropdetect and idet filters are run on samples from evenly spaced
+points in the input, several at a time. The crop rectangles of all samples are
+combined into one which keeps all of the picture, and the idet counts are
+combined to decide whether the title is progressive, interlaced (and with
+which field order) or telecined. The result is a video filter for the encode.
+
+The result is printed as the last line of output, in the form
+
+    Result: {"crop": "720:432:0:72", "scan": "interlaced", "filter": "...", ...}
+
+and is also written as JSON to `--output`, if given.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+INPUT_ARGS = ["-analyzeduration", "100M", "-probesize", "100M"]
+
+MIN_CROP = 8
+""" Only crop if at least this many pixels would be removed from the width or height """
+
+INTERLACED_THRESHOLD = 0.1
+""" Fraction of frames idet finds interlaced, above which the title is deinterlaced """
+
+TELECINE_THRESHOLD = 0.1
+""" Fraction of frames with repeated fields, above which the title is inverse telecined """
+
+_cropRe = re.compile(r"x1:(?P<x1>-?\d+) x2:(?P<x2>-?\d+) y1:(?P<y1>-?\d+) y2:(?P<y2>-?\d+)")
+_idetMultiRe = re.compile(r"Multi frame detection: TFF:\s*(?P<tff>\d+) BFF:\s*(?P<bff>\d+) "
+                          r"Progressive:\s*(?P<progressive>\d+) Undetermined:\s*(?P<undetermined>\d+)")
+_idetRepeatRe = re.compile(r"Repeated Fields: Neither:\s*(?P<neither>\d+) Top:\s*(?P<top>\d+) "
+                           r"Bottom:\s*(?P<bottom>\d+)")
+_sizeRe = re.compile(r"Video: .*?(?P<width>\d{2,5})x(?P<height>\d{2,5})")
+
+def duration(inpath):
+    """ Return duration of `inpath` in seconds """
+    cmd = ["ffprobe", "-v", "error"] + INPUT_ARGS
+    cmd += ["-show_entries", "format=duration", "-of", "csv=p=0", inpath]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return float(out.strip())
+
+def sampleStarts(total, numSamples, sampleDuration):
+    """ Return start times of `numSamples` evenly spaced samples, avoiding the first and last 5% """
+    start, end = 0.05 * total, 0.95 * total
+    if end - start <= sampleDuration:
+        return [0]
+    step = (end - start - sampleDuration) / max(1, numSamples - 1)
+    return [start + n * step for n in range(numSamples)]
+
+def analyseSample(inpath, start, sampleDuration):
+    """ Run cropdetect and idet on one sample. Returns dict of results, or None if ffmpeg failed. """
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-nostats"] + INPUT_ARGS
+    cmd += ["-ss", f"{start:.3f}", "-i", inpath, "-t", f"{sampleDuration:.3f}", "-map", "0:v:0",
+            "-vf", "idet,cropdetect=limit=24:round=2:reset=0", "-an", "-sn", "-dn", "-f", "null", "-"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    sample = {"crop": None, "size": None, "idet": None, "repeated": None}
+    for line in result.stderr.splitlines():
+        if (m := _cropRe.search(line)) is not None:
+            # with reset=0, the last line covers the whole sample
+            sample["crop"] = {k: int(v) for k, v in m.groupdict().items()}
+        elif (m := _idetMultiRe.search(line)) is not None:
+            sample["idet"] = {k: int(v) for k, v in m.groupdict().items()}
+        elif (m := _idetRepeatRe.search(line)) is not None:
+            sample["repeated"] = {k: int(v) for k, v in m.groupdict().items()}
+        elif sample["size"] is None and (m := _sizeRe.search(line)) is not None:
+            sample["size"] = (int(m.group("width")), int(m.group("height")))
+    return sample
+
+def combineCrop(samples):
+    """ Return (width, height, x, y) of the smallest crop keeping the picture of all samples, or None """
+    crops = [s["crop"] for s in samples if s["crop"] is not None]
+    sizes = [s["size"] for s in samples if s["size"] is not None]
+    if not crops or not sizes:
+        return None
+    width, height = sizes[0]
+    x1 = max(0, min(c["x1"] for c in crops))
+    y1 = max(0, min(c["y1"] for c in crops))
+    x2 = min(width - 1, max(c["x2"] for c in crops))
+    y2 = min(height - 1, max(c["y2"] for c in crops))
+    if x2 <= x1 or y2 <= y1:
+        # all samples were black
+        return None
+    # even offsets and sizes, for 4:2:0 chroma
+    x1 -= x1 % 2
+    y1 -= y1 % 2
+    w = x2 - x1 + 1
+    h = y2 - y1 + 1
+    w += w % 2
+    h += h % 2
+    w, h = min(w, width - x1), min(h, height - y1)
+    if width - w < MIN_CROP and height - h < MIN_CROP:
+        return None
+    return w, h, x1, y1
+
+def combineScan(samples):
+    """ Return ('progressive', 'interlaced' or 'telecine', field order, combined idet counts) """
+    counts = {"tff": 0, "bff": 0, "progressive": 0, "undetermined": 0}
+    repeated = {"neither": 0, "top": 0, "bottom": 0}
+    for sample in samples:
+        for key, value in (sample["idet"] or {}).items():
+            counts[key] += value
+        for key, value in (sample["repeated"] or {}).items():
+            repeated[key] += value
+    interlaced = counts["tff"] + counts["bff"]
+    detected = interlaced + counts["progressive"]
+    fieldOrder = "tff" if counts["tff"] >= counts["bff"] else "bff"
+    frames = sum(repeated.values())
+    if frames and (repeated["top"] + repeated["bottom"]) / frames > TELECINE_THRESHOLD:
+        scan = "telecine"
+    elif detected and interlaced / detected > INTERLACED_THRESHOLD:
+        scan = "interlaced"
+    else:
+        scan = "progressive"
+    return scan, fieldOrder, dict(counts, **{f"repeated_{k}": v for k, v in repeated.items()})
+
+def videoFilter(crop, scan, fieldOrder):
+    """ Return ffmpeg video filter for the analysis results, or None if no filter is needed """
+    filters = []
+    if scan == "telecine":
+        filters.append("fieldmatch,yadif=deint=interlaced,decimate")
+    elif scan == "interlaced":
+        filters.append(f"bwdif=mode=send_frame:parity={fieldOrder}:deint=all")
+    if crop is not None:
+        filters.append("crop={}:{}:{}:{}".format(*crop))
+    return ",".join(filters) if filters else None
+
+def analyse(inpath, numSamples=12, sampleDuration=5, jobs=None, log=print):
+    """ Analyse samples of `inpath`. Returns dict of results. """
+    if jobs is None:
+        jobs = os.cpu_count()
+    starts = sampleStarts(duration(inpath), numSamples, sampleDuration)
+    log(f"Analysing {len(starts)} samples of {sampleDuration}s, {jobs} at a time")
+    with ThreadPoolExecutor(jobs) as executor:
+        samples = list(executor.map(lambda t: analyseSample(inpath, t, sampleDuration), starts))
+    for t, sample in zip(starts, samples):
+        if sample is None:
+            log(f"{t:8.1f}s: failed")
+        else:
+            crop = sample["crop"]
+            cropText = "no crop" if crop is None else \
+                f"x {crop['x1']}-{crop['x2']}, y {crop['y1']}-{crop['y2']}"
+            log(f"{t:8.1f}s: {cropText}, idet {sample['idet']}")
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        raise RuntimeError(f"Could not analyse any samples of {inpath}")
+    crop = combineCrop(samples)
+    scan, fieldOrder, counts = combineScan(samples)
+    return {"crop": "{}:{}:{}:{}".format(*crop) if crop is not None else None,
+            "size": "{}x{}".format(*samples[0]["size"]) if samples[0]["size"] else None,
+            "scan": scan, "fieldOrder": fieldOrder, "idet": counts,
+            "filter": videoFilter(crop, scan, fieldOrder)}
+
+def parseResult(text):
+    """ Return dict from the 'Result: ' line in `text`, or None """
+    for line in reversed(text.splitlines()):
+        if line.startswith("Result: "):
+            return json.loads(line[len("Result: "):])
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("input", help="Input file or ffmpeg URL")
+    parser.add_argument("-n", "--samples", type=int, default=12, help="Number of samples")
+    parser.add_argument("-d", "--sample-duration", type=float, default=5,
+                        help="Duration of each sample, in seconds")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of samples to analyse at once")
+    parser.add_argument("-o", "--output", help="Write the result as JSON to this file")
+    args = parser.parse_args(argv)
+
+    log = lambda msg: print(msg, flush=True)
+    try:
+        result = analyse(args.input, args.samples, args.sample_duration, args.jobs, log=log)
+    except (RuntimeError, ValueError, OSError, subprocess.CalledProcessError) as err:
+        print(err, file=sys.stderr)
+        return 1
+    if args.output is not None:
+        with open(args.output, "w") as fileobj:
+            json.dump(result, fileobj)
+    log(f"Result: {json.dumps(result)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
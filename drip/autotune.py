@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Choose an x264 preset and thread count by encoding short samples of a title.
+
+Samples are taken from evenly spaced points in the input and encoded (video
+only) with each combination of preset and thread count, one combination at
+a time, so that the speeds aren't skewed by other sample encodes. The fastest
+combination whose output is no more than `--size-tolerance` larger than the
+smallest output, and which encodes at least `--min-fps` frames per second, is
+chosen.
+
+The ffmpeg command for the full encode should be given after '--', in the form
+generated by :func:`commands.encodeCmd`. The result is printed as the last line
+of output, in the form
+
+    Result: {"preset": "faster", "threads": 8, ...}
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower",
+           "veryslow"]
+
+DEFAULT_PRESETS = ["veryfast", "faster", "fast", "medium", "slow"]
+
+_skipOptions = ["-map", "-threads", "-preset", "-codec:a", "-codec:s", "-c:a", "-c:s", "-acodec",
+                "-scodec"]
+
+@dataclass
+class TuneResult:
+    """ Combined result of encoding all samples with one preset and thread count """
+    preset: str
+    threads: int
+    frames: int = 0
+    seconds: float = 0
+    size: int = 0
+    ok: bool = True
+
+    @property
+    def fps(self):
+        return self.frames / self.seconds if self.seconds else 0
+
+    def __str__(self):
+        if not self.ok:
+            return f"{self.preset:>10} {self.threads:3d} threads: failed"
+        return (f"{self.preset:>10} {self.threads:3d} threads: {self.fps:7.1f} fps, "
+                f"{self.size / 1024**2:7.2f} MiB")
+
+def splitCmd(cmd):
+    """ Return input options, input and video options from ffmpeg command `cmd` """
+    if "-i" not in cmd:
+        raise ValueError("ffmpeg command has no input")
+    idx = cmd.index("-i")
+    inputOptions = []
+    args = iter(cmd[1:idx])
+    for arg in args:
+        if arg == "-progress":
+            next(args)
+        elif arg != "-nostats":
+            inputOptions.append(arg)
+    videoOptions = []
+    args = cmd[idx+2:-1]
+    for name, value in zip(args[::2], args[1::2]):
+        if name not in _skipOptions and not name.startswith("-metadata"):
+            videoOptions += [name, value]
+    return inputOptions, cmd[idx+1], videoOptions
+
+def duration(inputOptions, inpath):
+    """ Return duration of `inpath` in seconds """
+    cmd = ["ffprobe", "-v", "error"] + inputOptions
+    cmd += ["-show_entries", "format=duration", "-of", "csv=p=0", inpath]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return float(out.strip())
+
+def sampleStarts(total, numSamples, sampleDuration):
+    """ Return start times of `numSamples` evenly spaced samples in `total` seconds """
+    if total <= sampleDuration * numSamples:
+        return [0]
+    return [total * (n + 0.5) / numSamples - sampleDuration / 2 for n in range(numSamples)]
+
+def encodeSample(ffmpeg, inputOptions, inpath, videoOptions, start, sampleDuration, preset,
+                 threads, outpath):
+    """ Encode one sample. Returns (frames, seconds, size), or None if the encode failed. """
+    cmd = [ffmpeg, "-y", "-nostdin", "-v", "error", "-nostats", "-progress", "pipe:1"]
+    cmd += inputOptions + ["-ss", f"{start:.3f}", "-i", inpath, "-t", f"{sampleDuration:.3f}"]
+    cmd += ["-map", "0:v:0", "-an", "-sn", "-dn", "-threads", str(threads)] + videoOptions
+    cmd += ["-preset", preset, outpath]
+    t0 = time.monotonic()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    seconds = time.monotonic() - t0
+    if result.returncode != 0:
+        return None
+    frames = 0
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("=")
+        if key == "frame":
+            frames = int(value)
+    return frames, seconds, os.path.getsize(outpath)
+
+def tune(cmd, presets=None, threads=None, numSamples=3, sampleDuration=10, log=print):
+    """ Encode samples of the input of ffmpeg `cmd` with each preset and thread count
+
+        Combinations are encoded one after another, so each is measured with
+        the whole machine to itself, as the full encode will be. Returns list
+        of :class:`TuneResult`.
+    """
+    if presets is None:
+        presets = DEFAULT_PRESETS
+    if threads is None:
+        cores = os.cpu_count()
+        threads = sorted({cores, max(1, cores // 2)})
+    inputOptions, inpath, videoOptions = splitCmd(cmd)
+    starts = sampleStarts(duration(inputOptions, inpath), numSamples, sampleDuration)
+    log(f"Encoding {len(starts)} samples of {sampleDuration}s with {len(presets)} presets "
+        f"and {len(threads)} thread counts")
+
+    results = [TuneResult(preset, t) for preset in presets for t in threads]
+    with tempfile.TemporaryDirectory(prefix="drip-tune-") as tmpdir:
+        for n, result in enumerate(results):
+            for m, start in enumerate(starts):
+                outpath = os.path.join(tmpdir, f"{n}-{m}.mkv")
+                sample = encodeSample(cmd[0], inputOptions, inpath, videoOptions, start,
+                                      sampleDuration, result.preset, result.threads, outpath)
+                if sample is None:
+                    result.ok = False
+                    break
+                frames, seconds, size = sample
+                result.frames += frames
+                result.seconds += seconds
+                result.size += size
+                os.remove(outpath)
+            log(str(result))
+    return results
+
+def choose(results, sizeTolerance=0.1, minFps=None):
+    """ Return the fastest result which meets the size and fps targets, or None
+
+        Output size must be within `sizeTolerance` (as a fraction) of the smallest
+        output. If no result meets both targets, the smallest result meeting the
+        fps target is returned, or the fastest result if none do.
+    """
+    results = [r for r in results if r.ok and r.frames]
+    if not results:
+        return None
+    maxSize = min(r.size for r in results) * (1 + sizeTolerance)
+    fastEnough = [r for r in results if minFps is None or r.fps >= minFps]
+    candidates = [r for r in fastEnough if r.size <= maxSize]
+    if candidates:
+        return max(candidates, key=lambda r: r.fps)
+    if fastEnough:
+        return min(fastEnough, key=lambda r: r.size)
+    return max(results, key=lambda r: r.fps)
+
+def parseResult(text):
+    """ Return dict from the 'Result: ' line in `text`, or None """
+    for line in reversed(text.splitlines()):
+        if line.startswith("Result: "):
+            return json.loads(line[len("Result: "):])
+    return None
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" not in argv:
+        print("ffmpeg command should be given after '--'", file=sys.stderr)
+        return 2
+    idx = argv.index("--")
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-p", "--presets", nargs="+", choices=PRESETS, help="Presets to try")
+    parser.add_argument("-t", "--threads", nargs="+", type=int, help="Thread counts to try")
+    parser.add_argument("-n", "--samples", type=int, default=3, help="Number of samples")
+    parser.add_argument("-d", "--sample-duration", type=float, default=10,
+                        help="Duration of each sample, in seconds")
+    parser.add_argument("--size-tolerance", type=float, default=10,
+                        help="Acceptable size increase over the smallest output, as a percentage")
+    parser.add_argument("--min-fps", type=float, help="Minimum acceptable frames per second")
+    args = parser.parse_args(argv[:idx])
+
+    # exit on SIGTERM from the process manager, so the sample directory is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    log = lambda msg: print(msg, flush=True)
+    try:
+        results = tune(argv[idx+1:], presets=args.presets, threads=args.threads,
+                       numSamples=args.samples, sampleDuration=args.sample_duration, log=log)
+    except (ValueError, OSError, subprocess.CalledProcessError) as err:
+        print(err, file=sys.stderr)
+        return 1
+    best = choose(results, args.size_tolerance / 100, args.min_fps)
+    if best is None:
+        print("No samples encoded successfully", file=sys.stderr)
+        return 1
+    log(f"Result: {json.dumps(dict(asdict(best), fps=best.fps))}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
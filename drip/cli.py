@@ -0,0 +1,362 @@
+"""
+Command line interface to rip, concatenate and encode DVDs without the GUI.
+
+This does not import Qt, so it can be used on headless machines.
+"""
+from . import commands, discinfo, vobcat, autotune, analyse, drives, history, library
+from .probe import ProbeResult, probeCmd
+from .paths import cacheDir
+from .processmanager import stagePolicy
+from .priority import policyCmd
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+class _ParsingWriter:
+    """ Write dvdbackup info to stdout and parse it """
+
+    def __init__(self):
+        self.parser = discinfo.DiscInfoParser()
+
+    def write(self, text):
+        sys.stdout.write(text)
+        self.parser.feed(text)
+
+    def flush(self):
+        sys.stdout.flush()
+
+def _run(cmd, log=None):
+    """ Run `cmd` with the policy for its stage, writing its output to stdout or file `log`
+
+        Returns returncode.
+    """
+    print(" ".join(cmd), flush=True)
+    if (policy := stagePolicy(commands.stageFor(cmd))) and shutil.which(cmd[0]) is not None:
+        cmd = policyCmd(policy, cmd)
+    if log is None:
+        return subprocess.run(cmd).returncode
+    with open(log, "w") as fileobj:
+        return subprocess.run(cmd, stdout=fileobj, stderr=subprocess.STDOUT).returncode
+
+def getInfo(device, useCache=True):
+    """ Print info for the DVD in `device` and return :class:`DiscInfo` """
+    writer = _ParsingWriter()
+    rc = discinfo.getInfo(device, cacheDir=cacheDir("discinfo") if useCache else None, out=writer)
+    if rc != 0:
+        raise RuntimeError(f"Could not get DVD info from {device}")
+    return writer.parser.finish()
+
+def rip(device, outdir, title=None, useCache=True, log=None, info=None):
+    """ Rip `title` from `device` to `outdir`. Returns the path of the ripped VIDEO_TS directory.
+
+        If `title` is None, the main title is ripped. If the :class:`DiscInfo` 
+        `info` is not given, it is read from the disc. If there is a rip 
+        library, the title is linked from it if it has been ripped before.
+    """
+    if info is None:
+        info = getInfo(device, useCache=useCache)
+    if not info.name:
+        raise RuntimeError(f"Could not get DVD name from {device}")
+    if title is None:
+        if (mainTitle := info.mainTitle) is None:
+            raise RuntimeError(f"Could not find the main title on {device}")
+        title = mainTitle.num
+    chapters = next((t.chapters for t in info.titles if t.num == title), None)
+    os.makedirs(outdir, exist_ok=True)
+    cmd = commands.ripCmd(device, outdir, title, name=info.name, chapters=chapters,
+                          fingerprint=info.fingerprint)
+    if _run(cmd, log=log) != 0:
+        raise RuntimeError(f"Failed to rip title {title} from {device}; run again to resume")
+    return commands.vobPath(outdir, info.name)
+
+def cat(path, outpath=None):
+    """ Concatenate title VOBs in `path`. Returns the path of the output file. """
+    if outpath is None:
+        outpath = os.path.join(path, "output.vob")
+    if vobcat.main([path, outpath]) != 0:
+        raise RuntimeError(f"Failed to concatenate VOBs in {path}")
+    return outpath
+
+def _outdir(inpath, outdir):
+    if outdir is None:
+        outdir = inpath if os.path.isdir(inpath) else os.path.dirname(inpath)
+    return outdir
+
+def remux(inpath, outdir=None, log=None):
+    """ Copy the streams of `inpath` to 'output.mkv' in `outdir`, without re-encoding """
+    outdir = _outdir(inpath, outdir)
+    if _run(commands.remuxCmd(inpath, outdir, progress=False), log=log) != 0:
+        raise RuntimeError(f"Failed to remux {inpath}")
+    return os.path.join(outdir, "output.mkv")
+
+def encode(inpath, outdir=None, threads=None, crf=21, preset=None, videoFilter=None,
+           parallel=False, resumable=False, replace=False, log=None, fingerprint=None, title=None):
+    """ Encode `inpath` (a file or directory of VOBs) to 'output.mkv' in `outdir`
+
+        If `replace` is True, the encode runs at idle priority and replaces
+        any existing output (e.g. from :func:`remux`) only when it is complete.
+        If the disc `fingerprint` and `title` are given and there is a rip
+        library, the encode is linked from it if it has been done before.
+    """
+    outdir = _outdir(inpath, outdir)
+    cmd = commands.encodeCmd(inpath, outdir, threads=threads, crf=crf, preset=preset,
+                             videoFilter=videoFilter, parallel=parallel, resumable=resumable,
+                             progress=False)
+    if replace:
+        cmd = commands.replaceCmd(cmd)
+    cmd = commands.libraryCmd(cmd, fingerprint, title)
+    if _run(cmd, log=log) != 0:
+        raise RuntimeError(f"Failed to encode {inpath}")
+    return os.path.join(outdir, "output.mkv")
+
+def analyseInput(inpath):
+    """ Detect crop and interlacing of `inpath`. Returns the video filter, or None. """
+    out = subprocess.run(commands.analyseCmd(inpath), stdout=subprocess.PIPE, text=True).stdout
+    sys.stdout.write(out)
+    if (result := analyse.parseResult(out)) is None:
+        raise RuntimeError(f"Could not analyse {inpath}")
+    return result['filter']
+
+def tune(inpath, crf=21, sizeTolerance=10, minFps=None):
+    """ Encode samples of `inpath` to choose a preset and thread count. Returns result dict. """
+    cmd = commands.tuneCmd(inpath, os.path.dirname(os.path.abspath(inpath)), crf=crf,
+                           sizeTolerance=sizeTolerance, minFps=minFps)
+    out = subprocess.run(cmd, stdout=subprocess.PIPE, text=True).stdout
+    sys.stdout.write(out)
+    if (result := autotune.parseResult(out)) is None:
+        raise RuntimeError(f"Could not auto-tune encode of {inpath}")
+    return result
+
+def probe(inpath):
+    """ Print stream info for `inpath` """
+    out = subprocess.run(probeCmd(inpath), capture_output=True, check=True).stdout
+    result = ProbeResult.fromJson(out.decode())
+    if result.duration is not None:
+        print(f"Duration: {result.duration:.2f}s")
+    for stream in result.streams:
+        print(stream.label)
+
+def _analyseAndEncode(detect, inpath, outdir, log=None, **kwargs):
+    videoFilter = analyseInput(inpath) if detect else None
+    return encode(inpath, outdir, videoFilter=videoFilter, log=log, **kwargs)
+
+def runJobs(jobs, useCache=True):
+    """ Rip and encode each job in `jobs`
+
+        Each job should be a dict with keys 'device', 'outdir' and optionally
+        'title' (default 1, or None for the main title), 'direct', 'analyse', 
+        'remux', 'crf', 'preset', 'threads', 'parallel' and 'resumable'. If 
+        'remux' is true, the streams are copied to the output straight after 
+        ripping, and replaced by the encode when it finishes. Jobs for 
+        different devices are ripped at the same time (with the output of each
+        rip written to 'rip-<device>.log' in the job's outdir), and jobs for 
+        the same device in turn. Encodes run one at a time in the background 
+        (with output written to 'encode.log') while other jobs are ripped. If 
+        'analyse' is true, the crop and deinterlace filter are detected before 
+        encoding.
+
+        Returns list of (job, exception or None) for each job.
+    """
+    byDevice = {}
+    encodes = {}
+    for job in jobs:
+        try:
+            device = os.path.realpath(job['device'])
+            job['outdir']
+        except (KeyError, TypeError) as err:
+            # report a malformed job as its error, rather than stopping the batch
+            print(f"Job {job!r} should be a dict with 'device' and 'outdir'", file=sys.stderr)
+            encodes[id(job)] = err
+            continue
+        byDevice.setdefault(device, []).append(job)
+    concurrent = len(byDevice) > 1
+
+    def ripDevice(deviceJobs):
+        for job in deviceJobs:
+            try:
+                log = None
+                if concurrent:
+                    log = os.path.join(job['outdir'], f"rip-{os.path.basename(job['device'])}.log")
+                info = getInfo(job['device'], useCache=useCache)
+                if (title := job.get('title', 1)) is None and info.mainTitle is not None:
+                    title = info.mainTitle.num
+                path = rip(job['device'], job['outdir'], title, log=log, info=info)
+                inpath = path if job.get('direct', False) else cat(path)
+                if job.get('remux', False):
+                    remux(inpath, path, log=os.path.join(path, "remux.log") if concurrent else None)
+            except Exception as err:
+                print(err, file=sys.stderr)
+                encodes[id(job)] = err
+                continue
+            print(f"Queueing encode of {inpath}", flush=True)
+            encodes[id(job)] = encoder.submit(
+                _analyseAndEncode, job.get('analyse', False), inpath, path,
+                threads=job.get('threads'), crf=job.get('crf', 21), preset=job.get('preset'),
+                parallel=job.get('parallel', False), resumable=job.get('resumable', False),
+                replace=job.get('remux', False), log=os.path.join(path, "encode.log"),
+                fingerprint=info.fingerprint, title=title)
+
+    with ThreadPoolExecutor(1) as encoder:
+        with ThreadPoolExecutor(max(1, len(byDevice))) as rippers:
+            list(rippers.map(ripDevice, byDevice.values()))
+    results = []
+    for job in jobs:
+        err = encodes[id(job)]
+        if not isinstance(err, Exception):
+            if (err := err.exception()) is not None:
+                print(err, file=sys.stderr)
+        results.append((job, err))
+    return results
+
+def driveJobs(outdir, **kwargs):
+    """ Return jobs for :func:`runJobs` to rip the main title from every drive
+
+        Each drive rips to its own directory in `outdir`. `kwargs` are added 
+        to each job.
+    """
+    return [dict(kwargs, device=device, outdir=drives.driveOutdir(outdir, device), title=None)
+            for device in drives.discoverDrives()]
+
+def showReport(name, days=30):
+    """ Print report `name` from the job history """
+    description, _ = history.REPORTS[name]
+    columns, rows = history.getHistory().report(name, days)
+    print(f"{description}, last {days:g} days")
+    cells = [[f"{v:.2f}" if isinstance(v, float) else "" if v is None else str(v) for v in row]
+             for row in rows]
+    widths = [max(len(c) for c in col) for col in zip(columns, *cells)]
+    for row in [columns] + cells:
+        print("  ".join(c.rjust(w) for c, w in zip(row, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="drip", description="Rip and encode DVDs without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("info", help="Show DVD info")
+    p.add_argument("device", nargs="?", default="/dev/sr0")
+    p.add_argument("--no-cache", action="store_true", help="Don't use cached DVD info")
+
+    p = subparsers.add_parser("rip", help="Rip a title with dvdbackup")
+    p.add_argument("device", nargs="?", default="/dev/sr0")
+    p.add_argument("-o", "--outdir", required=True)
+    p.add_argument("-t", "--title", type=int, default=1)
+    p.add_argument("--no-cache", action="store_true", help="Don't use cached DVD info")
+
+    p = subparsers.add_parser("cat", help="Concatenate title VOBs")
+    p.add_argument("path", help="VIDEO_TS directory")
+    p.add_argument("output", nargs="?")
+
+    p = subparsers.add_parser("probe", help="Show stream info")
+    p.add_argument("input", help="File, or directory of VOBs")
+
+    p = subparsers.add_parser("encode", help="Encode with ffmpeg")
+    p.add_argument("input", help="File, or directory of VOBs to read directly")
+    p.add_argument("-o", "--outdir")
+    p.add_argument("--crf", type=int, default=21)
+    p.add_argument("--preset", choices=autotune.PRESETS)
+    p.add_argument("--filter", help="ffmpeg video filter")
+    p.add_argument("--analyse", action="store_true", help="Detect crop and interlacing first")
+    p.add_argument("--threads", type=int)
+    p.add_argument("--parallel", action="store_true", help="Encode segments in parallel")
+    p.add_argument("--resumable", action="store_true",
+                   help="Encode in checkpointed segments, so an interrupted encode can be resumed")
+    p.add_argument("--remux-first", action="store_true",
+                   help="Copy the streams to the output first, then replace it with the encode, "
+                   "run at idle priority")
+
+    p = subparsers.add_parser("remux", help="Copy streams to an MKV without re-encoding")
+    p.add_argument("input", help="File, or directory of VOBs to read directly")
+    p.add_argument("-o", "--outdir")
+
+    p = subparsers.add_parser("analyse", help="Detect letterbox bars and interlacing")
+    p.add_argument("input", help="File, or directory of VOBs")
+
+    p = subparsers.add_parser("tune", help="Choose a preset and thread count from sample encodes")
+    p.add_argument("input", help="File, or directory of VOBs")
+    p.add_argument("--crf", type=int, default=21)
+    p.add_argument("--size-tolerance", type=float, default=10,
+                   help="Acceptable size increase over the smallest output, as a percentage")
+    p.add_argument("--min-fps", type=float, help="Minimum acceptable frames per second")
+
+    p = subparsers.add_parser("drives", help="List optical drives, or rip and encode from all of them")
+    p.add_argument("-o", "--outdir", help="Rip the main title from every drive to this directory "
+                   "and encode it")
+    p.add_argument("--direct", action="store_true", help="Encode the VOBs without concatenating")
+    p.add_argument("--analyse", action="store_true", help="Detect crop and interlacing first")
+    p.add_argument("--no-cache", action="store_true", help="Don't use cached DVD info")
+
+    p = subparsers.add_parser("history", help="Report on the job history")
+    p.add_argument("report", nargs="?", choices=history.REPORTS, default="fps-by-preset")
+    p.add_argument("--days", type=float, default=30, help="Only include the last DAYS days")
+
+    p = subparsers.add_parser("verify", help="Check the rip library against its checksums")
+    p.add_argument("fingerprints", nargs="*", help="Only check these discs")
+    p.add_argument("--library", default=commands.libraryDir(),
+                   help="Library directory (default: $DRIP_LIBRARY)")
+
+    p = subparsers.add_parser("batch", help="Rip and encode the jobs in a JSON job file")
+    p.add_argument("jobfile", help="JSON file containing a list of jobs, or '-' for stdin")
+    p.add_argument("--no-cache", action="store_true", help="Don't use cached DVD info")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "info":
+            getInfo(args.device, useCache=not args.no_cache)
+        elif args.command == "rip":
+            rip(args.device, args.outdir, args.title, useCache=not args.no_cache)
+        elif args.command == "cat":
+            cat(args.path, args.output)
+        elif args.command == "probe":
+            probe(args.input)
+        elif args.command == "encode":
+            if args.remux_first:
+                remux(args.input, args.outdir)
+            videoFilter = analyseInput(args.input) if args.analyse else args.filter
+            encode(args.input, args.outdir, threads=args.threads, crf=args.crf,
+                   preset=args.preset, videoFilter=videoFilter, parallel=args.parallel,
+                   resumable=args.resumable, replace=args.remux_first)
+        elif args.command == "remux":
+            remux(args.input, args.outdir)
+        elif args.command == "analyse":
+            analyseInput(args.input)
+        elif args.command == "tune":
+            tune(args.input, crf=args.crf, sizeTolerance=args.size_tolerance, minFps=args.min_fps)
+        elif args.command == "drives":
+            if args.outdir is None:
+                for device in drives.discoverDrives():
+                    print(device)
+                return 0
+            jobs = driveJobs(args.outdir, direct=args.direct, analyse=args.analyse)
+            if not jobs:
+                print("No optical drives found", file=sys.stderr)
+                return 1
+            results = runJobs(jobs, useCache=not args.no_cache)
+            return 1 if any(err is not None for _, err in results) else 0
+        elif args.command == "history":
+            showReport(args.report, args.days)
+        elif args.command == "verify":
+            if args.library is None:
+                print("No library directory given, and DRIP_LIBRARY isn't set", file=sys.stderr)
+                return 1
+            problems = library.verify(args.library, args.fingerprints)
+            for path, problem in problems:
+                print(f"{path}: {problem}")
+            return 1 if problems else 0
+        elif args.command == "batch":
+            if args.jobfile == "-":
+                jobs = json.load(sys.stdin)
+            else:
+                with open(args.jobfile) as fileobj:
+                    jobs = json.load(fileobj)
+            results = runJobs(jobs, useCache=not args.no_cache)
+            return 1 if any(err is not None for _, err in results) else 0
+    except (RuntimeError, OSError, subprocess.CalledProcessError, sqlite3.Error) as err:
+        print(err, file=sys.stderr)
+        return 1
+    return 0
@@ -1,14 +1,27 @@
 from qtpy.QtWidgets import (QApplication, QPushButton, QWidget, QPlainTextEdit,
-                            QHBoxLayout, QVBoxLayout, QSizePolicy)
+                            QHBoxLayout, QVBoxLayout, QSizePolicy, QProgressBar, QLabel)
 from qtpy.QtCore import Signal, Qt
 from qtpy.QtGui import QFontDatabase, QIcon, QClipboard
 from customQObjects.widgets import ElideLabel
+from .paths import stateDir
+import gzip
+import re
+import time
+import os.path
 
 class CmdWidget(QWidget):
     """ Widget to display a command and its output 
     
         Note that running the command should be handled by another object.
         The :attr:`requestRun` will be emitted when the 'Run' button is clicked.
+        While the command is running, it can be paused and cancelled with
+        :attr:`requestPause` and :attr:`requestCancel`.
+        
+        At most `maxLines` lines of output are shown (if `maxLines` is 0, 
+        there is no limit). The full output of each run is written to a gzipped
+        log file in the 'logs' state directory, with file name prefix `logName`.
+        Only the newest `maxLogs` logs with this prefix are kept (if `maxLogs`
+        is 0, they are all kept).
     """
     
     requestRun = Signal()
@@ -17,9 +30,26 @@ class CmdWidget(QWidget):
         Emitted when 'Run' button clicked
     """
     
-    def __init__(self):
+    requestPause = Signal(bool)
+    """ **signal** requestPause(bool paused) 
+    
+        Emitted when 'Pause' button toggled
+    """
+    
+    requestCancel = Signal()
+    """ **signal** requestCancel() 
+    
+        Emitted when 'Cancel' button clicked
+    """
+    
+    def __init__(self, maxLines=5000, logName="drip", maxLogs=20):
         super().__init__()
         
+        self.logName = logName
+        self.maxLogs = maxLogs
+        self.logPath = None
+        self._log = None
+        
         fixedfont = QFontDatabase.systemFont(QFontDatabase.FixedFont)
         
         icon = QIcon.fromTheme("system-run")
@@ -27,6 +57,17 @@ class CmdWidget(QWidget):
         infoButton.clicked.connect(self.requestRun)
         infoButton.setToolTip("Run command")
         
+        icon = QIcon.fromTheme("media-playback-pause")
+        self.pauseButton = QPushButton(icon, "")
+        self.pauseButton.setCheckable(True)
+        self.pauseButton.toggled.connect(self.requestPause)
+        self.pauseButton.setToolTip("Pause command")
+        
+        icon = QIcon.fromTheme("process-stop")
+        self.cancelButton = QPushButton(icon, "")
+        self.cancelButton.clicked.connect(self.requestCancel)
+        self.cancelButton.setToolTip("Cancel command and remove its partial output")
+        
         icon = QIcon.fromTheme("edit-copy")
         copyButton = QPushButton(icon, "")
         copyButton.clicked.connect(self.copyCommand)
@@ -43,6 +84,8 @@ class CmdWidget(QWidget):
         
         infoButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Preferred)
         clearButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Preferred)
+        self.pauseButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Preferred)
+        self.cancelButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Preferred)
         self.cmdLabel.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
         
         self.topLayout = QHBoxLayout()
@@ -51,29 +94,89 @@ class CmdWidget(QWidget):
         self.topLayout.addWidget(copyButton)
         self.topLayout.addWidget(clearButton)
         
+        # pause and cancel are only enabled while running, so aren't in topLayout
+        self.runLayout = QHBoxLayout()
+        self.runLayout.addWidget(self.pauseButton)
+        self.runLayout.addWidget(self.cancelButton)
+        self.topLayout.addLayout(self.runLayout)
+        
         self.view = QPlainTextEdit()
         self.view.setReadOnly(True)
         self.view.setFont(fixedfont)
+        self.view.setMaximumBlockCount(maxLines)
+        
+        self.progressBar = QProgressBar()
+        self.progressLabel = QLabel()
+        self.progressLabel.setFont(fixedfont)
         
         layout = QVBoxLayout()
         layout.addLayout(self.topLayout)
+        layout.addWidget(self.progressBar)
+        layout.addWidget(self.progressLabel)
         layout.addWidget(self.view)
         self.setLayout(layout)
         
+        self._enable(enable=True)
         self.reset()
         
     def reset(self):
         """ Remove all output text """
+        self.closeLog()
         self.view.setPlainText("")
         self.cmd = None
+        self.progressBar.setValue(0)
+        self.progressBar.hide()
+        self.progressLabel.setText("")
+        self.progressLabel.hide()
+        
+    def setProgress(self, progress):
+        """ Show `progress`, e.g. an :class:`FfmpegProgress` object 
+        
+            If `progress` has a `percent` value, it is shown in the progress bar.
+        """
+        self.progressLabel.setText(str(progress))
+        self.progressLabel.show()
+        if (percent := getattr(progress, "percent", None)) is not None:
+            self.progressBar.setValue(round(percent))
+            self.progressBar.show()
         
     def setText(self, text):
         """ Set `text` in viewer """
         self.view.setPlainText(text)
         
     def appendText(self, text):
-        """ Append `text` to viewer """
+        """ Append `text` to viewer and log file """
         self.view.appendPlainText(text)
+        if self._log is None:
+            self._openLog()
+        self._log.write(text + "\n")
+        
+    def _openLog(self):
+        name = f"{self.logName}-{time.strftime('%Y%m%d-%H%M%S')}.log.gz"
+        self.logPath = os.path.join(stateDir("logs"), name)
+        if self.maxLogs > 0:
+            self._pruneLogs(self.maxLogs - 1)
+        self._log = gzip.open(self.logPath, "at")
+        
+    def _pruneLogs(self, keep):
+        """ Remove all but the newest `keep` logs with this widget's `logName` """
+        logDir = stateDir("logs")
+        # match the timestamp too, so 'ffmpeg' logs don't include 'ffmpeg-info' logs
+        logRe = re.compile(re.escape(self.logName) + r"-\d{8}-\d{6}\.log\.gz$")
+        # timestamped names sort oldest first
+        logs = sorted(name for name in os.listdir(logDir) if logRe.match(name))
+        for name in logs[:max(0, len(logs) - keep)]:
+            try:
+                os.remove(os.path.join(logDir, name))
+            except OSError:
+                pass
+        
+    def closeLog(self):
+        """ Close the current log file. The next output will start a new one. """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            self.view.appendPlainText(f"Log written to {self.logPath}")
         
     def setCmd(self, cmd):
         """ Set the command. `cmd` should be list of command components """
@@ -91,12 +194,16 @@ class CmdWidget(QWidget):
                 
     def setRunComplete(self):
         self._enable(enable=True)
+        self.pauseButton.setChecked(False)
+        self.closeLog()
                 
     def _enable(self, enable=True):
         for n in range(self.topLayout.count()):
             item = self.topLayout.itemAt(n)
-            if item is not None:
+            if item is not None and item.widget() is not None:
                 item.widget().setEnabled(enable)
+        self.pauseButton.setEnabled(not enable)
+        self.cancelButton.setEnabled(not enable)
                 
     def copyCommand(self):
         """ Copy command to mouse selection """
@@ -0,0 +1,339 @@
+"""
+Build the commands run by DRip. Nothing here imports Qt, so these can be
+used by the GUI and the command line interface.
+"""
+from . import (vobcat, parallelencode, discinfo, autotune, resumerip, analyse, replaceoutput,
+               library)
+from .ffmpegprogress import PROGRESS_ARGS
+from .paths import cacheDir
+from .processmanager import driveResource
+from collections import Counter
+from dataclasses import dataclass
+import json
+import os
+import sys
+
+DVDBACKUP_ARGS = ["-v", "-p"]
+
+RESUME_SEGMENT_DURATION = 300
+""" Duration in seconds of each checkpointed segment of a resumable, non-parallel encode """
+
+def infoCmd(device, useCache=True):
+    """ Return command to get info for the DVD in `device`
+
+        If `useCache` is True, info is cached by disc fingerprint, so known
+        discs don't need to be scanned again.
+    """
+    cmd = [sys.executable, discinfo.__file__, device]
+    if useCache:
+        cmd += ["--cache-dir", cacheDir("discinfo")]
+    return cmd
+
+def libraryDir():
+    """ Return the rip library directory, from the DRIP_LIBRARY environment variable, or None """
+    return os.environ.get("DRIP_LIBRARY") or None
+
+def ripCmd(device, outdir, title, extraArgs=None, name=None, chapters=None, fingerprint=None):
+    """ Return `dvdbackup` command to rip `title` from `device` to `outdir`
+
+        If the DVD `name` is given, the title is ripped with :mod:`resumerip`, 
+        a chapter at a time (if the number of `chapters` is given), so an 
+        interrupted rip can be resumed by running the command again. If the
+        disc `fingerprint` is given, a previous rip of another disc with the
+        same name isn't resumed.
+
+        If `fingerprint` is given and there is a :func:`libraryDir`,
+        the rip is linked from the library if it has been ripped before, or
+        added to the library; see :mod:`library`.
+    """
+    if extraArgs is None:
+        extraArgs = DVDBACKUP_ARGS
+    if name is not None:
+        cmd = [sys.executable, resumerip.__file__, device, outdir, str(title), "--name", name]
+        if chapters:
+            cmd += ["--chapters", str(chapters)]
+        if fingerprint is not None:
+            cmd += ["--fingerprint", fingerprint]
+        cmd += ["--"] + list(extraArgs)
+        if fingerprint is not None and (libDir := libraryDir()) is not None:
+            cmd = [sys.executable, library.__file__, "rip", libDir, fingerprint, str(title),
+                   vobPath(outdir, name), "--"] + cmd
+        return cmd
+    return ["dvdbackup", "-i", device, "-o", outdir, "-t", str(title)] + list(extraArgs)
+
+def vobPath(outdir, dvdName):
+    """ Return path of VIDEO_TS directory written by :func:`ripCmd` """
+    return os.path.join(outdir, dvdName, "VIDEO_TS")
+
+def catCmd(path, outpath=None):
+    """ Return command to concatenate the title VOBs in `path` (by default, to 'output.vob') """
+    if outpath is None:
+        outpath = os.path.join(path, "output.vob")
+    return [sys.executable, vobcat.__file__, path, outpath]
+
+@dataclass
+class Rendition:
+    """ An extra output of an encode, with its own settings """
+    outname: str
+    crf: int = 21
+    preset: str = None
+    height: int = None
+    """ Height to scale the video to, keeping the aspect ratio; None for the source height """
+    streams: list = None
+    """ Numbers (e.g. '0:1') of the selected streams to include; None for all of them """
+
+    @property
+    def scaleFilter(self):
+        return f"scale=-2:{self.height}" if self.height else None
+
+def encodeCmd(inpath, outdir, streams=(), threads=None, crf=21, preset=None, videoFilter=None,
+              parallel=False, resumable=False, progress=True, outname="output.mkv", renditions=()):
+    """ Return ffmpeg command to encode `inpath` to `outdir`
+
+        `inpath` can be a directory of *.VOB files, which will be read directly
+        with ffmpeg's concat protocol.
+
+        `streams` should be a list of :class:`StreamInfo` objects; if none are
+        selected, ffmpeg chooses the streams. If `preset` is None, libx264's
+        default preset is used. `videoFilter` can be an ffmpeg filter graph, 
+        e.g. from :mod:`analyse`.
+
+        `renditions` is a list of :class:`Rendition` objects, which are written 
+        by the same ffmpeg process, so the input is only read and decoded once. 
+        They come before the main output, so the main output is still the last 
+        argument.
+
+        If `parallel` or `resumable` is True, the command is wrapped in a call
+        to :mod:`parallelencode`, which encodes checkpointed segments (in a
+        single process if only `resumable` is True). This can't be used with 
+        `renditions`. If `progress` is True, ffmpeg writes machine readable 
+        progress to stdout.
+    """
+    if renditions and (parallel or resumable):
+        raise ValueError("Renditions can't be written by a parallel or resumable encode")
+    if threads is None:
+        threads = os.cpu_count()
+    cmd = ["ffmpeg"]
+    if progress:
+        cmd += PROGRESS_ARGS
+    cmd += ["-analyzeduration", "100M", "-probesize", "100M", "-i", vobcat.inputUrl(inpath)]
+    for rendition in renditions:
+        selected = streams if rendition.streams is None else \
+            [stream for stream in streams if stream.num in rendition.streams]
+        filters = ",".join(f for f in [videoFilter, rendition.scaleFilter] if f)
+        cmd += _outputArgs(os.path.join(outdir, rendition.outname), selected, threads,
+                           rendition.crf, rendition.preset, filters)
+    cmd += _outputArgs(os.path.join(outdir, outname), streams, threads, crf, preset, videoFilter)
+    if parallel:
+        cmd = [sys.executable, parallelencode.__file__, "--"] + cmd
+    elif resumable:
+        cmd = [sys.executable, parallelencode.__file__, "-j", "1", "-d", str(RESUME_SEGMENT_DURATION),
+               "--"] + cmd
+    return cmd
+
+def _outputArgs(outpath, streams, threads, crf, preset, videoFilter):
+    """ Return ffmpeg args to encode the selected `streams` to `outpath` """
+    args = _streamArgs(streams)
+    args += ["-threads", str(threads)]
+    if videoFilter:
+        args += ["-filter:v", videoFilter]
+    args += ["-codec:v", "libx264",
+             "-crf", str(crf)]
+    if preset is not None:
+        args += ["-preset", preset]
+    args += ["-codec:a", "copy",
+             "-codec:s", "copy",
+             outpath]
+    return args
+
+def _streamArgs(streams):
+    """ Return ffmpeg args to map the selected `streams` to an output, with their metadata """
+    args = []
+    # output streams of each type are numbered in the order they are mapped
+    counts = Counter()
+    for streamInfo in streams:
+        info = streamInfo.getStreamInfo(counts[streamInfo.stype])
+        if info is not None:
+            args += info
+            counts[streamInfo.stype] += 1
+    return args
+def remuxCmd(inpath, outdir, streams=(), progress=True, outname="output.mkv"):
+    """ Return ffmpeg command to copy the streams of `inpath` to an MKV in `outdir`
+
+        Nothing is re-encoded, so this is limited by I/O rather than CPU.
+        Arguments are as for :func:`encodeCmd`. The command is wrapped by 
+        :func:`replaceCmd`, so an existing output (which may be a link to the 
+        rip library) is replaced rather than written through.
+    """
+    cmd = ["ffmpeg", "-y"]
+    if progress:
+        cmd += PROGRESS_ARGS
+    # MPEG-PS from DVDs doesn't always have timestamps for every packet
+    cmd += ["-fflags", "+genpts", "-analyzeduration", "100M", "-probesize", "100M",
+            "-i", vobcat.inputUrl(inpath)]
+    cmd += _streamArgs(streams)
+    cmd += ["-codec", "copy", os.path.join(outdir, outname)]
+    return replaceCmd(cmd, idle=False)
+
+def isRemux(cmd):
+    """ Return True if `cmd` is an ffmpeg stream copy, from :func:`remuxCmd` """
+    cmd = unwrapCmd(cmd)
+    return cmd[0] == "ffmpeg" and "-codec" in cmd and cmd[cmd.index("-codec") + 1] == "copy"
+
+def replaceCmd(cmd, idle=True):
+    """ Wrap encode `cmd`, so its output atomically replaces any existing output when it finishes
+
+        If `idle` is True, the encode runs at idle CPU and I/O priority. See
+        :mod:`replaceoutput`.
+    """
+    return [sys.executable, replaceoutput.__file__] + (["--idle"] if idle else []) + ["--"] + cmd
+
+def libraryCmd(cmd, fingerprint, title):
+    """ Wrap encode `cmd` of `title` of the disc with `fingerprint`, to use the rip library
+
+        If the library has an encode with the same settings, it is linked to
+        the output instead. Returns `cmd` if there is no :func:`libraryDir`, 
+        or if it writes more than one output (the library only keeps one 
+        encode per command).
+    """
+    if fingerprint is None or (libDir := libraryDir()) is None or len(outputPaths(cmd)) > 1:
+        return cmd
+    return [sys.executable, library.__file__, "encode", libDir, fingerprint, str(title), "--"] + cmd
+
+def unwrapCmd(cmd):
+    """ Return `cmd` without any :func:`replaceCmd` or :mod:`library` wrappers """
+    while cmd[:2] in ([sys.executable, replaceoutput.__file__], [sys.executable, library.__file__]):
+        cmd = cmd[cmd.index("--") + 1:]
+    return cmd
+
+def outputPaths(cmd):
+    """ Return list of the output paths of ffmpeg `cmd`, which may be wrapped in other scripts
+
+        Every option after the input is taken to have a value, as in the 
+        commands made here, so the outputs are the other arguments after the 
+        input.
+    """
+    while "--" in cmd:
+        cmd = cmd[cmd.index("--") + 1:]
+    if cmd[0] != "ffmpeg" or "-i" not in cmd:
+        return []
+    args = cmd[cmd.index("-i") + 2:]
+    outputs = []
+    idx = 0
+    while idx < len(args):
+        if args[idx].startswith("-") and args[idx] != "-":
+            idx += 2
+        else:
+            outputs.append(args[idx])
+            idx += 1
+    return outputs
+
+def partialOutputs(cmd):
+    """ Return list of output paths `cmd` may leave incomplete if it is cancelled
+
+        :mod:`replaceoutput`, :mod:`resumerip` and :mod:`autotune` clean up 
+        after themselves, and the existing output of a command wrapped by 
+        :func:`replaceCmd` should be kept (though its other renditions are 
+        written in place). Finished segments of a :mod:`parallelencode` 
+        encode are kept, so it can be resumed.
+    """
+    if cmd[:2] == [sys.executable, library.__file__]:
+        return partialOutputs(cmd[cmd.index("--") + 1:])
+    if cmd[:2] == [sys.executable, replaceoutput.__file__]:
+        return outputPaths(cmd)[:-1]
+    if cmd[:2] == [sys.executable, vobcat.__file__]:
+        return [cmd[3]]
+    if cmd[:2] == [sys.executable, parallelencode.__file__]:
+        return [cmd[-1]]
+    if cmd[0] == "ffmpeg":
+        return [path for path in outputPaths(cmd) if path != "-"]
+    return []
+
+def addVideoFilter(cmd, videoFilter):
+    """ Return copy of encode command `cmd` with `videoFilter` added before any existing filter
+    
+        The filter is added to each output of the command.
+    """
+    if not videoFilter:
+        return list(cmd)
+    cmd = list(cmd)
+    start = 0
+    while "-codec:v" in cmd[start:]:
+        idx = cmd.index("-codec:v", start)
+        if "-filter:v" in cmd[start:idx]:
+            filterIdx = cmd.index("-filter:v", start) + 1
+            cmd[filterIdx] = f"{videoFilter},{cmd[filterIdx]}"
+        else:
+            cmd[idx:idx] = ["-filter:v", videoFilter]
+            idx += 2
+        start = idx + 1
+    return cmd
+
+def analyseCmd(inpath, output=None):
+    """ Return command to detect crop and interlacing of `inpath`
+
+        If `output` is given, the result is written to it; see :func:`analysisFilter`.
+    """
+    cmd = [sys.executable, analyse.__file__, vobcat.inputUrl(inpath)]
+    if output is not None:
+        cmd += ["--output", output]
+    return cmd
+
+def analysisFilter(path):
+    """ Return the video filter from :mod:`analyse` result file `path`, or None """
+    try:
+        with open(path) as fileobj:
+            return json.load(fileobj).get('filter')
+    except (OSError, ValueError):
+        return None
+
+def tuneCmd(inpath, outdir, crf=21, videoFilter=None, sizeTolerance=10, minFps=None):
+    """ Return command to choose a preset and thread count for encoding `inpath`
+
+        See :mod:`autotune`.
+    """
+    cmd = [sys.executable, autotune.__file__, "--size-tolerance", str(sizeTolerance)]
+    if minFps:
+        cmd += ["--min-fps", str(minFps)]
+    return cmd + ["--"] + encodeCmd(inpath, outdir, crf=crf, videoFilter=videoFilter,
+                                    progress=False)
+
+def resourcesFor(cmd):
+    """ Return list of :class:`ProcessManager` resources used by `cmd`
+
+        Commands reading a DVD use the drive and ffmpeg commands (other than 
+        remuxes) use an encode slot.
+    """
+    cmd = unwrapCmd(cmd)
+    if cmd[0] == "dvdbackup" and "-i" in cmd:
+        return [driveResource(cmd[cmd.index("-i") + 1])]
+    if isRemux(cmd):
+        return []
+    if cmd[:2] in ([sys.executable, discinfo.__file__], [sys.executable, resumerip.__file__]):
+        return [driveResource(cmd[2])]
+    if cmd[0] == "ffmpeg" or cmd[:2] in ([sys.executable, parallelencode.__file__],
+                                          [sys.executable, autotune.__file__],
+                                          [sys.executable, analyse.__file__]):
+        return ["encode"]
+    return []
+
+def stageFor(cmd):
+    """ Return name of the pipeline stage `cmd` belongs to, for metrics """
+    cmd = unwrapCmd(cmd)
+    if cmd[:2] == [sys.executable, discinfo.__file__] or (cmd[0] == "dvdbackup" and "-I" in cmd):
+        return "info"
+    if cmd[0] == "dvdbackup" or cmd[:2] == [sys.executable, resumerip.__file__]:
+        return "rip"
+    if cmd[:2] == [sys.executable, vobcat.__file__]:
+        return "cat"
+    if cmd[0] == "ffprobe":
+        return "probe"
+    if cmd[:2] == [sys.executable, autotune.__file__]:
+        return "tune"
+    if cmd[:2] == [sys.executable, analyse.__file__]:
+        return "analyse"
+    if isRemux(cmd):
+        return "remux"
+    if cmd[0] == "ffmpeg" or cmd[:2] == [sys.executable, parallelencode.__file__]:
+        return "encode"
+    return os.path.basename(cmd[0])
@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Get DVD info from its IFO files, or with `dvdbackup -I`, cached by disc fingerprint.
+
+If the VIDEO_TS directory can be read (from a mounted disc, or a directory on
+disk), VIDEO_TS.IFO and the VTS_xx_0.IFO files are read directly, which takes
+milliseconds and gives the duration, chapters and audio and subtitle
+languages of each title. Otherwise, `dvdbackup -I` is used.
+
+The disc is fingerprinted from its volume ID and a hash of its IFO files. If
+`dvdbackup -I` info for the fingerprint has been cached, it is printed without
+scanning the disc; otherwise, `dvdbackup -I` is run and its output is printed
+and cached.
+
+The output can be parsed in a single pass with :class:`DiscInfoParser`.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+from dataclasses import dataclass, field, asdict
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+
+SECTOR_SIZE = 2048
+
+LANGUAGES = {
+    "aa": ("aar", "Afar"), "ab": ("abk", "Abkhazian"), "ae": ("ave", "Avestan"),
+    "af": ("afr", "Afrikaans"), "ak": ("aka", "Akan"), "am": ("amh", "Amharic"),
+    "an": ("arg", "Aragonese"), "ar": ("ara", "Arabic"), "as": ("asm", "Assamese"),
+    "av": ("ava", "Avaric"), "ay": ("aym", "Aymara"), "az": ("aze", "Azerbaijani"),
+    "ba": ("bak", "Bashkir"), "be": ("bel", "Belarusian"), "bg": ("bul", "Bulgarian"),
+    "bh": ("bih", "Bihari"), "bi": ("bis", "Bislama"), "bm": ("bam", "Bambara"),
+    "bn": ("ben", "Bengali"), "bo": ("tib", "Tibetan"), "br": ("bre", "Breton"),
+    "bs": ("bos", "Bosnian"), "ca": ("cat", "Catalan"), "ce": ("che", "Chechen"),
+    "ch": ("cha", "Chamorro"), "co": ("cos", "Corsican"), "cr": ("cre", "Cree"),
+    "cs": ("cze", "Czech"), "cu": ("chu", "Church Slavic"), "cv": ("chv", "Chuvash"),
+    "cy": ("wel", "Welsh"), "da": ("dan", "Danish"), "de": ("ger", "German"),
+    "dv": ("div", "Divehi"), "dz": ("dzo", "Dzongkha"), "ee": ("ewe", "Ewe"),
+    "el": ("gre", "Greek"), "en": ("eng", "English"), "eo": ("epo", "Esperanto"),
+    "es": ("spa", "Spanish"), "et": ("est", "Estonian"), "eu": ("baq", "Basque"),
+    "fa": ("per", "Persian"), "ff": ("ful", "Fulah"), "fi": ("fin", "Finnish"),
+    "fj": ("fij", "Fijian"), "fo": ("fao", "Faroese"), "fr": ("fre", "French"),
+    "fy": ("fry", "Western Frisian"), "ga": ("gle", "Irish"), "gd": ("gla", "Scottish Gaelic"),
+    "gl": ("glg", "Galician"), "gn": ("grn", "Guarani"), "gu": ("guj", "Gujarati"),
+    "gv": ("glv", "Manx"), "ha": ("hau", "Hausa"), "he": ("heb", "Hebrew"),
+    "hi": ("hin", "Hindi"), "ho": ("hmo", "Hiri Motu"), "hr": ("hrv", "Croatian"),
+    "ht": ("hat", "Haitian"), "hu": ("hun", "Hungarian"), "hy": ("arm", "Armenian"),
+    "hz": ("her", "Herero"), "ia": ("ina", "Interlingua"), "id": ("ind", "Indonesian"),
+    "ie": ("ile", "Interlingue"), "ig": ("ibo", "Igbo"), "ii": ("iii", "Sichuan Yi"),
+    "ik": ("ipk", "Inupiaq"), "io": ("ido", "Ido"), "is": ("ice", "Icelandic"),
+    "it": ("ita", "Italian"), "iu": ("iku", "Inuktitut"), "ja": ("jpn", "Japanese"),
+    "jv": ("jav", "Javanese"), "ka": ("geo", "Georgian"), "kg": ("kon", "Kongo"),
+    "ki": ("kik", "Kikuyu"), "kj": ("kua", "Kuanyama"), "kk": ("kaz", "Kazakh"),
+    "kl": ("kal", "Kalaallisut"), "km": ("khm", "Khmer"), "kn": ("kan", "Kannada"),
+    "ko": ("kor", "Korean"), "kr": ("kau", "Kanuri"), "ks": ("kas", "Kashmiri"),
+    "ku": ("kur", "Kurdish"), "kv": ("kom", "Komi"), "kw": ("cor", "Cornish"),
+    "ky": ("kir", "Kirghiz"), "la": ("lat", "Latin"), "lb": ("ltz", "Luxembourgish"),
+    "lg": ("lug", "Ganda"), "li": ("lim", "Limburgish"), "ln": ("lin", "Lingala"),
+    "lo": ("lao", "Lao"), "lt": ("lit", "Lithuanian"), "lu": ("lub", "Luba-Katanga"),
+    "lv": ("lav", "Latvian"), "mg": ("mlg", "Malagasy"), "mh": ("mah", "Marshallese"),
+    "mi": ("mao", "Maori"), "mk": ("mac", "Macedonian"), "ml": ("mal", "Malayalam"),
+    "mn": ("mon", "Mongolian"), "mr": ("mar", "Marathi"), "ms": ("may", "Malay"),
+    "mt": ("mlt", "Maltese"), "my": ("bur", "Burmese"), "na": ("nau", "Nauru"),
+    "nb": ("nob", "Norwegian Bokmål"), "nd": ("nde", "North Ndebele"), "ne": ("nep", "Nepali"),
+    "ng": ("ndo", "Ndonga"), "nl": ("dut", "Dutch"), "nn": ("nno", "Norwegian Nynorsk"),
+    "no": ("nor", "Norwegian"), "nr": ("nbl", "South Ndebele"), "nv": ("nav", "Navajo"),
+    "ny": ("nya", "Chichewa"), "oc": ("oci", "Occitan"), "oj": ("oji", "Ojibwa"),
+    "om": ("orm", "Oromo"), "or": ("ori", "Oriya"), "os": ("oss", "Ossetian"),
+    "pa": ("pan", "Punjabi"), "pi": ("pli", "Pali"), "pl": ("pol", "Polish"),
+    "ps": ("pus", "Pashto"), "pt": ("por", "Portuguese"), "qu": ("que", "Quechua"),
+    "rm": ("roh", "Romansh"), "rn": ("run", "Rundi"), "ro": ("rum", "Romanian"),
+    "ru": ("rus", "Russian"), "rw": ("kin", "Kinyarwanda"), "sa": ("san", "Sanskrit"),
+    "sc": ("srd", "Sardinian"), "sd": ("snd", "Sindhi"), "se": ("sme", "Northern Sami"),
+    "sg": ("sag", "Sango"), "si": ("sin", "Sinhala"), "sk": ("slo", "Slovak"),
+    "sl": ("slv", "Slovenian"), "sm": ("smo", "Samoan"), "sn": ("sna", "Shona"),
+    "so": ("som", "Somali"), "sq": ("alb", "Albanian"), "sr": ("srp", "Serbian"),
+    "ss": ("ssw", "Swati"), "st": ("sot", "Southern Sotho"), "su": ("sun", "Sundanese"),
+    "sv": ("swe", "Swedish"), "sw": ("swa", "Swahili"), "ta": ("tam", "Tamil"),
+    "te": ("tel", "Telugu"), "tg": ("tgk", "Tajik"), "th": ("tha", "Thai"),
+    "ti": ("tir", "Tigrinya"), "tk": ("tuk", "Turkmen"), "tl": ("tgl", "Tagalog"),
+    "tn": ("tsn", "Tswana"), "to": ("ton", "Tonga"), "tr": ("tur", "Turkish"),
+    "ts": ("tso", "Tsonga"), "tt": ("tat", "Tatar"), "tw": ("twi", "Twi"),
+    "ty": ("tah", "Tahitian"), "ug": ("uig", "Uighur"), "uk": ("ukr", "Ukrainian"),
+    "ur": ("urd", "Urdu"), "uz": ("uzb", "Uzbek"), "ve": ("ven", "Venda"),
+    "vi": ("vie", "Vietnamese"), "vo": ("vol", "Volapük"), "wa": ("wln", "Walloon"),
+    "wo": ("wol", "Wolof"), "xh": ("xho", "Xhosa"), "yi": ("yid", "Yiddish"),
+    "yo": ("yor", "Yoruba"), "za": ("zha", "Zhuang"), "zh": ("chi", "Chinese"),
+    "zu": ("zul", "Zulu"),
+}
+""" Dict of ISO 639-1 code (as used in IFO files): (ISO 639-2/B code, name) """
+
+_legacyLanguages = {"iw": "he", "in": "id", "ji": "yi"}
+""" Withdrawn ISO 639-1 codes, which are still found on older discs """
+
+_audioCodecs = {0: "ac3", 2: "mp2", 3: "mp2", 4: "lpcm", 6: "dts"}
+_audioStreamIds = {"ac3": 0x80, "dts": 0x88, "lpcm": 0xa0, "mp2": 0x1c0}
+
+def languageName(code):
+    """ Return English name of ISO 639-2 language `code`, or `code` if it isn't known """
+    return next((name for c, name in LANGUAGES.values() if c == code), code)
+
+@dataclass
+class Track:
+    """ An audio or subtitle stream of a title """
+    language: str = "und"
+    """ ISO 639-2 language code """
+    codec: str = ""
+    channels: int = None
+    streamIds: list = field(default_factory=list)
+    """ MPEG stream IDs of the stream in the VOBs, as shown by ffprobe """
+
+    def __str__(self):
+        details = ", ".join(d for d in [self.codec, f"{self.channels} ch" if self.channels else ""] if d)
+        return f"{self.language} ({details})" if details else self.language
+
+@dataclass
+class Title:
+    num: int
+    chapters: int = 0
+    audioChannels: int = 0
+    duration: float = None
+    """ Duration in seconds, if known """
+    chapterDurations: list = field(default_factory=list)
+    audio: list = field(default_factory=list)
+    """ List of audio :class:`Track`s, if known """
+    subtitles: list = field(default_factory=list)
+    """ List of subtitle :class:`Track`s, if known """
+
+@dataclass
+class TitleSet:
+    num: int
+    aspectRatio: str = ""
+    angles: int = 0
+    audioTracks: int = 0
+    subpictures: int = 0
+    titles: list = field(default_factory=list)
+    text: str = ""
+
+    @property
+    def streamLanguages(self):
+        """ Dict of MPEG stream ID: ISO 639-2 language code, for the streams of this title set """
+        return {sid: track.language for title in self.titles for track in title.audio + title.subtitles
+                for sid in track.streamIds}
+
+@dataclass
+class MainFeature:
+    titleSet: int = None
+    aspectRatio: str = ""
+    angles: int = 0
+    audioTracks: int = 0
+    subpictures: int = 0
+    chapters: int = 0
+    audioChannels: int = 0
+    text: str = ""
+
+@dataclass
+class DiscInfo:
+    name: str = None
+    fingerprint: str = None
+    files: dict = field(default_factory=dict)
+    """ Dict of file name: size in bytes """
+    mainFeature: MainFeature = None
+    titleSets: dict = field(default_factory=dict)
+    """ Dict of title set number: :class:`TitleSet` """
+
+    @classmethod
+    def fromDict(cls, data):
+        """ Make DiscInfo from dict from :meth:`asDict` """
+        info = cls(name=data.get('name'), fingerprint=data.get('fingerprint'),
+                   files=data.get('files', {}))
+        if (mainFeature := data.get('mainFeature')) is not None:
+            info.mainFeature = MainFeature(**mainFeature)
+        for ts in data.get('titleSets', {}).values():
+            titles = [Title(**dict(t, audio=[Track(**a) for a in t['audio']],
+                                   subtitles=[Track(**s) for s in t['subtitles']]))
+                      for t in ts['titles']]
+            info.titleSets[ts['num']] = TitleSet(**dict(ts, titles=titles))
+        return info
+
+    def asDict(self):
+        return asdict(self)
+
+    @property
+    def titles(self):
+        """ List of all :class:`Title`s, in order """
+        return sorted((t for ts in self.titleSets.values() for t in ts.titles), key=lambda t: t.num)
+
+    @property
+    def mainTitleSet(self):
+        if self.mainFeature is None:
+            return None
+        return self.titleSets.get(self.mainFeature.titleSet)
+
+    @property
+    def mainTitle(self):
+        """ :class:`Title` of the main feature, or None
+
+            This is the longest title in the main feature's title set, or the
+            one with the most chapters if durations aren't known.
+        """
+        titles = ts.titles if (ts := self.mainTitleSet) is not None and ts.titles else self.titles
+        if not titles:
+            return None
+        return max(titles, key=lambda t: (t.duration or 0, t.chapters))
+
+    def titleSize(self, num):
+        """ Size in bytes of the title VOBs of the title set containing title `num`, or None """
+        ts = next((ts for ts in self.titleSets.values() if any(t.num == num for t in ts.titles)), None)
+        if ts is None:
+            return None
+        prefix = f"VTS_{ts.num:02d}_"
+        sizes = [size for name, size in self.files.items()
+                 if name.upper().startswith(prefix) and name.upper().endswith(".VOB")
+                 and name[len(prefix):-4] != "0"]
+        return sum(sizes) if sizes else None
+
+    @property
+    def summary(self):
+        """ Text of main feature info and the title set containing it """
+        mainFeature = self.mainFeature.text if self.mainFeature is not None else ""
+        titleSet = ts.text if (ts := self.mainTitleSet) is not None else ""
+        return f"{mainFeature}\n{titleSet}"
+
+_nameRe = re.compile(r'DVD-Video information of the DVD with title "(?P<name>.*)"')
+_fingerprintRe = re.compile(r"Disc fingerprint: (?P<fp>\w+)")
+_infoJsonRe = re.compile(r"Disc info: (?P<json>\{.*\})$")
+_fileRe = re.compile(r"\t(?P<name>\w+\.(IFO|VOB|BUP))\s.*?(?P<size>\d+)\s*$", re.IGNORECASE)
+_titleSetRe = re.compile(r"\tTitle set (?P<num>\d+)\s*$")
+_titleRe = re.compile(r"\s+Title (?P<num>\d+):")
+_mainFeatureItems = [
+    ("titleSet", re.compile(r"Title set containing the main feature is (\d+)"), int),
+    ("aspectRatio", re.compile(r"aspect ratio of the main feature is (\S+)"), str),
+    ("angles", re.compile(r"main feature has (\d+) angle"), int),
+    ("audioTracks", re.compile(r"main feature has (\d+) audio track"), int),
+    ("subpictures", re.compile(r"main feature has (\d+) subpicture"), int),
+    ("chapters", re.compile(r"maximum of (\d+) chapter"), int),
+    ("audioChannels", re.compile(r"maximum of (\d+) audio channel"), int),
+]
+_titleSetItems = [
+    ("aspectRatio", re.compile(r"aspect ratio of title set \d+ is (\S+)"), str),
+    ("angles", re.compile(r"Title set \d+ has (\d+) angle"), int),
+    ("audioTracks", re.compile(r"Title set \d+ has (\d+) audio track"), int),
+    ("subpictures", re.compile(r"Title set \d+ has (\d+) subpicture"), int),
+]
+_titleItems = [
+    ("chapters", re.compile(r"Title \d+ has (\d+) chapter"), int),
+    ("audioChannels", re.compile(r"Title \d+ has (\d+) audio channel"), int),
+]
+
+def _setItems(obj, items, line):
+    for attr, regex, cast in items:
+        if (m := regex.search(line)) is not None:
+            setattr(obj, attr, cast(m.group(1)))
+            return True
+    return False
+
+class DiscInfoParser:
+    """ Build a :class:`DiscInfo` from `dvdbackup -I` output, in a single pass
+
+        Output can be given as it arrives, with :meth:`feed`.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.info = DiscInfo()
+        self._section = None
+        self._titleSet = None
+        self._title = None
+        self._partial = ""
+
+    def feed(self, text):
+        """ Parse `text`, which may contain several lines """
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.parseLine(line)
+
+    def finish(self):
+        """ Parse any remaining text and return the :class:`DiscInfo` """
+        if self._partial:
+            self.parseLine(self._partial)
+            self._partial = ""
+        for ts in self.info.titleSets.values():
+            ts.text = ts.text.strip()
+        return self.info
+
+    def parseLine(self, line):
+        if (m := _infoJsonRe.match(line)) is not None:
+            # read from the IFO files; this replaces the summary lines before it
+            fp = self.info.fingerprint
+            self.info = DiscInfo.fromDict(json.loads(m.group('json')))
+            self.info.fingerprint = self.info.fingerprint or fp
+            self._section = "done"
+            return None
+        if self._section == "done":
+            return None
+        if self._section is None:
+            if (m := _nameRe.search(line)) is not None:
+                self.info.name = m.group('name')
+                return None
+            if (m := _fingerprintRe.search(line)) is not None:
+                self.info.fingerprint = m.group('fp')
+                return None
+
+        if line.startswith("File Structure"):
+            self._section = "files"
+        elif line.startswith("Main feature:"):
+            self._section = "main"
+            self.info.mainFeature = MainFeature(text=line)
+        elif line.startswith("Title Sets:"):
+            self._section = "titlesets"
+        elif self._section == "files":
+            if (m := _fileRe.match(line)) is not None:
+                self.info.files[m.group('name')] = int(m.group('size'))
+        elif self._section == "main":
+            if not line.strip():
+                # main feature section ends with a blank line
+                self._section = None
+            else:
+                self.info.mainFeature.text += "\n" + line.replace("\t", "    ")
+                _setItems(self.info.mainFeature, _mainFeatureItems, line)
+        elif self._section == "titlesets":
+            if line and not line[0].isspace():
+                # end of dvdbackup output
+                self._section = None
+            elif (m := _titleSetRe.match(line)) is not None:
+                self._titleSet = TitleSet(int(m.group('num')))
+                self.info.titleSets[self._titleSet.num] = self._titleSet
+                self._title = None
+            elif self._titleSet is None:
+                return None
+            elif (m := _titleRe.match(line)) is not None:
+                self._title = Title(int(m.group('num')))
+                self._titleSet.titles.append(self._title)
+            elif self._title is not None:
+                _setItems(self._title, _titleItems, line)
+            else:
+                _setItems(self._titleSet, _titleSetItems, line)
+            if self._section is not None and self._titleSet is not None:
+                if self._titleSet.text:
+                    self._titleSet.text += "\n"
+                self._titleSet.text += line.replace("\t", "    ")
+
+def parseDiscInfo(text):
+    """ Return :class:`DiscInfo` from `dvdbackup -I` output `text` """
+    parser = DiscInfoParser()
+    parser.feed(text)
+    return parser.finish()
+
+def mountPoint(device):
+    """ Return mount point of `device`, or None if it isn't mounted """
+    device = os.path.realpath(device)
+    try:
+        with open("/proc/mounts") as fileobj:
+            for line in fileobj:
+                dev, mount, *_ = line.split()
+                if os.path.realpath(dev) == device:
+                    # spaces etc. are escaped as octal in /proc/mounts
+                    return re.sub(r"\\(\d{3})", lambda m: chr(int(m.group(1), 8)), mount)
+    except OSError:
+        pass
+    return None
+
+def videoTsPath(device):
+    """ Return path to VIDEO_TS directory for `device` (a device, mount point or directory), if there is one """
+    if os.path.isdir(device):
+        root = device
+    elif (root := mountPoint(device)) is None:
+        return None
+    for path in [root, os.path.join(root, "VIDEO_TS"), os.path.join(root, "video_ts")]:
+        if os.path.exists(os.path.join(path, "VIDEO_TS.IFO")):
+            return path
+    return None
+
+def volumeId(device):
+    """ Return ISO 9660 volume ID of `device`, or "" if it can't be read """
+    if os.path.isdir(device):
+        return ""
+    try:
+        with open(device, "rb") as fileobj:
+            fileobj.seek(16 * SECTOR_SIZE)
+            pvd = fileobj.read(SECTOR_SIZE)
+    except OSError:
+        return ""
+    if pvd[1:6] != b"CD001":
+        return ""
+    return pvd[40:72].decode("ascii", errors="replace").strip()
+
+def fingerprint(device, headerSectors=1024):
+    """ Return fingerprint of disc in `device`
+
+        This is a hash of the volume ID and the IFO files. If the IFO files
+        aren't accessible (i.e. the disc isn't mounted), the first `headerSectors`
+        of the disc, which contain the file system and (usually) VIDEO_TS.IFO,
+        are hashed instead.
+    """
+    h = hashlib.sha1(volumeId(device).encode())
+    if (path := videoTsPath(device)) is not None:
+        for name in sorted(os.listdir(path)):
+            if name.upper().endswith(".IFO"):
+                h.update(name.upper().encode())
+                with open(os.path.join(path, name), "rb") as fileobj:
+                    h.update(fileobj.read())
+    elif not os.path.isdir(device):
+        with open(device, "rb") as fileobj:
+            h.update(fileobj.read(headerSectors * SECTOR_SIZE))
+    return h.hexdigest()
+
+def _u16(data, offset):
+    return struct.unpack_from(">H", data, offset)[0]
+
+def _u32(data, offset):
+    return struct.unpack_from(">I", data, offset)[0]
+
+def _bcd(byte):
+    return (byte >> 4) * 10 + (byte & 0x0f)
+
+def _dvdTime(data, offset):
+    """ Return seconds from BCD `dvd_time_t` at `offset` in `data` """
+    hours, minutes, seconds, frames = data[offset:offset+4]
+    fps = 30000 / 1001 if frames >> 6 == 3 else 25
+    return 3600 * _bcd(hours) + 60 * _bcd(minutes) + _bcd(seconds) + _bcd(frames & 0x3f) / fps
+
+def formatDuration(seconds):
+    seconds = round(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def _language(attr, typeByte, shift):
+    """ Return ISO 639-2 code of the language in audio or subpicture attributes `attr` """
+    code = attr[2:4].decode("ascii", errors="replace").lower()
+    code = _legacyLanguages.get(code, code)
+    if (typeByte >> shift) & 3 != 1 or not (code.isascii() and code.isalpha()):
+        return "und"
+    # codes which aren't in the table are passed through as they are
+    return LANGUAGES[code][0] if code in LANGUAGES else code
+
+def _readIfoFile(path, name):
+    """ Return contents of IFO file `name` in `path`, in any case """
+    names = {fname.upper(): fname for fname in os.listdir(path)}
+    with open(os.path.join(path, names.get(name, name)), "rb") as fileobj:
+        return fileobj.read()
+
+def _readPgc(vts, offset):
+    """ Return dict of the program chain at `offset` in VTS IFO `vts` """
+    numPrograms, numCells = vts[offset+2], vts[offset+3]
+    programMap = offset + _u16(vts, offset + 0xe6)
+    cellPlayback = offset + _u16(vts, offset + 0xe8)
+    cells = []
+    for n in range(numCells):
+        cell = cellPlayback + 24 * n
+        blockMode, blockType = vts[cell] >> 6, (vts[cell] >> 4) & 3
+        # only count the first angle of multi-angle blocks
+        angle = blockType == 1 and blockMode > 1
+        cells.append(0 if angle else _dvdTime(vts, cell + 4))
+    return {"duration": _dvdTime(vts, offset + 4),
+            "programs": list(vts[programMap:programMap+numPrograms]), "cells": cells,
+            "audioControl": [_u16(vts, offset + 0x0c + 2 * n) for n in range(8)],
+            "subpControl": [_u32(vts, offset + 0x1c + 4 * n) for n in range(32)]}
+
+def _programDuration(pgc, pgn):
+    """ Return duration of program `pgn` of `pgc` """
+    programs = pgc["programs"]
+    first = programs[pgn - 1]
+    last = programs[pgn] - 1 if pgn < len(programs) else len(pgc["cells"])
+    return sum(pgc["cells"][first-1:last])
+
+def readTitleSet(path, num):
+    """ Return :class:`TitleSet` and dict of VTS title number: :class:`Title` from VTS_`num`_0.IFO
+
+        Title numbers are numbers within the title set; they are given
+        disc-wide numbers by :func:`readIfo`.
+    """
+    vts = _readIfoFile(path, f"VTS_{num:02d}_0.IFO")
+    if vts[:12] != b"DVDVIDEO-VTS":
+        raise ValueError(f"VTS_{num:02d}_0.IFO is not a DVD title set IFO file")
+    titleSet = TitleSet(num, aspectRatio="16:9" if (vts[0x200] >> 2) & 3 == 3 else "4:3",
+                        audioTracks=min(vts[0x203], 8), subpictures=min(vts[0x255], 32))
+    audioAttrs = [vts[0x204+8*n:0x204+8*(n+1)] for n in range(titleSet.audioTracks)]
+    subpAttrs = [vts[0x256+6*n:0x256+6*(n+1)] for n in range(titleSet.subpictures)]
+
+    pgcit = _u32(vts, 0xcc) * SECTOR_SIZE
+    pgcs = [_readPgc(vts, pgcit + _u32(vts, pgcit + 8 + 8 * n + 4)) for n in range(_u16(vts, pgcit))]
+
+    pttSrpt = _u32(vts, 0xc8) * SECTOR_SIZE
+    numTitles, lastByte = _u16(vts, pttSrpt), _u32(vts, pttSrpt + 4)
+    starts = [pttSrpt + _u32(vts, pttSrpt + 8 + 4 * n) for n in range(numTitles)]
+    ends = starts[1:] + [pttSrpt + lastByte + 1]
+    titles = {}
+    for vtsTitle, (start, end) in enumerate(zip(starts, ends), start=1):
+        ptts = [(_u16(vts, o), _u16(vts, o + 2)) for o in range(start, end - 3, 4)]
+        title = Title(vtsTitle, chapters=len(ptts))
+        title.chapterDurations = [_programDuration(pgcs[pgcn-1], pgn) for pgcn, pgn in ptts
+                                  if 0 < pgcn <= len(pgcs)]
+        pgcns = list(dict.fromkeys(pgcn for pgcn, _ in ptts if 0 < pgcn <= len(pgcs)))
+        title.duration = sum(title.chapterDurations) or sum(pgcs[n-1]["duration"] for n in pgcns)
+        if pgcns:
+            pgc = pgcs[pgcns[0]-1]
+            for n, attr in enumerate(audioAttrs):
+                if not pgc["audioControl"][n] & 0x8000:
+                    continue
+                codec = _audioCodecs.get(attr[0] >> 5, "")
+                stream = (pgc["audioControl"][n] >> 8) & 7
+                track = Track(_language(attr, attr[0], 2), codec, (attr[1] & 7) + 1,
+                              [_audioStreamIds[codec] + stream] if codec in _audioStreamIds else [])
+                title.audio.append(track)
+            for n, attr in enumerate(subpAttrs):
+                if not (control := pgc["subpControl"][n]) & 0x80000000:
+                    continue
+                # stream numbers for 4:3, widescreen, letterbox and pan & scan
+                streams = dict.fromkeys((control >> shift) & 0x1f for shift in (24, 16, 8, 0))
+                title.subtitles.append(Track(_language(attr, attr[0], 0),
+                                             streamIds=[0x20 + stream for stream in streams]))
+            title.audioChannels = max((t.channels for t in title.audio), default=0)
+        titles[vtsTitle] = title
+    return titleSet, titles
+
+def readStreamLanguages(path, num):
+    """ Return dict of MPEG stream ID: ISO 639-2 language code for title set `num` in `path`
+
+        Returns an empty dict if VTS_`num`_0.IFO can't be read.
+    """
+    try:
+        titleSet, titles = readTitleSet(path, num)
+    except (OSError, ValueError, IndexError, struct.error):
+        return {}
+    titleSet.titles = list(titles.values())
+    return titleSet.streamLanguages
+
+def readIfo(device):
+    """ Return :class:`DiscInfo` read from the IFO files of `device`, or None if they can't be read
+
+        `device` can be a device, mount point or VIDEO_TS directory (or its parent).
+    """
+    if (path := videoTsPath(device)) is None:
+        return None
+    try:
+        vmg = _readIfoFile(path, "VIDEO_TS.IFO")
+        if vmg[:12] != b"DVDVIDEO-VMG":
+            return None
+        name = volumeId(device)
+        if not name:
+            root = os.path.dirname(path) if os.path.basename(path).upper() == "VIDEO_TS" else path
+            name = os.path.basename(os.path.abspath(root))
+        info = DiscInfo(name=name)
+        for fname in sorted(os.listdir(path)):
+            info.files[fname] = os.path.getsize(os.path.join(path, fname))
+
+        vtsTitles = {}
+        ttSrpt = _u32(vmg, 0xc4) * SECTOR_SIZE
+        for n in range(_u16(vmg, ttSrpt)):
+            entry = ttSrpt + 8 + 12 * n
+            tsNum, vtsTitle = vmg[entry+6], vmg[entry+7]
+            if tsNum not in info.titleSets:
+                info.titleSets[tsNum], vtsTitles[tsNum] = readTitleSet(path, tsNum)
+            if (title := vtsTitles[tsNum].get(vtsTitle)) is None:
+                continue
+            title.num = n + 1
+            info.titleSets[tsNum].angles = max(info.titleSets[tsNum].angles, vmg[entry+1])
+            info.titleSets[tsNum].titles.append(title)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+    for ts in info.titleSets.values():
+        lines = [f"Title set {ts.num}: aspect ratio {ts.aspectRatio}, {ts.angles} angle(s), "
+                 f"{ts.audioTracks} audio track(s), {ts.subpictures} subpicture(s)"]
+        for title in ts.titles:
+            lines.append(f"    Title {title.num}: {formatDuration(title.duration or 0)}, "
+                         f"{title.chapters} chapters")
+            if title.audio:
+                lines.append(f"        Audio: {', '.join(str(t) for t in title.audio)}")
+            if title.subtitles:
+                lines.append(f"        Subtitles: {', '.join(t.language for t in title.subtitles)}")
+        ts.text = "\n".join(lines)
+    if (main := max(info.titles, key=lambda t: (t.duration or 0, t.chapters), default=None)) is not None:
+        ts = next(ts for ts in info.titleSets.values() if main in ts.titles)
+        info.mainFeature = MainFeature(
+            titleSet=ts.num, aspectRatio=ts.aspectRatio, angles=ts.angles, audioTracks=len(main.audio),
+            subpictures=len(main.subtitles), chapters=main.chapters, audioChannels=main.audioChannels,
+            text=f"Main feature: title {main.num} in title set {ts.num}, "
+                 f"{formatDuration(main.duration or 0)}, {main.chapters} chapters")
+    return info
+
+def infoCmd(device):
+    """ Return `dvdbackup` command to get info for `device` """
+    return ["dvdbackup", "-i", device, "-I"]
+
+def getInfo(device, cacheDir=None, refresh=False, out=sys.stdout, useIfo=True):
+    """ Write info for `device` to `out`
+
+        If `useIfo` is True and the IFO files can be read, a summary of the
+        info is written, followed by the info as JSON on a 'Disc info:' line.
+        Otherwise, `dvdbackup -I` output is written, using cached output if
+        possible.
+
+        Returns the return code of `dvdbackup`, or 0 if the info was read from
+        the IFO files or cache.
+    """
+    fp = None
+    try:
+        fp = fingerprint(device)
+    except OSError as err:
+        # let dvdbackup report the problem
+        out.write(f"Could not fingerprint disc: {err}\n")
+        cachePath = None
+    else:
+        out.write(f"Disc fingerprint: {fp}\n")
+        cachePath = os.path.join(cacheDir, f"{fp}.txt") if cacheDir is not None else None
+    out.flush()
+
+    if useIfo and (info := readIfo(device)) is not None:
+        info.fingerprint = fp
+        out.write(f'DVD-Video information of the DVD with title "{info.name}" from its IFO files\n')
+        out.write(info.summary.strip() + "\n")
+        for ts in info.titleSets.values():
+            if ts is not info.mainTitleSet:
+                out.write(ts.text + "\n")
+        out.write(f"Disc info: {json.dumps(info.asDict())}\n")
+        out.flush()
+        return 0
+
+    if cachePath is not None and not refresh and os.path.exists(cachePath):
+        out.write(f"Using cached info from {cachePath}\n")
+        with open(cachePath) as fileobj:
+            out.write(fileobj.read())
+        out.flush()
+        return 0
+
+    process = subprocess.Popen(infoCmd(device), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors="replace")
+    lines = []
+    for line in process.stdout:
+        lines.append(line)
+        out.write(line)
+        out.flush()
+    rc = process.wait()
+    if rc == 0 and cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmp = cachePath + ".tmp"
+        with open(tmp, "w") as fileobj:
+            fileobj.write("".join(lines))
+        os.replace(tmp, cachePath)
+    return rc
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("device", help="DVD device, mount point or directory")
+    parser.add_argument("--cache-dir", help="Directory to cache info in")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached info")
+    parser.add_argument("--fingerprint", action="store_true", help="Only print the disc fingerprint")
+    parser.add_argument("--dvdbackup", action="store_true",
+                        help="Use dvdbackup, even if the IFO files can be read")
+    args = parser.parse_args(argv)
+
+    if args.fingerprint:
+        print(fingerprint(args.device))
+        return 0
+    return getInfo(args.device, cacheDir=args.cache_dir, refresh=args.refresh,
+                   useIfo=not args.dvdbackup)
+
+if __name__ == '__main__':
+    sys.exit(main())
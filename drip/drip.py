@@ -1,8 +1,14 @@
 from pathlib import Path
-from qtpy.QtWidgets import QTabWidget
+from qtpy.QtWidgets import QTabWidget, QMessageBox, QWidget
+from qtpy.QtCore import QTimer
 from qtpy.QtGui import QIcon
 from .dvdbackupwidget import DvdBackupWidget
 from .ffmpegwidget import FfmpegWidget
+from .queuewidget import QueueWidget
+from .jobqueue import Job
+from .drivescanner import DriveScanner
+from . import vobcat, commands, drives
+import os.path
 
 def get_path():
     p = Path(__file__)
@@ -10,18 +16,157 @@ def get_path():
     return p.parent.parent
 
 class DRip(QTabWidget):
+    """ Main window, with tabs for dvdbackup, ffmpeg and the job queue 
+    
+        Tab widgets are only created when they are first shown or used.
+    """
+    
     def __init__(self):
         super().__init__()
         
-        self.dvdbackup = DvdBackupWidget()
-        self.ffmpeg = FfmpegWidget()
-        
-        self.addTab(self.dvdbackup, "dvdbackup")
-        self.addTab(self.ffmpeg, "ffmpeg")
+        self._tabFactories = {"dvdbackup": self._makeDvdbackup, 
+                              "ffmpeg": self._makeFfmpeg, 
+                              "queue": self._makeQueue}
+        self._tabs = {}
+        self._driveScanner = None
+        for name in self._tabFactories:
+            self.addTab(QWidget(), name)
+        self.currentChanged.connect(self._tabChanged)
         
-        self.dvdbackup.vobPathChanged.connect(self.ffmpeg.vobPathChanged)
+        # make the visible tab after the window has been shown
+        QTimer.singleShot(0, lambda: self._tabChanged(self.currentIndex()))
     
         p = get_path().joinpath('images').joinpath('icon.png')
         icon = QIcon(str(p))
         self.setWindowIcon(icon)
-        
\ No newline at end of file
+        
+    @property
+    def dvdbackup(self):
+        return self._tab("dvdbackup")
+    
+    @property
+    def ffmpeg(self):
+        return self._tab("ffmpeg")
+    
+    @property
+    def queue(self):
+        return self._tab("queue")
+        
+    def _tab(self, name):
+        """ Return widget for tab `name`, creating it if necessary """
+        if (widget := self._tabs.get(name)) is None:
+            widget = self._tabFactories[name]()
+            self._tabs[name] = widget
+            index = list(self._tabFactories).index(name)
+            current = self.currentIndex()
+            self.blockSignals(True)
+            placeholder = self.widget(index)
+            self.removeTab(index)
+            self.insertTab(index, widget, name)
+            self.setCurrentIndex(current)
+            self.blockSignals(False)
+            placeholder.deleteLater()
+        return widget
+    
+    def _tabChanged(self, index):
+        if 0 <= index < self.count():
+            self._tab(list(self._tabFactories)[index])
+            
+    def _makeDvdbackup(self):
+        widget = DvdBackupWidget()
+        widget.vobPathChanged.connect(lambda path: self.ffmpeg.vobPathChanged(path))
+        widget.requestQueue.connect(self._queueJob)
+        return widget
+        
+    def _makeFfmpeg(self):
+        widget = FfmpegWidget()
+        widget.requestBackgroundEncode.connect(
+            lambda name, cmd: self.queue.addJob(Job(name, encodeCmds=[cmd])))
+        return widget
+        
+    def _makeQueue(self):
+        widget = QueueWidget()
+        widget.requestRipAll.connect(self._ripAllDrives)
+        return widget
+        
+    def _queueJob(self):
+        """ Add a job to rip, cat and encode the current title to the queue """
+        if (dvdName := self.dvdbackup.dvdName) is None:
+            QMessageBox.warning(self, "No DVD info", "Get DVD info before adding it to the queue.")
+            return None
+        title = self.dvdbackup.paramWidget.titleBox.value()
+        self.queue.addJob(self._makeJob(self.dvdbackup.device, self.dvdbackup.outdir, 
+                                        self.dvdbackup.discInfo, title))
+        
+    def _makeJob(self, device, outdir, info, title):
+        """ Return :class:`Job` to rip `title` of the DVD in `device` to `outdir` and encode it
+        
+            Streams are not mapped explicitly in the encode command, as the
+            stream selection in the ffmpeg tab belongs to a different file.
+            For the same reason, if auto-analysis is on, the analysed filter is
+            used instead of the Filter field, which may hold the crop of the
+            file in the ffmpeg tab; otherwise the Filter field is used.
+            If there is a rip library, the rip and encode are linked from it
+            if the disc has been done before.
+        """
+        dvdName = info.name
+        chapters = next((t.chapters for t in info.titles if t.num == title), None)
+        ripCmds = [commands.ripCmd(device, outdir, title, self.dvdbackup.extraArgs, 
+                                   name=dvdName, chapters=chapters, fingerprint=info.fingerprint)]
+        vobPath = commands.vobPath(outdir, dvdName)
+        params = self.ffmpeg.paramWidget
+        if params.directVobBox.isChecked():
+            inpath = vobPath
+        else:
+            inpath = os.path.join(vobPath, "output.vob")
+            ripCmds.append(commands.catCmd(vobPath))
+        
+        # the input doesn't exist yet, so make the concat input (for direct 
+        # VOBs) and add the analysed filter when each command starts
+        withInput = lambda cmd: cmd[:cmd.index("-i") + 1] + [vobcat.inputUrl(inpath)] \
+            + cmd[cmd.index("-i") + 2:]
+        analyse = params.autoAnalyseBox.isChecked()
+        cmd = params.getParams(inpath=inpath, outdir=vobPath, streams=[],
+                               videoFilter="" if analyse else None)
+        remux = params.remuxBox.isChecked()
+        if remux:
+            # a playable file straight after ripping; the encode replaces it
+            remuxCmd = commands.remuxCmd(inpath, vobPath)
+            ripCmds.append(lambda: withInput(remuxCmd))
+            cmd = commands.replaceCmd(cmd)
+        encodeCmds = []
+        analysisPath = os.path.join(vobPath, "analysis.json")
+        if analyse:
+            encodeCmds.append(lambda: commands.analyseCmd(inpath, output=analysisPath))
+        encodeCmds.append(lambda: commands.libraryCmd(commands.addVideoFilter(
+            withInput(cmd), commands.analysisFilter(analysisPath) if analyse else None),
+            info.fingerprint, title))
+        
+        name = f"{dvdName} (title {title})"
+        return Job(name, ripCmds=ripCmds, encodeCmds=encodeCmds, device=device, 
+                   fingerprint=info.fingerprint, title=title, inputSize=info.titleSize(title),
+                   preset=params.presetBox.currentText(), crf=params.crfBox.value())
+    
+    def _ripAllDrives(self):
+        """ Scan all drives and queue the main title of each DVD found
+        
+            Each drive rips to its own directory in the dvdbackup output 
+            directory, and all encodes share the queue's encode stage.
+        """
+        if not (devices := drives.discoverDrives()):
+            QMessageBox.warning(self, "No drives", "No optical drives were found.")
+            return None
+        if self._driveScanner is None:
+            self._driveScanner = DriveScanner()
+            self._driveScanner.scanned.connect(self._driveScanned)
+            self._driveScanner.stdout.connect(self.queue.encodeWidget.appendText)
+        self._driveScanner.scan(devices)
+        
+    def _driveScanned(self, device, info):
+        if info is None or not info.name or (title := info.mainTitle) is None:
+            self.queue.encodeWidget.appendText(f"No DVD found in {device}")
+            return None
+        outdir = drives.driveOutdir(self.dvdbackup.outdir, device)
+        os.makedirs(outdir, exist_ok=True)
+        self.queue.addJob(self._makeJob(device, outdir, info, title.num))
+        self.queue.start()
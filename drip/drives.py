@@ -0,0 +1,43 @@
+"""
+Find the optical drives to rip from.
+
+Drives are found by globbing for device nodes, by default '/dev/sr*'. The
+patterns can be set with the DRIP_DRIVES environment variable (separated by
+':'), e.g. to point at fake device nodes, or discovery can be replaced
+entirely with :func:`setDiscoverer`.
+"""
+import glob
+import os
+import re
+
+DRIVE_PATTERNS = ["/dev/sr*"]
+
+_discoverer = None
+
+def _naturalKey(path):
+    return [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", path)]
+
+def globDrives(patterns=None):
+    """ Return list of device paths matching glob `patterns`, in natural order
+
+        If `patterns` is not given, they are taken from DRIP_DRIVES, or
+        :attr:`DRIVE_PATTERNS`.
+    """
+    if patterns is None:
+        env = os.environ.get("DRIP_DRIVES")
+        patterns = env.split(os.pathsep) if env else DRIVE_PATTERNS
+    paths = {path for pattern in patterns if pattern for path in glob.glob(pattern)}
+    return sorted(paths, key=_naturalKey)
+
+def setDiscoverer(func):
+    """ Use `func()` to return the list of drives. If `func` is None, use :func:`globDrives`. """
+    global _discoverer
+    _discoverer = func
+
+def discoverDrives():
+    """ Return list of optical drive device paths """
+    return list((_discoverer or globDrives)())
+
+def driveOutdir(outdir, device):
+    """ Return directory in `outdir` for rips from `device`, so drives don't share output """
+    return os.path.join(outdir, os.path.basename(device))
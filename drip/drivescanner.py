@@ -0,0 +1,46 @@
+from qtpy.QtCore import QObject, Signal
+from .subprocessthread import ProcessRunner
+from .discinfo import DiscInfoParser
+from . import commands
+
+class DriveScanner(QObject):
+    """ Get :class:`DiscInfo` for the DVDs in several drives at once 
+    
+        The info commands run in the process manager, which allows one process
+        per drive, so each drive is scanned independently.
+    """
+    
+    scanned = Signal(str, object)
+    """ **signal** scanned(str device, DiscInfo info) 
+    
+        Emitted when a drive has been scanned. `info` is None if the scan failed.
+    """
+    
+    stdout = Signal(str)
+    """ **signal** stdout(str text) 
+    
+        Output from the info commands
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._scans = {}
+        
+    def scan(self, devices):
+        """ Scan each drive in `devices` which isn't already being scanned """
+        for device in devices:
+            if device in self._scans:
+                continue
+            parser = DiscInfoParser()
+            runner = ProcessRunner()
+            runner.stdout.connect(lambda text, p=parser: p.feed(text + "\n"))
+            runner.stdout.connect(self.stdout)
+            runner.finished.connect(lambda d=device: self._finished(d))
+            self._scans[device] = (runner, parser)
+            runner.start(commands.infoCmd(device))
+            
+    def _finished(self, device):
+        runner, parser = self._scans.pop(device)
+        info = parser.finish() if runner.returncode == 0 else None
+        self.scanned.emit(device, info)
+        runner.deleteLater()
@@ -1,14 +1,15 @@
 from qtpy.QtWidgets import (QFileDialog, QPushButton, QTabWidget, QSpinBox, QWidget,
                             QMessageBox, QCheckBox, QGridLayout, QLabel, QScrollArea,
                             QPlainTextEdit)
-from qtpy.QtCore import Slot, QThread, Signal
+from qtpy.QtCore import Slot, Signal
 from qtpy.QtGui import QIcon
 from customQObjects.widgets import HSplitter, VSplitter
 from .cmdwidget import CmdWidget
-from .subprocessthread import SubprocessWorker
+from .subprocessthread import ProcessRunner
 from .elidebutton import ElideButton
+from .discinfo import DiscInfo, DiscInfoParser
+from . import commands
 import os.path
-import re
 
 class ParamView(QWidget):
     
@@ -109,10 +110,15 @@ class DvdBackupWidget(HSplitter):
     
     vobPathChanged = Signal(str)
     
+    requestQueue = Signal()
+    
     def __init__(self):
         super().__init__()
         
-        self.extraArgs = ["-v", "-p"]
+        self.extraArgs = commands.DVDBACKUP_ARGS
+        
+        self.discInfo = DiscInfo()
+        self._infoParser = DiscInfoParser()
         
         self.paramWidget = ParamView()
         paramScroll = QScrollArea()
@@ -121,10 +127,10 @@ class DvdBackupWidget(HSplitter):
         
         self.paramWidget.valueChanged.connect(self._paramChanged)
         
-        self.infoView = InfoView()
+        self.infoView = InfoView(maxLines=0, logName="dvdbackup-info")
         self.infoWidget = self.infoView.infoWidget #CmdWidget()
-        self.runWidget = CmdWidget()
-        self.catWidget = CmdWidget()
+        self.runWidget = CmdWidget(logName="dvdbackup")
+        self.catWidget = CmdWidget(logName="cat")
         self.infoWidget.requestRun.connect(self._getInfo)
         self.runWidget.requestRun.connect(self._run)
         self.catWidget.requestRun.connect(self._cat)
@@ -134,6 +140,12 @@ class DvdBackupWidget(HSplitter):
         self.autoCatCheckBox.setChecked(True)
         self.runWidget.topLayout.insertWidget(2, self.autoCatCheckBox)
         
+        icon = QIcon.fromTheme("list-add")
+        queueButton = QPushButton(icon, "")
+        queueButton.clicked.connect(self.requestQueue)
+        queueButton.setToolTip("Add rip and encode to the queue")
+        self.runWidget.topLayout.insertWidget(3, queueButton)
+        
         icon = QIcon.fromTheme("folder-open")
         vobPathButton = QPushButton(icon, "")
         vobPathButton.clicked.connect(self._selectVobPath)
@@ -153,35 +165,18 @@ class DvdBackupWidget(HSplitter):
         self.addWidget(paramScroll)
         self.addWidget(self.cmdView)
         
-        self.infoThread = QThread()
-        self.infoWorker = SubprocessWorker()
-        self.infoWorker.moveToThread(self.infoThread)
-        self.infoWorker.stdout.connect(self.infoWidget.appendText)
-        self.infoThread.started.connect(self.infoWorker.start)
-        self.infoThread.started.connect(self.infoWidget.setRunning)
-        self.infoWorker.processComplete.connect(self.infoThread.quit)
-        self.infoThread.finished.connect(self.infoWidget.setRunComplete)
-        self.infoThread.finished.connect(self._infoComplete)
-        
-        self.runThread = QThread()
-        self.runWorker = SubprocessWorker()
-        self.runWorker.moveToThread(self.runThread)
-        self.runWorker.stdout.connect(self.runWidget.appendText)
-        self.runThread.started.connect(self.runWorker.start)
-        self.runThread.started.connect(self.runWidget.setRunning)
-        self.runWorker.processComplete.connect(self.runThread.quit)
-        self.runThread.finished.connect(self.runWidget.setRunComplete)
-        self.runThread.finished.connect(self._checkCat)
-        
-        self.catThread = QThread()
-        self.catWorker = SubprocessWorker(shell=True)
-        self.catWorker.moveToThread(self.catThread)
-        self.catWorker.stdout.connect(self.catWidget.appendText)
-        self.catThread.started.connect(self.catWorker.start)
-        self.catThread.started.connect(self.catWidget.setRunning)
-        self.catWorker.processComplete.connect(self.catThread.quit)
-        self.catThread.finished.connect(self.catWidget.setRunComplete)
-        self.catThread.finished.connect(self.catComplete)
+        self.infoWorker = ProcessRunner()
+        self.infoWorker.connectCmdWidget(self.infoWidget)
+        self.infoWorker.stdout.connect(self._feedInfo)
+        self.infoWorker.finished.connect(self._infoComplete)
+        
+        self.runWorker = ProcessRunner()
+        self.runWorker.connectCmdWidget(self.runWidget)
+        self.runWorker.finished.connect(self._checkCat)
+        
+        self.catWorker = ProcessRunner()
+        self.catWorker.connectCmdWidget(self.catWidget)
+        self.catWorker.finished.connect(self.catComplete)
         
     ## DVD DEVICE
     @property
@@ -231,59 +226,33 @@ class DvdBackupWidget(HSplitter):
     
     @property
     def infoCmd(self):
-        return ["dvdbackup", "-i", self.device, "-I"]
+        return commands.infoCmd(self.device)
     
     def _getInfo(self):
         if not os.path.exists(self.device):
             raise ValueError
             
-        self.infoWorker.cmd = self.infoCmd
-        self.infoThread.start()
+        self._infoParser.reset()
+        self.infoWorker.start(self.infoCmd)
+        
+    def _feedInfo(self, text):
+        self._infoParser.feed(text + "\n")
         
     def _infoComplete(self):
-        self.dvdname, info, titleset = self._parseInfo()
-        self.infoView.setSummaryInfo(f"{info}\n{titleset}")
+        self.discInfo = self._infoParser.finish()
+        self.infoView.setSummaryInfo(self.discInfo.summary)
+        if self.discInfo.titles:
+            titleBox = self.paramWidget.titleBox
+            titleBox.setMaximum(max(title.num for title in self.discInfo.titles))
+            if (mainTitle := self.discInfo.mainTitle) is not None:
+                titleBox.setValue(mainTitle.num)
+        # rip resumably, now that the DVD name and chapters are known
+        self.setRunCmd()
         self.catCmd = self._getCatCmd(prompt=False)
         if self.catCmd is not None:
             self.catWidget.setCmd(self.catCmd)
             self.vobPathChanged.emit(self.vobPath)
         
-    def _parseInfo(self):
-        """ Get dvd name and guessed main title set """
-        dvdname = ""
-        mainFeatureInfo = ""
-        titleSet = ""
-        
-        if (m := re.search(r'DVD-Video information of the DVD with title "(?P<name>.*)"', self.infoWidget.text)) is not None:
-            dvdname = m.group('name')
-        if (m := re.search(r'(?P<mainfeature>Main feature:.*?)\n\n', self.infoWidget.text, re.DOTALL)) is not None:
-            mainFeatureInfo = m.group('mainfeature')
-        if mainFeatureInfo:
-            if (m := re.search(r'Title set containing the main feature is (?P<num>\d+)', mainFeatureInfo)) is not None:
-                num = m.group('num')
-                
-                titleSets = re.split("Title Sets:", self.infoWidget.text)[-1]
-                
-                ts = {}
-                tset = ""
-                idx = '0'
-                for line in titleSets.split("\n"):
-                    if (m:=re.match(r"\tTitle set (?P<num>\d+)", line)) is not None:
-                        if tset.strip():
-                            ts[idx] = tset
-                        idx = m.group('num')
-                        tset = ""
-                    line = re.sub(r"\t", "    ", line)
-                    tset += line + "\n"
-                    
-                if tset.strip():
-                    ts[idx] = tset
-                titleSet = ts[num].strip()
-                
-                mainFeatureInfo = re.sub(r"\t", "    ", mainFeatureInfo)
-                
-        return dvdname, mainFeatureInfo, titleSet
-        
     ## DVDBACKUP COMMAND
     def setRunCmd(self):
         try:
@@ -294,8 +263,11 @@ class DvdBackupWidget(HSplitter):
         
     @property
     def runCmd(self):
-        titleNum = str(self.paramWidget.titleBox.value())
-        return ["dvdbackup", "-i", self.device, "-o", self.outdir, "-t", titleNum] + self.extraArgs
+        titleNum = self.paramWidget.titleBox.value()
+        chapters = next((t.chapters for t in self.discInfo.titles if t.num == titleNum), None)
+        return commands.ripCmd(self.device, self.outdir, titleNum, self.extraArgs, 
+                               name=self.dvdName, chapters=chapters, 
+                               fingerprint=self.discInfo.fingerprint)
         
     def _run(self):
         if not os.path.exists(self.device):
@@ -304,8 +276,7 @@ class DvdBackupWidget(HSplitter):
         if not os.path.exists(self.outdir):
             raise ValueError
             
-        self.runWorker.cmd = self.runCmd
-        self.runThread.start()
+        self.runWorker.start(self.runCmd)
         
     ## CAT COMMAND
     @Slot()
@@ -314,6 +285,9 @@ class DvdBackupWidget(HSplitter):
         if self.catCmd is not None:
             self.catWidget.setCmd(self.catCmd)
         if not self.autoCatCheckBox.isChecked():
+            if self.runWorker.returncode == 0 and self.dvdName is not None:
+                # VOBs can be read directly by ffmpeg
+                self.vobPathChanged.emit(self.vobPath)
             return None
         else:
             self.cmdView.setCurrentWidget(self.catWidget)
@@ -321,18 +295,15 @@ class DvdBackupWidget(HSplitter):
             
     @property    
     def vobPath(self):
-        return os.path.join(self.outdir, self.dvdName, "VIDEO_TS")
+        return commands.vobPath(self.outdir, self.dvdName)
     
     @property
     def dvdName(self):
-        """ Parse `infoWidget` text for DVD name """
-        if (m := re.search(r'DVD-Video information of the DVD with title "(?P<dvdname>.+)"', self.infoWidget.text)) is not None:
-            return m.group('dvdname')
-        else:
-            return None
+        """ DVD name from the last info scan, or None """
+        return self.discInfo.name or None
         
     def catComplete(self):
-        if self.autoCatCheckBox.isChecked():
+        if self.autoCatCheckBox.isChecked() and self.catWorker.returncode == 0:
             self.vobPathChanged.emit(self.vobPath)
         self.resetCatCmd()
         
@@ -361,19 +332,15 @@ class DvdBackupWidget(HSplitter):
         if path:
             self.catCmd = self._makeCatCmd(path)
             self.catWidget.setCmd(self.catCmd)
-            self.catWorker.cmd = self.catCmd
         return path
     
     def _makeCatCmd(self, path):
-        path = re.sub(r" ", "\\ ", path)
-        outpath = os.path.join(path, "output.vob")
-        return [f"cat {path}{os.path.sep}*.VOB > {outpath}"]
+        return commands.catCmd(path)
             
     def _cat(self):
         if self.catCmd is None:
             self.catCmd = self._getCatCmd()
         if self.catCmd is not None:
             self.catWidget.setCmd(self.catCmd)
-            self.catWorker.cmd = self.catCmd
-            self.catThread.start()
+            self.catWorker.start(self.catCmd)
         
\ No newline at end of file
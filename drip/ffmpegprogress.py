@@ -0,0 +1,112 @@
+"""
+Parse the machine-readable output of ffmpeg's `-progress` option.
+"""
+from dataclasses import dataclass
+import re
+
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:1"]
+""" ffmpeg args to write progress to stdout, one key=value per line """
+
+_keyValueRe = re.compile(r"^(?P<key>[a-z_0-9]+)=(?P<value>\S*)$")
+_durationRe = re.compile(r"Duration: (?P<time>\d+:\d\d:\d\d(\.\d+)?)")
+
+def parseTime(text):
+    """ Return seconds from 'HH:MM:SS.ms' string """
+    h, m, s = text.split(":")
+    return 3600 * int(h) + 60 * int(m) + float(s)
+
+def formatTime(seconds):
+    """ Return 'HH:MM:SS' string from `seconds` """
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def _float(value):
+    try:
+        return float(value.rstrip("x").removesuffix("kbits/s"))
+    except ValueError:
+        return None
+
+@dataclass
+class FfmpegProgress:
+    frame: int = 0
+    fps: float = None
+    outTime: float = 0
+    speed: float = None
+    totalSize: int = 0
+    bitrate: float = None
+    """ Output bitrate in kbit/s """
+    duration: float = None
+    """ Duration of the input, if known """
+    finished: bool = False
+
+    @property
+    def percent(self):
+        if not self.duration:
+            return None
+        return min(100, 100 * self.outTime / self.duration)
+
+    @property
+    def eta(self):
+        """ Estimated seconds remaining, if known """
+        if self.finished:
+            return 0
+        if not self.duration or not self.speed:
+            return None
+        return max(0, self.duration - self.outTime) / self.speed
+
+    def __str__(self):
+        items = [f"frame {self.frame}"]
+        if self.fps is not None:
+            items.append(f"{self.fps:.1f} fps")
+        if self.speed is not None:
+            items.append(f"{self.speed:.2f}x")
+        items.append(f"{self.totalSize / 1024**2:.1f} MiB")
+        if self.bitrate is not None:
+            items.append(f"{self.bitrate:.0f} kbit/s")
+        items.append(formatTime(self.outTime))
+        if (eta := self.eta) is not None:
+            items.append(f"ETA {formatTime(eta)}")
+        return " | ".join(items)
+
+class FfmpegProgressParser:
+    """ Parse lines of ffmpeg output into :class:`FfmpegProgress` objects
+
+        Lines should be given to :meth:`feed`. If `duration` is not given, it
+        is taken from the 'Duration:' line that ffmpeg writes for its input.
+    """
+
+    def __init__(self, duration=None):
+        self.reset(duration)
+
+    def reset(self, duration=None):
+        self.duration = duration
+        self._values = {}
+
+    @staticmethod
+    def isProgressLine(line):
+        return _keyValueRe.match(line) is not None
+
+    def feed(self, line):
+        """ Parse `line`. Returns :class:`FfmpegProgress` if `line` completes a progress block. """
+        if (m := _keyValueRe.match(line)) is None:
+            if self.duration is None and (m := _durationRe.search(line)) is not None:
+                self.duration = parseTime(m.group('time'))
+            return None
+
+        key, value = m.group('key'), m.group('value')
+        if key != "progress":
+            self._values[key] = value
+            return None
+
+        values, self._values = self._values, {}
+        progress = FfmpegProgress(duration=self.duration, finished=(value == "end"))
+        if (frame := values.get("frame", "")).isdigit():
+            progress.frame = int(frame)
+        if (size := values.get("total_size", "")).isdigit():
+            progress.totalSize = int(size)
+        progress.fps = _float(values.get("fps", ""))
+        progress.speed = _float(values.get("speed", ""))
+        progress.bitrate = _float(values.get("bitrate", ""))
+        if (us := values.get("out_time_us", "")).lstrip("-").isdigit():
+            progress.outTime = max(0, int(us) / 1e6)
+        return progress
@@ -1,67 +1,35 @@
 from qtpy.QtWidgets import (QLabel, QFileDialog, QWidget, QGridLayout, QTabWidget, 
-                            QHBoxLayout, QCheckBox, QLineEdit, QSpinBox, QScrollArea)
-from qtpy.QtCore import Signal, QThread
+                            QHBoxLayout, QCheckBox, QLineEdit, QSpinBox, QScrollArea,
+                            QComboBox, QPushButton)
+from qtpy.QtCore import Signal
 from customQObjects.widgets import HSplitter
 from .cmdwidget import CmdWidget
-from .subprocessthread import SubprocessWorker
+from .subprocessthread import ProcessRunner
 from .elidebutton import ElideButton
+from .ffmpegprogress import FfmpegProgressParser
+from .probe import ProbeResult, ProbeCache, probeCmd, discLanguages
+from .streamview import StreamView
+from .renditionview import RenditionView
+from . import commands, autotune, analyse, library
 import os
-import re
-from dataclasses import dataclass, field
-        
-@dataclass
-class StreamInfo:
-    num: str
-    streamType: str
-    info: str
-    selected: bool = False
-    hasMetadata: bool = False
-    metadata: dict[str] = field(default_factory=dict)
-    
-    @property
-    def label(self):
-        return f"Stream #{self.num}: {self.streamType}: {self.info}"
-    
-    @property
-    def stype(self):
-        return self.streamType.lower()
-    
-    def setSelected(self, state):
-        selected = False if state == 0 else True # `state` is Qt.CheckState enum
-        self.selected = selected
-        
-    def setMetadata(self, language=None, title=None):
-        self.hasMetadata = True
-        if language is not None:
-            self.metadata['language'] = language
-        if title is not None:
-            self.metadata['title'] = title
-            
-    def setMetadataLanguage(self, language):
-        self.setMetadata(language=language)
-        
-    def setMetadataTitle(self, title):
-        self.setMetadata(title=title)
-            
-    def getStreamInfo(self) -> list[str]:
-        if not self.selected:
-            return None
-        cmd = ["-map", self.num]
-        if self.hasMetadata:
-            if self.stype == "audio":
-                metadataId = "s:a:0"
-            elif self.stype == "subtitle":
-                metadataId = "s:s:0"
-            if (language := self.metadata.get("language", None)) is not None:
-                cmd += [f"-metadata:{metadataId}", f"language={language}"]
-            if (title := self.metadata.get("title", None)) is not None:
-                cmd += [f"-metadata:{metadataId}", f"title={title}"]
-        return cmd
+import json
 
 class ParamView(QWidget):
     
     valueChanged = Signal(str, object)
     
+    requestAutoTune = Signal()
+    """ **signal** requestAutoTune()
+    
+        Emitted when the auto-tune button is clicked
+    """
+    
+    requestAnalyse = Signal()
+    """ **signal** requestAnalyse()
+    
+        Emitted when the analyse button is clicked
+    """
+    
     def __init__(self):
         super().__init__()
         
@@ -77,7 +45,37 @@ class ParamView(QWidget):
         self.outdirButton.setToolTip("Select output directory")
         self.outdir = os.path.join(os.path.expanduser('~'), "Videos", "temp")
         
-        self.streamInfo = []
+        self.directVobBox = QCheckBox("Read VOBs directly")
+        self.directVobBox.setToolTip("Read the ripped *.VOB files directly, instead of a concatenated output.vob")
+        self.directVobBox.toggled.connect(lambda state: self.valueChanged.emit("directVob", state))
+        
+        self.parallelBox = QCheckBox("Parallel encode")
+        self.parallelBox.setToolTip("Split the input into segments and encode them in parallel processes")
+        self.parallelBox.toggled.connect(lambda state: self.valueChanged.emit("parallel", state))
+        
+        self.resumableBox = QCheckBox("Resumable encode")
+        self.resumableBox.setToolTip("Encode in checkpointed segments, so an interrupted encode continues from the last finished segment")
+        self.resumableBox.toggled.connect(lambda state: self.valueChanged.emit("resumable", state))
+        
+        self.streamView = StreamView()
+        self.streamModel = self.streamView.model()
+        self.streamModel.streamChanged.connect(lambda stream: self.valueChanged.emit(stream.num, stream))
+        
+        renditionsLabel = QLabel("Renditions:")
+        renditionsLabel.setToolTip("Extra outputs, written by the same ffmpeg process as the main output")
+        self.renditionView = RenditionView()
+        self.renditionModel = self.renditionView.model()
+        self.renditionModel.renditionsChanged.connect(self._renditionsChanged)
+        self.addRenditionButton = QPushButton("Add")
+        self.addRenditionButton.setToolTip("Add an output with its own CRF, preset, height and streams, "
+                                           "encoded from the same decode of the input")
+        self.addRenditionButton.clicked.connect(self.addRendition)
+        self.removeRenditionButton = QPushButton("Remove")
+        self.removeRenditionButton.setToolTip("Remove the selected rendition")
+        self.removeRenditionButton.clicked.connect(self.removeRendition)
+        renditionsLayout = QHBoxLayout()
+        renditionsLayout.addWidget(self.addRenditionButton)
+        renditionsLayout.addWidget(self.removeRenditionButton)
         
         threadsLabel = QLabel("Threads:")
         self.threadsBox = QSpinBox()
@@ -98,81 +96,114 @@ class ParamView(QWidget):
         crfLayout.addWidget(crfLabel)
         crfLayout.addWidget(self.crfBox)
         
+        presetLabel = QLabel("Preset:")
+        self.presetBox = QComboBox()
+        self.presetBox.addItems(autotune.PRESETS)
+        self.presetBox.setCurrentText("medium")
+        self.tuneButton = QPushButton("Auto-tune")
+        self.tuneButton.setToolTip("Encode short samples to choose the fastest preset and thread count that meets the target")
+        self.tuneButton.clicked.connect(self.requestAutoTune)
+        
+        targetLabel = QLabel("Target:")
+        self.sizeToleranceBox = QSpinBox()
+        self.sizeToleranceBox.setRange(0, 100)
+        self.sizeToleranceBox.setValue(10)
+        self.sizeToleranceBox.setPrefix("size +")
+        self.sizeToleranceBox.setSuffix("%")
+        self.sizeToleranceBox.setToolTip("Acceptable size increase over the smallest sample encode")
+        self.minFpsBox = QSpinBox()
+        self.minFpsBox.setRange(0, 10000)
+        self.minFpsBox.setSpecialValueText("any fps")
+        self.minFpsBox.setSuffix(" fps")
+        self.minFpsBox.setToolTip("Minimum acceptable encoding speed")
+        targetLayout = QHBoxLayout()
+        targetLayout.addWidget(self.sizeToleranceBox)
+        targetLayout.addWidget(self.minFpsBox)
+        
+        filterLabel = QLabel("Filter:")
+        self.filterEdit = QLineEdit()
+        self.filterEdit.setPlaceholderText("none")
+        self.filterEdit.setToolTip("ffmpeg video filter, e.g. to crop and deinterlace")
+        self.analyseButton = QPushButton("Analyse")
+        self.analyseButton.setToolTip("Detect letterbox bars and interlacing in samples of the input, and set the filter")
+        self.analyseButton.clicked.connect(self.requestAnalyse)
+        self.autoAnalyseBox = QCheckBox("Analyse queued jobs")
+        self.autoAnalyseBox.setToolTip("Detect crop and interlacing before encoding each queued job")
+        self.autoAnalyseBox.setChecked(True)
+        
+        self.remuxBox = QCheckBox("Remux now, encode later")
+        self.remuxBox.setToolTip("Copy the selected streams to the output straight away, then queue "
+                                 "the encode at idle priority, replacing the remux when it finishes")
+        self.remuxBox.toggled.connect(lambda state: self.valueChanged.emit("remux", state))
+        
         self.threadsBox.valueChanged.connect(lambda value: self.valueChanged.emit("threads", value))
+        self.filterEdit.textChanged.connect(lambda text: self.valueChanged.emit("filter", text))
         self.crfBox.valueChanged.connect(lambda value: self.valueChanged.emit("crf", value))
+        self.presetBox.currentTextChanged.connect(lambda text: self.valueChanged.emit("preset", text))
         
         self.layout = QGridLayout()
         self.layout.addWidget(self.inpathButton, 0, 0, 1, 3)
         self.layout.addWidget(self.outdirButton, 1, 0, 1, 3)
-        self.layout.addWidget(threadsLabel, 2, 0)
-        self.layout.addWidget(self.threadsBox, 2, 1, 1, 2)
-        self.layout.addWidget(crfLabel, 3, 0)
-        self.layout.addWidget(self.crfBox, 3, 1, 1, 2)
-        
-        self._streamLayoutRowNum = 4
-        
-        self._stretchItemRow = self.layout.rowCount()
-        self.layout.setRowStretch(self._stretchItemRow, 1)
+        self.layout.addWidget(self.directVobBox, 2, 0, 1, 3)
+        self.layout.addWidget(threadsLabel, 3, 0)
+        self.layout.addWidget(self.threadsBox, 3, 1, 1, 2)
+        self.layout.addWidget(crfLabel, 4, 0)
+        self.layout.addWidget(self.crfBox, 4, 1, 1, 2)
+        self.layout.addWidget(presetLabel, 5, 0)
+        self.layout.addWidget(self.presetBox, 5, 1)
+        self.layout.addWidget(self.tuneButton, 5, 2)
+        self.layout.addWidget(targetLabel, 6, 0)
+        self.layout.addLayout(targetLayout, 6, 1, 1, 2)
+        self.layout.addWidget(self.parallelBox, 7, 0, 1, 3)
+        self.layout.addWidget(self.resumableBox, 8, 0, 1, 3)
+        self.layout.addWidget(filterLabel, 9, 0)
+        self.layout.addWidget(self.filterEdit, 9, 1)
+        self.layout.addWidget(self.analyseButton, 9, 2)
+        self.layout.addWidget(self.autoAnalyseBox, 10, 0, 1, 3)
+        self.layout.addWidget(self.remuxBox, 11, 0, 1, 3)
+        self.layout.addWidget(renditionsLabel, 12, 0)
+        self.layout.addLayout(renditionsLayout, 12, 1, 1, 2)
+        self.layout.addWidget(self.renditionView, 13, 0, 1, 3)
+        
+        self.layout.addWidget(self.streamView, 14, 0, 1, 3)
+        self.layout.setRowStretch(14, 1)
         
         self.setLayout(self.layout)
 
-    def addStream(self, num, streamType, info):
-        
-        # remove stretch from (current) last row
-        self.layout.setRowStretch(self._stretchItemRow, 0)
-        
-        streamInfo = StreamInfo(num, streamType, info)
-        
-        box = QCheckBox()
-        box.stateChanged.connect(streamInfo.setSelected)
-        box.stateChanged.connect(lambda state: self.valueChanged.emit(num, state))
-        
-        label = QLabel(streamInfo.label)
-        label.setStyleSheet("text-align: left;")
-        
-        nextRow = self.layout.rowCount() + 1
-        self.layout.addWidget(box, nextRow, 0)
-        self.layout.addWidget(label, nextRow, 1, 1, 2)
-        inc = 0
-        if streamType.lower() in ['audio', 'subtitle']:
-            inc += 1
-            
-            language = "eng"
-            title = "English"
-            langLabel = QLabel("Language: ")
-            langEdit = QLineEdit(language)
-            titleLabel = QLabel("Title: ")
-            titleEdit = QLineEdit(title)
-            
-            self.layout.addWidget(langLabel, nextRow+inc, 1)
-            self.layout.addWidget(langEdit, nextRow+inc, 2)
-            inc += 1
-            self.layout.addWidget(titleLabel, nextRow+inc, 1)
-            self.layout.addWidget(titleEdit, nextRow+inc, 2)
-        # inc += 1
-        
-            langEdit.textChanged.connect(streamInfo.setMetadataLanguage)
-            titleEdit.textChanged.connect(streamInfo.setMetadataTitle)
-            
-            langEdit.textChanged.connect(lambda text: self.valueChanged.emit(f"{num}-language", text))
-            titleEdit.textChanged.connect(lambda text: self.valueChanged.emit(f"{num}-title", text))
-            
-            streamInfo.setMetadata(language=language, title=title)
-            
-        self.streamInfo.append(streamInfo)
-        
-        # add stretch to last row
-        self._stretchItemRow += inc + 1
-        self.layout.setRowStretch(self._stretchItemRow, 1)
+    @property
+    def streamInfo(self):
+        """ List of :class:`StreamInfo` shown in the stream table """
+        return self.streamModel.streams
+
+    def setStreams(self, streams):
+        """ Show `streams` in the stream table, replacing any previous streams """
+        self.streamModel.setStreams(streams)
+
+    def clearStreams(self):
+        self.streamModel.clear()
         
-    def _removeStreams(self):
-        for row in range(self._streamLayoutRowNum, self.layout.rowCount()):
-            for col in range(self.layout.columnCount()):
-                item = self.layout.itemAtPosition(row, col)
-                if item is not None:
-                    w = item.widget()
-                    self.layout.removeWidget(w)
-                    w.deleteLater()
+    @property
+    def renditions(self):
+        """ List of extra :class:`commands.Rendition` outputs """
+        return self.renditionModel.renditions
+    
+    def addRendition(self):
+        """ Add a rendition with the current CRF and preset """
+        self.renditionModel.addRendition(commands.Rendition(
+            self.renditionModel.uniqueName(), crf=self.crfBox.value(),
+            preset=self.presetBox.currentText()))
+        
+    def removeRendition(self):
+        """ Remove the selected rendition """
+        if (indexes := self.renditionView.selectionModel().selectedRows()):
+            self.renditionModel.removeRendition(indexes[0].row())
+        
+    def _renditionsChanged(self):
+        # parallelencode splits and joins a single output
+        multiOutput = bool(self.renditions)
+        self.parallelBox.setEnabled(not multiOutput)
+        self.resumableBox.setEnabled(not multiOutput)
+        self.valueChanged.emit("renditions", self.renditions)
         
     @property
     def inpath(self):
@@ -210,22 +241,72 @@ class ParamView(QWidget):
         if filename:
             self.outdir = filename
         
-    def getParams(self):
-        cmd = ["ffmpeg", "-analyzeduration", "100M", "-probesize", "100M", "-i", self.inpath]
-        for streamInfo in self.streamInfo:
-            info = streamInfo.getStreamInfo()
-            if info is not None:
-                cmd += info
-        cmd += ["-threads", str(self.threadsBox.value()),
-               "-codec:v", "libx264",
-               "-crf", str(self.crfBox.value()),
-               "-codec:a", "copy",
-               "-codec:s", "copy",
-               os.path.join(self.outdir, "output.mkv")]
-        return cmd
+    def getParams(self, inpath=None, outdir=None, streams=None, videoFilter=None):
+        """ Return ffmpeg command 
+        
+            `inpath`, `outdir`, `streams` and `videoFilter` default to the 
+            current values in this widget. If `inpath` is a directory of *.VOB files, they 
+            will be read directly with ffmpeg's concat protocol.
+            
+            Any :attr:`renditions` are written by the same command, in which 
+            case the encode isn't parallel or resumable.
+            
+            See :func:`commands.encodeCmd`.
+        """
+        if inpath is None:
+            inpath = self.inpath
+        if outdir is None:
+            outdir = self.outdir
+        if streams is None:
+            streams = self.streamInfo
+        if videoFilter is None:
+            videoFilter = self.filterEdit.text().strip()
+        multiOutput = bool(self.renditions)
+        return commands.encodeCmd(inpath, outdir, streams=streams, threads=self.threadsBox.value(),
+                                  crf=self.crfBox.value(), preset=self.presetBox.currentText(),
+                                  videoFilter=videoFilter,
+                                  parallel=self.parallelBox.isChecked() and not multiOutput,
+                                  resumable=self.resumableBox.isChecked() and not multiOutput,
+                                  renditions=self.renditions)
+    
+    def getRemuxParams(self, inpath=None, outdir=None, streams=None):
+        """ Return ffmpeg command to copy the selected streams without re-encoding
+        
+            Arguments default to the current values, as for :meth:`getParams`.
+        """
+        if inpath is None:
+            inpath = self.inpath
+        if outdir is None:
+            outdir = self.outdir
+        if streams is None:
+            streams = self.streamInfo
+        return commands.remuxCmd(inpath, outdir, streams=streams)
+    
+    def getTuneParams(self):
+        """ Return command to auto-tune the preset and threads for the current input """
+        return commands.tuneCmd(self.inpath, self.outdir, crf=self.crfBox.value(), 
+                                videoFilter=self.filterEdit.text().strip(),
+                                sizeTolerance=self.sizeToleranceBox.value(),
+                                minFps=self.minFpsBox.value())
+    
+    def setTuneResult(self, result):
+        """ Set preset and threads from :func:`autotune.parseResult` dict """
+        self.presetBox.setCurrentText(result['preset'])
+        self.threadsBox.setValue(result['threads'])
+        
+    def setAnalysisResult(self, result):
+        """ Set filter from :func:`analyse.parseResult` dict """
+        self.filterEdit.setText(result['filter'] or "")
         
 
 class FfmpegWidget(HSplitter):
+    
+    requestBackgroundEncode = Signal(str, object)
+    """ **signal** requestBackgroundEncode(str name, list cmd)
+    
+        Emitted when a remux has finished, with the encode to queue
+    """
+    
     def __init__(self):
         super().__init__()
         
@@ -235,12 +316,19 @@ class FfmpegWidget(HSplitter):
         paramScroll.setWidgetResizable(True)
         
         self.paramWidget.valueChanged.connect(self._paramChanged)
+        self.paramWidget.requestAutoTune.connect(self._autoTune)
+        self.paramWidget.requestAnalyse.connect(self._analyse)
         
         self.inpath = ""
         self.outdir = os.path.join(os.path.expanduser('~'), "Videos", "temp")
-        
-        self.infoWidget = CmdWidget()
-        self.runWidget = CmdWidget()
+        self._vobPath = None
+        self._probe = None
+        self._probePath = None
+        self._laterCmd = None
+        self.probeCache = ProbeCache()
+        
+        self.infoWidget = CmdWidget(maxLines=0, logName="ffmpeg-info")
+        self.runWidget = CmdWidget(logName="ffmpeg")
         self.infoWidget.requestRun.connect(self._getInfo)
         
         self.runWidget.requestRun.connect(self._run)
@@ -255,28 +343,34 @@ class FfmpegWidget(HSplitter):
         self.addWidget(paramScroll)
         self.addWidget(self.cmdView)
         
-        self.infoThread = QThread()
-        self.infoWorker = SubprocessWorker()
-        self.infoWorker.moveToThread(self.infoThread)
-        self.infoWorker.stdout.connect(self.infoWidget.appendText)
-        self.infoThread.started.connect(self.infoWorker.start)
-        self.infoThread.started.connect(self.infoWidget.setRunning)
-        self.infoWorker.processComplete.connect(self.infoThread.quit)
-        self.infoThread.finished.connect(self.infoWidget.setRunComplete)
-        self.infoThread.finished.connect(self._setStreamInfo)
-        
-        self.runThread = QThread()
-        self.runWorker = SubprocessWorker()
-        self.runWorker.moveToThread(self.runThread)
-        self.runWorker.stdout.connect(self.runWidget.appendText)
-        self.runThread.started.connect(self.runWorker.start)
-        self.runThread.started.connect(self.runWidget.setRunning)
-        self.runWorker.processComplete.connect(self._runFinished)
-        self.runThread.finished.connect(self.runWidget.setRunComplete)
+        self.infoWorker = ProcessRunner()
+        self.infoWorker.connectCmdWidget(self.infoWidget)
+        self.infoWorker.finished.connect(self._setStreamInfo)
+        self._probeOutput = []
+        self.infoWorker.output.connect(self._probeOutput.extend)
+        
+        self.runWorker = ProcessRunner(progressParser=FfmpegProgressParser())
+        self.runWorker.connectCmdWidget(self.runWidget)
+        self.runWorker.finished.connect(self._runFinished)
+        
+        self._tuneOutput = []
+        self.tuneWorker = ProcessRunner()
+        self.tuneWorker.connectCmdWidget(self.runWidget)
+        self.tuneWorker.stdout.connect(self._tuneOutput.append)
+        self.tuneWorker.finished.connect(self._tuneFinished)
+        
+        self._analyseOutput = []
+        self.analyseWorker = ProcessRunner()
+        self.analyseWorker.connectCmdWidget(self.runWidget)
+        self.analyseWorker.stdout.connect(self._analyseOutput.append)
+        self.analyseWorker.finished.connect(self._analyseFinished)
         
     @property
     def runCmd(self):
-         return self.paramWidget.getParams()
+        """ Encode command, or the remux command if remuxing first """
+        if self.paramWidget.remuxBox.isChecked():
+            return self.paramWidget.getRemuxParams()
+        return self.paramWidget.getParams()
         
     @property
     def inpath(self):
@@ -302,10 +396,16 @@ class FfmpegWidget(HSplitter):
             self._inpath = value
         if name == "outdir":
               self._outdir = value
+        if name == "directVob" and self._vobPath is not None:
+            self.vobPathChanged(self._vobPath)
         self.setRunCmd()
         
     def vobPathChanged(self, path):
-        self.paramWidget.inpath = os.path.join(path, "output.vob")
+        self._vobPath = path
+        if self.paramWidget.directVobBox.isChecked():
+            self.paramWidget.inpath = path
+        else:
+            self.paramWidget.inpath = os.path.join(path, "output.vob")
         self.paramWidget.outdir = path
             
     def setInfoCmd(self):
@@ -317,15 +417,19 @@ class FfmpegWidget(HSplitter):
         
     @property
     def infoCmd(self):
-        return ["ffmpeg", "-analyzeduration", "100M", "-probesize", "100M", "-i", self.inpath]
+        return probeCmd(self.inpath)
     
     def _getInfo(self):
         if not os.path.exists(self.inpath):
             raise ValueError
             
-        self.paramWidget._removeStreams()
-        self.infoWorker.cmd = self.infoCmd
-        self.infoThread.start()
+        self.paramWidget.clearStreams()
+        if (data := self.probeCache.get(self.inpath)) is not None:
+            self.infoWidget.setText(f"Cached probe of {self.inpath}\n{json.dumps(data, indent=4)}")
+            self._loadProbe(data)
+        else:
+            self._probeOutput.clear()
+            self.infoWorker.start(self.infoCmd)
         
     def setRunCmd(self):
         try:
@@ -341,16 +445,69 @@ class FfmpegWidget(HSplitter):
         if not os.path.exists(self.outdir):
             raise ValueError
             
-        self.runWorker.cmd = self.runCmd
-        self.runThread.start()
+        duration = self._probe.duration if self._probePath == self.inpath else None
+        self.runWorker.progressParser.reset(duration)
+        if self.paramWidget.remuxBox.isChecked():
+            self._laterCmd = commands.replaceCmd(self.paramWidget.getParams())
+        else:
+            self._laterCmd = None
+        cmd = self.runCmd
+        # the output may be linked to a read-only encode in the rip library
+        for path in commands.outputPaths(cmd):
+            library.unlinkShared(path)
+        self.runWorker.start(cmd)
         
     def _runFinished(self):
-        self.runThread.quit()
+        if self._laterCmd is not None and self.runWorker.returncode == 0:
+            self.requestBackgroundEncode.emit(f"Encode {self.inpath}", self._laterCmd)
+            self.runWidget.appendText("Queued encode at idle priority")
+        self._laterCmd = None
         self.activateWindow()
         
+    def _autoTune(self):
+        if not os.path.exists(self.inpath) or self.tuneWorker.running:
+            return None
+        self._tuneOutput.clear()
+        self.cmdView.setCurrentWidget(self.runWidget)
+        self.tuneWorker.start(self.paramWidget.getTuneParams())
+        
+    def _tuneFinished(self):
+        if self.tuneWorker.returncode != 0:
+            return None
+        if (result := autotune.parseResult("\n".join(self._tuneOutput))) is not None:
+            self.paramWidget.setTuneResult(result)
+            
+    def _analyse(self):
+        if not os.path.exists(self.inpath) or self.analyseWorker.running:
+            return None
+        self._analyseOutput.clear()
+        self.cmdView.setCurrentWidget(self.runWidget)
+        self.analyseWorker.start(commands.analyseCmd(self.inpath))
+        
+    def _analyseFinished(self):
+        if self.analyseWorker.returncode != 0:
+            return None
+        if (result := analyse.parseResult("\n".join(self._analyseOutput))) is not None:
+            self.paramWidget.setAnalysisResult(result)
+        
     def _setStreamInfo(self):
-        if (text := self.infoWidget.text):
-            i = re.finditer(r"Stream #(?P<stream>\d+:\d+)\[0x\w+\]: (?P<type>\w+): (?P<info>.*)", text)
-            for m in i:
-                 self.paramWidget.addStream(m.group('stream'), m.group('type'), m.group('info'))
+        if self.infoWorker.returncode != 0:
+            return None
+        try:
+            data = json.loads("\n".join(self._probeOutput))
+        except ValueError:
+            self.infoWidget.appendText("Could not read ffprobe output")
+            return None
+        self.probeCache.set(self.inpath, data)
+        self._loadProbe(data)
+            
+    def _loadProbe(self, data):
+        self._probe = ProbeResult.fromJson(data)
+        self._probePath = self.inpath
+        # VOBs don't have language tags, but the DVD's IFO files do
+        if (languages := discLanguages(self.inpath)):
+            for stream in self._probe.streams:
+                if stream.language is None:
+                    stream.language = languages.get(stream.streamId)
+        self.paramWidget.setStreams(self._probe.streams)
         
@@ -0,0 +1,210 @@
+"""
+Persistent history of queued jobs and the processes they ran, in SQLite.
+
+Each job is stored with its disc fingerprint, title, input size and encoder
+settings, and each process with its stage, timings and (for encodes) the
+input duration, number of frames and output size. The history is used to
+estimate how long new jobs will take, and can be queried with :func:`report`.
+"""
+from .paths import stateDir
+import os
+import sqlite3
+import threading
+import time
+
+_schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    fingerprint TEXT,
+    title INTEGER,
+    device TEXT,
+    inputSize INTEGER,
+    preset TEXT,
+    crf INTEGER,
+    queued REAL,
+    finished REAL,
+    status TEXT,
+    outputSize INTEGER
+);
+CREATE TABLE IF NOT EXISTS processes (
+    id INTEGER PRIMARY KEY,
+    job INTEGER REFERENCES jobs(id),
+    queueStage TEXT,
+    stage TEXT,
+    cmd TEXT,
+    device TEXT,
+    start REAL,
+    wallTime REAL,
+    cpuTime REAL,
+    readBytes INTEGER,
+    writeBytes INTEGER,
+    deviceReadBytes INTEGER,
+    peakRss INTEGER,
+    returncode INTEGER,
+    preset TEXT,
+    crf INTEGER,
+    threads INTEGER,
+    duration REAL,
+    frames INTEGER,
+    outputSize INTEGER
+);
+CREATE INDEX IF NOT EXISTS processes_job ON processes(job);
+CREATE INDEX IF NOT EXISTS jobs_fingerprint ON jobs(fingerprint, title);
+"""
+
+REPORTS = {
+    "fps-by-preset": (
+        "Encode speed by preset",
+        """SELECT preset, COUNT(*) AS encodes, SUM(frames) / SUM(wallTime) AS fps,
+                  SUM(duration) / SUM(wallTime) AS speed, AVG(cpuTime / wallTime) AS cores
+           FROM processes
+           WHERE stage = 'encode' AND returncode = 0 AND wallTime > 0 AND start >= :since
+           GROUP BY preset ORDER BY fps DESC"""),
+    "rip-rate-by-device": (
+        "Rip read rate by drive, in MB/s",
+        """SELECT device, COUNT(*) AS rips, SUM(deviceReadBytes) / SUM(wallTime) / 1e6 AS rate
+           FROM processes
+           WHERE stage = 'rip' AND returncode = 0 AND wallTime > 0 AND start >= :since
+           GROUP BY device ORDER BY device"""),
+    "stage-times": (
+        "Time spent in each stage, in seconds",
+        """SELECT stage, COUNT(*) AS runs, AVG(wallTime) AS mean, SUM(wallTime) AS total,
+                  SUM(returncode != 0) AS failures
+           FROM processes WHERE start >= :since
+           GROUP BY stage ORDER BY total DESC"""),
+    "jobs": (
+        "Jobs, most recent first",
+        """SELECT j.name, j.status, j.preset, j.crf,
+                  SUM(CASE WHEN p.queueStage = 'rip' THEN p.wallTime END) AS rip,
+                  SUM(CASE WHEN p.queueStage = 'encode' THEN p.wallTime END) AS encode,
+                  j.inputSize / 1048576.0 AS inputMiB, j.outputSize / 1048576.0 AS outputMiB
+           FROM jobs j LEFT JOIN processes p ON p.job = j.id
+           WHERE j.queued >= :since
+           GROUP BY j.id ORDER BY j.queued DESC"""),
+}
+""" Dict of report name: (description, SQL query). Queries take the `since` parameter, in seconds since the epoch. """
+
+RECENT_JOBS = 20
+""" Number of recent jobs used to estimate the time per byte of a stage """
+
+def encodeSettings(cmd):
+    """ Return dict of the preset, crf and threads options in ffmpeg (or wrapped ffmpeg) `cmd` """
+    settings = {"preset": None, "crf": None, "threads": None}
+    for name, value in zip(cmd, cmd[1:]):
+        key = name.lstrip("-").split(":")[0]
+        if name.startswith("-") and key in settings:
+            settings[key] = value if key == "preset" else int(value) if value.isdigit() else None
+    return settings
+
+class JobHistory:
+    """ SQLite store of jobs and processes
+
+        By default, the database is 'history.sqlite3' in the 'history' state
+        directory. Records can be added from any thread.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(stateDir("history"), "history.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.executescript(_schema)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._db:
+            return self._db.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def addJob(self, name, fingerprint=None, title=None, device=None, inputSize=None,
+               preset=None, crf=None):
+        """ Record a new job. Returns its id. """
+        cur = self._execute(
+            "INSERT INTO jobs (name, fingerprint, title, device, inputSize, preset, crf, queued, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Queued')",
+            (name, fingerprint, title, device, inputSize, preset, crf, time.time()))
+        return cur.lastrowid
+
+    def finishJob(self, jobId, status):
+        """ Set the final `status` of job `jobId`, and its output size from its encodes """
+        self._execute(
+            "UPDATE jobs SET status = ?, finished = ?, outputSize = "
+            "(SELECT SUM(outputSize) FROM processes WHERE job = ? AND stage = 'encode') "
+            "WHERE id = ?", (status, time.time(), jobId, jobId))
+
+    def recordProcess(self, metrics, cmd=None, job=None, queueStage=None, duration=None,
+                      frames=None, outputSize=None):
+        """ Record the :class:`ProcessMetrics` of a process run for `job`
+
+            Encoder settings are taken from `cmd`, if given.
+        """
+        settings = encodeSettings(cmd) if cmd is not None else {}
+        m = metrics
+        self._execute(
+            "INSERT INTO processes (job, queueStage, stage, cmd, device, start, wallTime, cpuTime, "
+            "readBytes, writeBytes, deviceReadBytes, peakRss, returncode, preset, crf, threads, "
+            "duration, frames, outputSize) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job, queueStage, m.stage, m.cmd, m.device, m.start, m.wallTime, m.cpuTime,
+             m.readBytes, m.writeBytes, m.deviceReadBytes, m.peakRss, m.returncode,
+             settings.get("preset"), settings.get("crf"), settings.get("threads"),
+             duration, frames, outputSize))
+
+    def estimate(self, queueStage, inputSize=None, fingerprint=None, title=None, device=None,
+                 preset=None):
+        """ Return estimated seconds for `queueStage` ('rip' or 'encode') of a job, or None
+
+            If the same title of the same disc has been done before (with the
+            same preset, for encodes), its time is used. Otherwise, the time
+            per input byte of the last :attr:`RECENT_JOBS` jobs is used,
+            preferring jobs from the same `device` (for rips) or with the same
+            `preset` (for encodes).
+        """
+        match = "j.preset IS :preset" if queueStage == "encode" else "j.device IS :device"
+        params = {"stage": queueStage, "fingerprint": fingerprint, "title": title,
+                  "device": device, "preset": preset, "limit": RECENT_JOBS}
+        perJob = ("SELECT SUM(p.wallTime) AS t, j.inputSize AS size FROM processes p "
+                  "JOIN jobs j ON p.job = j.id WHERE j.status = 'Done' AND p.queueStage = :stage "
+                  "AND {} GROUP BY j.id ORDER BY j.id DESC")
+        if fingerprint is not None:
+            rows = self._query(perJob.format(f"j.fingerprint = :fingerprint AND j.title IS :title "
+                                             f"AND {match}") + " LIMIT 1", params)
+            if rows:
+                return rows[0]["t"]
+        if not inputSize:
+            return None
+        for condition in [match, "1"]:
+            sql = (f"SELECT SUM(t) AS t, SUM(size) AS size FROM "
+                   f"({perJob.format('j.inputSize > 0 AND ' + condition)} LIMIT :limit)")
+            row = self._query(sql, params)[0]
+            if row["size"]:
+                return row["t"] / row["size"] * inputSize
+        return None
+
+    def report(self, name, days=30):
+        """ Return column names and rows of report `name` for the last `days` """
+        _, sql = REPORTS[name]
+        with self._lock:
+            cur = self._db.execute(sql, {"since": time.time() - days * 86400})
+            rows = cur.fetchall()
+        return [c[0] for c in cur.description], [tuple(row) for row in rows]
+
+_history = None
+_historyLock = threading.Lock()
+
+def getHistory():
+    """ Return the shared :class:`JobHistory` """
+    global _history
+    with _historyLock:
+        if _history is None:
+            _history = JobHistory()
+        return _history
@@ -0,0 +1,448 @@
+from qtpy.QtCore import QObject, Signal, Slot
+from .subprocessthread import ProcessRunner
+from .ffmpegprogress import FfmpegProgressParser
+from .history import getHistory
+from dataclasses import dataclass, field
+from collections import deque
+import os
+import sqlite3
+import time
+
+@dataclass(eq=False)
+class Job:
+    """ A disc (or title) to be ripped and then encoded
+
+        `ripCmds` are run in order by the rip stage for `device` and 
+        `encodeCmds` by the encode stage. A command can also be given as a 
+        callable which returns the command; it will be called when the command 
+        is about to be run.
+
+        The disc `fingerprint`, `title`, `inputSize` (in bytes) and encoder
+        `preset` and `crf` are stored in the job history, and used to estimate
+        how long each stage will take.
+    """
+    name: str
+    ripCmds: list = field(default_factory=list)
+    encodeCmds: list = field(default_factory=list)
+    status: str = "Queued"
+    device: str = None
+    fingerprint: str = None
+    title: int = None
+    inputSize: int = None
+    preset: str = None
+    crf: int = None
+    estimates: dict = field(default_factory=dict)
+    """ Dict of stage kind ('rip' or 'encode'): estimated seconds, or None if unknown """
+    historyId: int = None
+    cancelled: bool = False
+
+class JobStage(QObject):
+    """ Run the commands for one stage of each queued :class:`Job`, one job at a time """
+
+    jobStarted = Signal(object)
+    """ **signal** jobStarted(Job job)
+
+        Emitted when the stage starts running the commands for `job`
+    """
+
+    jobFinished = Signal(object, bool)
+    """ **signal** jobFinished(Job job, bool success)
+
+        Emitted when all commands for `job` have completed, or one has failed
+    """
+
+    cmdStarted = Signal(object)
+    """ **signal** cmdStarted(list cmd)
+
+        Emitted when a command is started
+    """
+
+    stdout = Signal(str)
+    """ **signal** stdout(str line)
+
+        Output from the running command
+    """
+
+    progress = Signal(object)
+    """ **signal** progress(object progress)
+
+        Progress of the running command, if the stage has a progress parser
+    """
+
+    cmdFinished = Signal(object, object, object, object)
+    """ **signal** cmdFinished(Job job, list cmd, ProcessMetrics metrics, FfmpegProgress progress)
+
+        Emitted when a command has finished, with the last progress (or None)
+    """
+
+    def __init__(self, name, cmdAttr, progressParser=None):
+        super().__init__()
+        self.name = name
+        self._cmdAttr = cmdAttr
+        self.jobs = deque()
+        self.currentJob = None
+        self.jobStartTime = None
+        self.orderKey = None
+        self._cmds = deque()
+        self._cmd = None
+        self._lastProgress = None
+        self.enabled = False
+
+        self.runner = ProcessRunner(progressParser=progressParser)
+        self.runner.stdout.connect(self.stdout)
+        self.runner.progress.connect(self.progress)
+        self.runner.progress.connect(self._setProgress)
+        self.runner.metrics.connect(self._cmdMetrics)
+        self.runner.finished.connect(self._cmdComplete)
+
+    @property
+    def kind(self):
+        """ 'rip' or 'encode' """
+        return self._cmdAttr.removesuffix("Cmds")
+
+    @property
+    def busy(self):
+        return self.currentJob is not None
+
+    def waiting(self):
+        """ Return list of waiting jobs, in the order they will be run """
+        if self.orderKey is None:
+            return list(self.jobs)
+        return sorted(self.jobs, key=self.orderKey)
+
+    def setPolicy(self, policy):
+        """ Set the :class:`ResourcePolicy` of this stage's commands, including the running one """
+        self.runner.setPolicy(policy)
+
+    def setPaused(self, paused):
+        """ Pause or resume the running job. While paused, its next command starts paused. """
+        self.runner.setPaused(paused)
+
+    def cancel(self):
+        """ Cancel the running job; its remaining commands are not run """
+        if self.currentJob is None:
+            return None
+        self.currentJob.cancelled = True
+        self._cmds.clear()
+        self.runner.cancel()
+
+    def setOrderKey(self, key):
+        """ Run waiting jobs in order of `key(job)`, or in the order they were added if None """
+        self.orderKey = key
+
+    def enqueue(self, job):
+        """ Add `job` to this stage and start it if the stage is idle """
+        self.jobs.append(job)
+        self.next()
+
+    def remove(self, job):
+        """ Remove `job`, if it is waiting. Returns True if the job was removed. """
+        try:
+            self.jobs.remove(job)
+        except ValueError:
+            return False
+        else:
+            return True
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        self.next()
+
+    @Slot()
+    def next(self):
+        """ Start the next waiting job, if not already running one """
+        if not self.enabled or self.busy or not self.jobs:
+            return None
+        self.currentJob = self.waiting()[0]
+        self.jobs.remove(self.currentJob)
+        self.jobStartTime = time.time()
+        self._cmds = deque(getattr(self.currentJob, self._cmdAttr))
+        self.jobStarted.emit(self.currentJob)
+        self._startCmd()
+
+    def _startCmd(self):
+        if not self._cmds:
+            return self._jobComplete(True)
+        cmd = self._cmds.popleft()
+        if callable(cmd):
+            cmd = cmd()
+        if self.runner.progressParser is not None:
+            self.runner.progressParser.reset()
+        self._cmd = cmd
+        self._lastProgress = None
+        self.cmdStarted.emit(cmd)
+        self.runner.start(cmd)
+
+    @Slot(object)
+    def _setProgress(self, progress):
+        self._lastProgress = progress
+
+    @Slot(object)
+    def _cmdMetrics(self, metrics):
+        if self.currentJob is not None:
+            self.cmdFinished.emit(self.currentJob, self._cmd, metrics, self._lastProgress)
+
+    @Slot()
+    def _cmdComplete(self):
+        if self.runner.returncode != 0:
+            self._jobComplete(False)
+        else:
+            self._startCmd()
+
+    def _jobComplete(self, success):
+        job = self.currentJob
+        self.currentJob = None
+        self.jobStartTime = None
+        self._cmds.clear()
+        self.jobFinished.emit(job, success)
+        self.next()
+
+class JobQueue(QObject):
+    """ Queue of :class:`Job`s, pipelined through rip stages and an encode stage
+
+        There is a rip stage for each drive, and one shared encode stage. Each
+        stage runs one job at a time, so discs in different drives are ripped
+        at the same time, and encodes run while the next discs are ripped.
+
+        Jobs and the commands they run are recorded in the :class:`JobHistory`,
+        which is used to estimate how long each job will take. Waiting jobs are
+        run in the order given by the :attr:`policy`:
+
+        - 'fifo': in the order they were added
+        - 'shortest': shortest estimated stage first
+        - 'makespan': ordered by Johnson's rule to keep both the drives and the 
+          encoder busy, so the whole queue finishes as soon as possible
+    """
+
+    POLICIES = {"fifo": "First in, first out", "shortest": "Shortest first",
+                "makespan": "Keep drive and encoder busy"}
+
+    FINISHED = ["Done", "Failed", "Cancelled"]
+    """ Status of jobs which have finished """
+
+    jobChanged = Signal(object)
+    """ **signal** jobChanged(Job job)
+
+        Emitted when a job is added or its status changes
+    """
+
+    jobRemoved = Signal(object)
+    """ **signal** jobRemoved(Job job)
+
+        Emitted when a job is removed from the queue
+    """
+
+    ripStageAdded = Signal(object)
+    """ **signal** ripStageAdded(JobStage stage)
+
+        Emitted when the rip stage for a new drive is made
+    """
+
+    def __init__(self, history=None):
+        super().__init__()
+        self.jobs = []
+        self.running = False
+        self.policy = "fifo"
+        self.stagePolicies = {"rip": None, "encode": None}
+        self._history = history
+
+        self.ripStages = {}
+        self.encodeStage = JobStage("encode", "encodeCmds", progressParser=FfmpegProgressParser())
+        self.encodeStage.jobStarted.connect(lambda job: self._setStatus(job, "Encoding"))
+        self.encodeStage.jobFinished.connect(self._encodeFinished)
+        self.encodeStage.cmdFinished.connect(lambda *args: self._recordCmd("encode", *args))
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = getHistory()
+        return self._history
+
+    @property
+    def stages(self):
+        return list(self.ripStages.values()) + [self.encodeStage]
+
+    def ripStage(self, device=None):
+        """ Return the rip stage for `device`, making it if necessary """
+        if (stage := self.ripStages.get(device)) is None:
+            name = "rip" if device is None else f"rip {device}"
+            stage = JobStage(name, "ripCmds")
+            stage.jobStarted.connect(lambda job: self._setStatus(job, "Ripping"))
+            stage.jobFinished.connect(self._ripFinished)
+            stage.cmdFinished.connect(lambda *args: self._recordCmd("rip", *args))
+            stage.setOrderKey(self._orderKey(stage.kind))
+            stage.setPolicy(self.stagePolicies["rip"])
+            self.ripStages[device] = stage
+            self.ripStageAdded.emit(stage)
+            stage.setEnabled(self.running)
+        return stage
+
+    def addJob(self, job):
+        """ Add `job` to the queue, estimating its times from the history """
+        try:
+            job.historyId = self.history.addJob(job.name, job.fingerprint, job.title, job.device,
+                                                job.inputSize, job.preset, job.crf)
+            for kind in ["rip", "encode"]:
+                job.estimates[kind] = self.history.estimate(
+                    kind, job.inputSize, job.fingerprint, job.title, job.device, job.preset)
+        except sqlite3.Error:
+            pass
+        self.jobs.append(job)
+        if not job.ripCmds:
+            self._setStatus(job, "Waiting to encode")
+            self.encodeStage.enqueue(job)
+        else:
+            self._setStatus(job, "Queued")
+            self.ripStage(job.device).enqueue(job)
+
+    def setPolicy(self, policy):
+        """ Set the order waiting jobs are run in; see :attr:`POLICIES` """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}'")
+        self.policy = policy
+        for stage in self.stages:
+            stage.setOrderKey(self._orderKey(stage.kind))
+
+    def setStagePolicy(self, kind, policy):
+        """ Set :class:`ResourcePolicy` for commands of `kind` ('rip' or 'encode') stages
+
+            The policy is applied to running commands. If `policy` is None, 
+            the default for each command's stage is used.
+        """
+        self.stagePolicies[kind] = policy
+        for stage in self.stages:
+            if stage.kind == kind:
+                stage.setPolicy(policy)
+
+    def _orderKey(self, kind):
+        """ Return function giving the sort key of a job in stage `kind` for the current policy """
+        inf = float("inf")
+        if self.policy == "shortest":
+            def key(job):
+                t = job.estimates.get(kind)
+                return inf if t is None else t
+        elif self.policy == "makespan":
+            # Johnson's rule for two machines: jobs with a shorter rip than
+            # encode first, by increasing rip time, then the rest by
+            # decreasing encode time
+            def key(job):
+                rip, encode = job.estimates.get("rip"), job.estimates.get("encode")
+                if rip is None or encode is None:
+                    return (2, 0)
+                return (0, rip) if rip <= encode else (1, -encode)
+        else:
+            return None
+        return key
+
+    def finishTimes(self, now=None):
+        """ Return dict of job: estimated time the job will finish (seconds since the epoch)
+
+            Jobs with unknown estimates, or waiting for a job with unknown
+            estimates, are not included.
+        """
+        if now is None:
+            now = time.time()
+        remaining = lambda stage: max(0, stage.currentJob.estimates[stage.kind]
+                                      - (now - stage.jobStartTime))
+        known = lambda job, kind: job.estimates.get(kind) is not None
+
+        ripDone = {}
+        for stage in self.ripStages.values():
+            t = now
+            if stage.currentJob is not None:
+                if not known(stage.currentJob, "rip"):
+                    continue
+                t += remaining(stage)
+                ripDone[stage.currentJob] = t
+            for job in stage.waiting():
+                if not known(job, "rip"):
+                    break
+                t += job.estimates["rip"]
+                ripDone[job] = t
+
+        stage = self.encodeStage
+        finish = {}
+        t = now
+        if stage.currentJob is not None:
+            if not known(stage.currentJob, "encode"):
+                return finish
+            t += remaining(stage)
+            finish[stage.currentJob] = t
+        pending = {job: now for job in stage.jobs}
+        pending.update(ripDone)
+        jobOrder = {job: n for n, job in enumerate(self.jobs)}
+        orderKey = stage.orderKey or (lambda job: jobOrder.get(job, 0))
+        while pending:
+            ready = [job for job, readyTime in pending.items() if readyTime <= t]
+            if not ready:
+                t = min(pending.values())
+                continue
+            job = min(ready, key=orderKey)
+            if not known(job, "encode"):
+                break
+            t += job.estimates["encode"]
+            finish[job] = t
+            del pending[job]
+        return finish
+
+    def removeJob(self, job):
+        """ Remove `job` from the queue, if it is not running """
+        if any(stage.remove(job) for stage in self.stages) or job.status in self.FINISHED:
+            if job.status not in self.FINISHED:
+                # the job won't be finished, so don't leave it queued in the history
+                self._finishJob(job, "Removed")
+            self.jobs.remove(job)
+            self.jobRemoved.emit(job)
+            return True
+        return False
+
+    def start(self):
+        """ Start processing queued jobs """
+        self.running = True
+        for stage in self.stages:
+            stage.setEnabled(True)
+
+    def stop(self):
+        """ Stop starting new jobs. Any running commands will be allowed to finish. """
+        self.running = False
+        for stage in self.stages:
+            stage.setEnabled(False)
+
+    def _setStatus(self, job, status):
+        job.status = status
+        self.jobChanged.emit(job)
+
+    def _ripFinished(self, job, success):
+        if not success:
+            self._setStatus(job, "Cancelled" if job.cancelled else "Failed")
+            self._finishJob(job, job.status)
+        else:
+            self._setStatus(job, "Waiting to encode")
+            self.encodeStage.enqueue(job)
+
+    def _encodeFinished(self, job, success):
+        if success:
+            self._setStatus(job, "Done")
+        else:
+            self._setStatus(job, "Cancelled" if job.cancelled else "Failed")
+        self._finishJob(job, job.status)
+
+    def _finishJob(self, job, status):
+        if job.historyId is None:
+            return None
+        try:
+            self.history.finishJob(job.historyId, status)
+        except sqlite3.Error:
+            pass
+
+    def _recordCmd(self, kind, job, cmd, metrics, progress):
+        outputSize = None
+        if metrics.stage == "encode" and metrics.returncode == 0 and os.path.isfile(cmd[-1]):
+            outputSize = os.path.getsize(cmd[-1])
+        try:
+            self.history.recordProcess(
+                metrics, cmd, job=job.historyId, queueStage=kind,
+                duration=progress.duration if progress is not None else None,
+                frames=progress.frame if progress is not None else None, outputSize=outputSize)
+        except sqlite3.Error:
+            pass
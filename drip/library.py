@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keep rips and encodes in a library directory, addressed by disc fingerprint,
+so a disc that has been ripped before isn't ripped again.
+
+The library has a directory for each disc fingerprint and title:
+
+    LIBRARY/FINGERPRINT/title-N/VIDEO_TS/...      ripped files
+    LIBRARY/FINGERPRINT/title-N/manifest.json     size and SHA-256 of each file
+    LIBRARY/FINGERPRINT/title-N/encode-KEY.mkv    encodes, keyed by their settings
+
+Run a rip or encode command (given after '--') through this script to use the
+library:
+
+    library.py rip LIBRARY FINGERPRINT TITLE VOBDIR -- dvdbackup ...
+    library.py encode LIBRARY FINGERPRINT TITLE -- ffmpeg ... OUTPUT
+
+If the library has the rip (or an encode with the same settings), it is
+linked to VOBDIR (or OUTPUT) and the command isn't run. Otherwise, the command
+is run and its output is added to the library. Files are hard linked where
+possible; across file systems, they are moved into the library and symlinked
+back.
+
+While a rip is running, each VOB file is hashed in a pool of threads as soon
+as it is complete, while it is still in the page cache, so the manifest
+doesn't need a second read of the rip. The library can be checked against
+the manifests with
+
+    library.py verify LIBRARY [FINGERPRINT ...]
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+POLL_INTERVAL = 1
+""" Seconds between scans for completed VOB files while ripping """
+
+STALE_SECONDS = 10
+""" A VOB file which hasn't changed for this long is treated as complete """
+
+def entryPath(library, fingerprint, title):
+    """ Return library directory for `title` of the disc with `fingerprint` """
+    return os.path.join(library, fingerprint, f"title-{title}")
+
+def loadManifest(entry):
+    """ Return the manifest of rip `entry`, or None if it hasn't been completely ripped """
+    try:
+        with open(os.path.join(entry, "manifest.json")) as fileobj:
+            return json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+
+def saveManifest(entry, manifest):
+    path = os.path.join(entry, "manifest.json")
+    with open(path + ".tmp", "w") as fileobj:
+        json.dump(manifest, fileobj, indent=1)
+    os.replace(path + ".tmp", path)
+
+def hashFile(path, chunkSize=1024*1024):
+    """ Return SHA-256 hex digest of `path` """
+    h = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        while (data := fileobj.read(chunkSize)):
+            h.update(data)
+    return h.hexdigest()
+
+def _statKey(st):
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+def _isVob(name):
+    return name.upper().endswith(".VOB")
+
+class VobHasher:
+    """ Hash VOB files under `root` in `jobs` threads, as they are written
+
+        Call :meth:`scan` while the rip is running. Only files changed since
+        `since` (seconds since the epoch) are hashed. Files are identified by
+        inode, so a hash is still used if the file is renamed (e.g. by
+        :mod:`resumerip`), but not if the file has changed since it was hashed.
+    """
+
+    def __init__(self, root, since, jobs=None):
+        self.root = root
+        self.since = since
+        self._executor = ThreadPoolExecutor(jobs or min(4, os.cpu_count() or 1))
+        self._hashes = {}
+
+    def scan(self):
+        """ Start hashing VOB files which are complete """
+        now = time.time()
+        for dirpath, _, fnames in os.walk(self.root):
+            stats = []
+            for fname in filter(_isVob, fnames):
+                path = os.path.join(dirpath, fname)
+                try:
+                    if (st := os.stat(path)).st_ctime >= self.since:
+                        stats.append((path, st))
+                except OSError:
+                    pass
+            if not stats:
+                continue
+            # VOBs are written one at a time, so only the newest can be incomplete
+            newest = max(st.st_mtime for _, st in stats)
+            for path, st in stats:
+                if st.st_mtime < newest or now - st.st_mtime >= STALE_SECONDS:
+                    self._submit(path, st)
+
+    def _submit(self, path, st):
+        key = _statKey(st)
+        if key not in self._hashes:
+            self._hashes[key] = self._executor.submit(hashFile, path)
+
+    def hashes(self, paths):
+        """ Return dict of path: SHA-256 for `paths`, hashing any which haven't been hashed """
+        futures = {}
+        for path in paths:
+            st = os.stat(path)
+            self._submit(path, st)
+            futures[path] = self._hashes[_statKey(st)]
+        return {path: future.result() for path, future in futures.items()}
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+def linkFile(src, dst):
+    """ Make `dst` a hard link to `src`, or a symlink if they're on different file systems """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+
+def unlinkShared(path):
+    """ Remove `path` if it's a link, so that writing to it can't change the file it's linked to """
+    try:
+        if os.path.islink(path) or os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except OSError:
+        pass
+
+def storeFile(path, dst):
+    """ Add `path` to the library as `dst`, leaving a link to it at `path`
+
+        The file is made read-only, so that it can't be overwritten in place
+        through the link.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.chmod(path, os.stat(path).st_mode & ~0o222)
+    try:
+        os.link(path, dst)
+    except OSError:
+        shutil.move(path, dst)
+        os.symlink(os.path.abspath(dst), path)
+
+def _runCmd(cmd, poll=None):
+    """ Run `cmd`, calling `poll` every :attr:`POLL_INTERVAL` seconds. Returns returncode. """
+    process = subprocess.Popen(cmd)
+
+    def terminate(signum, frame):
+        process.terminate()
+    signal.signal(signal.SIGTERM, terminate)
+
+    while True:
+        try:
+            return process.wait(timeout=POLL_INTERVAL)
+        except subprocess.TimeoutExpired:
+            if poll is not None:
+                poll()
+
+def rip(library, fingerprint, title, vobDir, cmd, jobs=None):
+    """ Link rip of `title` from the library to `vobDir`, or run rip `cmd` and add it
+
+        Returns returncode.
+    """
+    entry = entryPath(library, fingerprint, title)
+    if (manifest := loadManifest(entry)) is not None:
+        os.makedirs(vobDir, exist_ok=True)
+        for name in manifest['files']:
+            linkFile(os.path.join(entry, "VIDEO_TS", name), os.path.join(vobDir, name))
+        print(f"Linked title {title} from library {entry}", flush=True)
+        return 0
+
+    # library files are read-only, so don't let the rip write through links to them
+    if os.path.isdir(vobDir):
+        for fname in os.listdir(vobDir):
+            unlinkShared(os.path.join(vobDir, fname))
+    # file times have a coarser clock than time.time()
+    start = time.time() - 1
+    print(" ".join(cmd), flush=True)
+    # resumerip writes chapters to a directory next to the VIDEO_TS directory
+    hasher = VobHasher(os.path.dirname(os.path.abspath(vobDir)), start, jobs)
+    try:
+        rc = _runCmd(cmd, poll=hasher.scan)
+        if rc != 0:
+            return rc
+        # files written or moved into place by this rip
+        paths = []
+        if os.path.isdir(vobDir):
+            for fname in sorted(os.listdir(vobDir)):
+                path = os.path.join(vobDir, fname)
+                if os.path.isfile(path) and not os.path.islink(path) and os.stat(path).st_ctime >= start:
+                    paths.append(path)
+        if not paths:
+            print("No new files to add to the library", flush=True)
+            return 0
+        hashes = hasher.hashes(paths)
+    finally:
+        hasher.close()
+
+    if loadManifest(entry) is not None:
+        # the same disc was ripped in another drive at the same time
+        print(f"Title {title} is already in library {entry}", flush=True)
+        return 0
+    files = {}
+    for path in paths:
+        name = os.path.basename(path)
+        files[name] = {"size": os.path.getsize(path), "sha256": hashes[path]}
+        storeFile(path, os.path.join(entry, "VIDEO_TS", name))
+    saveManifest(entry, {"fingerprint": fingerprint, "title": title, "added": time.time(),
+                         "files": files})
+    print(f"Added title {title} to library {entry}", flush=True)
+    return 0
+
+def encodeKey(cmd):
+    """ Return key of the settings of encode `cmd`, ignoring its input and output paths
+
+        `cmd` can be wrapped in other scripts, with the ffmpeg command after '--'.
+    """
+    while "--" in cmd:
+        cmd = cmd[cmd.index("--") + 1:]
+    args = []
+    skip = False
+    for arg in cmd[1:-1]:
+        if skip:
+            skip = False
+        elif arg in ("-i", "-progress"):
+            skip = True
+        elif arg not in ("-y", "-nostats"):
+            args.append(arg)
+    return hashlib.sha1(json.dumps(args).encode()).hexdigest()[:16]
+
+def encode(library, fingerprint, title, cmd):
+    """ Link encode from the library to the output of `cmd`, or run `cmd` and add it
+
+        Returns returncode.
+    """
+    outpath = cmd[-1]
+    entry = entryPath(library, fingerprint, title)
+    stored = os.path.join(entry, f"encode-{encodeKey(cmd)}{os.path.splitext(outpath)[1]}")
+    if os.path.isfile(stored):
+        linkFile(stored, outpath)
+        print(f"Linked {outpath} to library encode {stored}", flush=True)
+        return 0
+    unlinkShared(outpath)
+    print(" ".join(cmd), flush=True)
+    if (rc := _runCmd(cmd)) != 0:
+        return rc
+    if os.path.isfile(outpath):
+        storeFile(outpath, stored)
+        print(f"Added {outpath} to library as {stored}", flush=True)
+    return 0
+
+def verify(library, fingerprints=None, jobs=None):
+    """ Check ripped files in `library` against their manifests, hashing in `jobs` threads
+
+        Returns list of (path, problem) for each file which is missing or changed.
+    """
+    if not fingerprints:
+        fingerprints = sorted(os.listdir(library))
+    checks = []
+    for fp in fingerprints:
+        fpDir = os.path.join(library, fp)
+        if not os.path.isdir(fpDir):
+            continue
+        for titleDir in sorted(os.listdir(fpDir)):
+            entry = os.path.join(fpDir, titleDir)
+            if (manifest := loadManifest(entry)) is None:
+                continue
+            for name, info in manifest['files'].items():
+                checks.append((os.path.join(entry, "VIDEO_TS", name), info))
+
+    def check(item):
+        path, info = item
+        if not os.path.isfile(path):
+            return path, "missing"
+        if os.path.getsize(path) != info['size']:
+            return path, "size changed"
+        if hashFile(path) != info['sha256']:
+            return path, "checksum mismatch"
+        return None
+
+    with ThreadPoolExecutor(jobs or min(4, os.cpu_count() or 1)) as executor:
+        return [result for result in executor.map(check, checks) if result is not None]
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    cmd = []
+    if "--" in argv:
+        idx = argv.index("--")
+        argv, cmd = argv[:idx], argv[idx+1:]
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("rip", help="Link or run a rip")
+    p.add_argument("library")
+    p.add_argument("fingerprint")
+    p.add_argument("title", type=int)
+    p.add_argument("vobdir", help="VIDEO_TS directory the rip is written to")
+    p.add_argument("-j", "--jobs", type=int, help="Number of files to hash at once")
+
+    p = subparsers.add_parser("encode", help="Link or run an encode")
+    p.add_argument("library")
+    p.add_argument("fingerprint")
+    p.add_argument("title", type=int)
+
+    p = subparsers.add_parser("verify", help="Check ripped files against their checksums")
+    p.add_argument("library")
+    p.add_argument("fingerprints", nargs="*", help="Only check these discs")
+    p.add_argument("-j", "--jobs", type=int, help="Number of files to hash at once")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        problems = verify(args.library, args.fingerprints, args.jobs)
+        for path, problem in problems:
+            print(f"{path}: {problem}", flush=True)
+        return 1 if problems else 0
+    if not cmd:
+        print("Command should be given after '--'", file=sys.stderr)
+        return 2
+    os.makedirs(args.library, exist_ok=True)
+    if args.command == "rip":
+        return rip(args.library, args.fingerprint, args.title, args.vobdir, cmd, args.jobs)
+    return encode(args.library, args.fingerprint, args.title, cmd)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Measure wall time, I/O, CPU time and memory of processes from /proc, and
+export the measurements as JSON lines and a Prometheus textfile.
+
+Each process is measured together with its descendants, so wrapper scripts
+(e.g. :mod:`parallelencode`) include the processes they run. Where /proc is
+not available, only wall time and the totals from `wait4` are recorded.
+"""
+from dataclasses import dataclass, asdict
+from .paths import stateDir
+import json
+import os
+import time
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+def formatSize(size):
+    """ Return human-readable string of `size` bytes """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+@dataclass
+class ProcessMetrics:
+    stage: str = None
+    cmd: str = ""
+    device: str = None
+    start: float = None
+    """ Start time, in seconds since the epoch """
+    wallTime: float = 0
+    readBytes: int = 0
+    """ Bytes read from storage by the process and its descendants """
+    writeBytes: int = 0
+    """ Bytes written to storage by the process and its descendants """
+    deviceReadBytes: int = None
+    """ Bytes read from `device` while the process was running """
+    cpuTime: float = 0
+    """ User and system CPU time, in seconds """
+    peakRss: int = 0
+    """ Peak resident memory of the process and its descendants, in bytes """
+    returncode: int = None
+
+    @property
+    def deviceReadRate(self):
+        """ Bytes per second read from `device`, or None """
+        if self.deviceReadBytes is None or not self.wallTime:
+            return None
+        return self.deviceReadBytes / self.wallTime
+
+    @property
+    def writeRate(self):
+        return self.writeBytes / self.wallTime if self.wallTime else 0
+
+    @property
+    def cpuUsage(self):
+        """ Average number of cores used """
+        return self.cpuTime / self.wallTime if self.wallTime else 0
+
+    def asDict(self):
+        return dict(asdict(self), deviceReadRate=self.deviceReadRate, writeRate=self.writeRate)
+
+    def __str__(self):
+        s = f"{self.stage or 'process'}: {self.wallTime:.1f}s"
+        if self.deviceReadRate is not None:
+            s += f", {self.deviceReadRate / 1e6:.1f} MB/s from {self.device}"
+        s += (f", read {formatSize(self.readBytes)}, wrote {formatSize(self.writeBytes)}"
+              f" ({self.writeRate / 1e6:.1f} MB/s), CPU {self.cpuTime:.1f}s"
+              f" ({self.cpuUsage:.1f} cores), peak RSS {formatSize(self.peakRss)}")
+        return s
+
+def _read(pid, name):
+    try:
+        with open(f"/proc/{pid}/{name}") as fileobj:
+            return fileobj.read()
+    except OSError:
+        return None
+
+def procStat(pid):
+    """ Return (ppid, CPU seconds including reaped children, RSS bytes) of `pid`, or None """
+    if (text := _read(pid, "stat")) is None:
+        return None
+    fields = text[text.rindex(")") + 2:].split()
+    ppid = int(fields[1])
+    ticks = sum(int(f) for f in fields[11:15])
+    return ppid, ticks / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+
+def procIo(pid):
+    """ Return (bytes read, bytes written) from storage by `pid` and its reaped children, or None """
+    if (text := _read(pid, "io")) is None:
+        return None
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        values[key] = int(value)
+    written = values.get("write_bytes", 0) - values.get("cancelled_write_bytes", 0)
+    return values.get("read_bytes", 0), max(0, written)
+
+def processTree():
+    """ Return dict of pid: list of child pids, for all processes """
+    children = {}
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return children
+    for pid in pids:
+        if (stat := procStat(pid)) is not None:
+            children.setdefault(stat[0], []).append(pid)
+    return children
+
+def descendants(pid, tree):
+    """ Return list of all descendants of `pid` in `tree` (see :func:`processTree`) """
+    result = []
+    stack = list(tree.get(pid, []))
+    while stack:
+        child = stack.pop()
+        result.append(child)
+        stack += tree.get(child, [])
+    return result
+
+def diskReadBytes(device):
+    """ Return total bytes read from block `device` since boot, or None """
+    if device is None:
+        return None
+    name = os.path.basename(os.path.realpath(device))
+    try:
+        with open("/proc/diskstats") as fileobj:
+            for line in fileobj:
+                fields = line.split()
+                if len(fields) > 5 and fields[2] == name:
+                    # sectors are always 512 bytes here
+                    return int(fields[5]) * 512
+    except OSError:
+        pass
+    return None
+
+class ProcessSampler:
+    """ Collect :class:`ProcessMetrics` for the process `pid`
+
+        Call :meth:`sample` periodically while the process is running, and
+        :meth:`finish` when it has exited. Time between :meth:`pause` and
+        :meth:`resume` is not counted in the wall time.
+    """
+
+    def __init__(self, pid, stage=None, cmd=None, device=None):
+        self.pid = pid
+        self.metrics = ProcessMetrics(stage=stage, cmd=" ".join(cmd) if cmd else "",
+                                      device=device, start=time.time())
+        self._t0 = time.monotonic()
+        self._pausedAt = None
+        self._pausedTime = 0
+        self._device0 = diskReadBytes(device)
+
+    def sample(self, tree=None):
+        """ Update metrics from /proc. `tree` can be given from :func:`processTree`. """
+        if tree is None:
+            tree = processTree()
+        cpu = read = written = rss = 0
+        for pid in [self.pid] + descendants(self.pid, tree):
+            if (stat := procStat(pid)) is not None:
+                cpu += stat[1]
+                rss += stat[2]
+            if (io := procIo(pid)) is not None:
+                read += io[0]
+                written += io[1]
+        # descendants' totals move to their parent when they are reaped, so
+        # can briefly be missed; don't let the totals go backwards
+        m = self.metrics
+        m.cpuTime = max(m.cpuTime, cpu)
+        m.readBytes = max(m.readBytes, read)
+        m.writeBytes = max(m.writeBytes, written)
+        m.peakRss = max(m.peakRss, rss)
+        self._update()
+        return m
+
+    def finish(self, returncode, rusage=None):
+        """ Set final metrics, with `rusage` from `os.wait4` if available """
+        m = self.metrics
+        m.returncode = returncode
+        if rusage is not None:
+            m.cpuTime = max(m.cpuTime, rusage.ru_utime + rusage.ru_stime)
+            m.peakRss = max(m.peakRss, rusage.ru_maxrss * 1024)
+        self._update()
+        return m
+
+    def pause(self):
+        """ Stop counting wall time, while the process is suspended """
+        if self._pausedAt is None:
+            self._pausedAt = time.monotonic()
+
+    def resume(self):
+        """ Count wall time again, after :meth:`pause` """
+        if self._pausedAt is not None:
+            self._pausedTime += time.monotonic() - self._pausedAt
+            self._pausedAt = None
+
+    def _update(self):
+        now = time.monotonic()
+        paused = self._pausedTime + (now - self._pausedAt if self._pausedAt is not None else 0)
+        self.metrics.wallTime = now - self._t0 - paused
+        if self._device0 is not None and (now := diskReadBytes(self.metrics.device)) is not None:
+            self.metrics.deviceReadBytes = now - self._device0
+
+_promMetrics = [
+    ("runs_total", "counter", "Number of processes run"),
+    ("failures_total", "counter", "Number of processes which failed"),
+    ("seconds_total", "counter", "Wall time of processes, in seconds"),
+    ("cpu_seconds_total", "counter", "CPU time of processes, in seconds"),
+    ("read_bytes_total", "counter", "Bytes read from storage"),
+    ("write_bytes_total", "counter", "Bytes written to storage"),
+    ("device_read_bytes_total", "counter", "Bytes read from the optical drive"),
+    ("last_device_read_bytes_per_second", "gauge", "Read rate from the drive of the last process"),
+    ("last_write_bytes_per_second", "gauge", "Write rate of the last process"),
+    ("last_peak_rss_bytes", "gauge", "Peak resident memory of the last process"),
+]
+
+class MetricsExporter:
+    """ Write :class:`ProcessMetrics` to a JSON lines file and a Prometheus textfile
+
+        By default, both files are in the 'metrics' state directory. The
+        textfile path can be set with the DRIP_METRICS_TEXTFILE environment
+        variable, e.g. to a node_exporter textfile collector directory.
+        Totals in the textfile are per stage, since DRip was started.
+    """
+
+    def __init__(self, jsonPath=None, textfilePath=None):
+        self._jsonPath = jsonPath
+        self._textfilePath = textfilePath or os.environ.get("DRIP_METRICS_TEXTFILE")
+        self.totals = {}
+
+    @property
+    def jsonPath(self):
+        if self._jsonPath is None:
+            self._jsonPath = os.path.join(stateDir("metrics"), "processes.jsonl")
+        return self._jsonPath
+
+    @property
+    def textfilePath(self):
+        if self._textfilePath is None:
+            self._textfilePath = os.path.join(stateDir("metrics"), "drip.prom")
+        return self._textfilePath
+
+    def record(self, metrics):
+        """ Append `metrics` to the JSON lines file and update the textfile """
+        try:
+            with open(self.jsonPath, "a") as fileobj:
+                fileobj.write(json.dumps(metrics.asDict()) + "\n")
+            self._addTotals(metrics)
+            self.writeTextfile()
+        except OSError:
+            pass
+
+    def _addTotals(self, m):
+        t = self.totals.setdefault(m.stage or "other", {name: 0 for name, _, _ in _promMetrics})
+        t["runs_total"] += 1
+        t["failures_total"] += int(m.returncode != 0)
+        t["seconds_total"] += m.wallTime
+        t["cpu_seconds_total"] += m.cpuTime
+        t["read_bytes_total"] += m.readBytes
+        t["write_bytes_total"] += m.writeBytes
+        t["device_read_bytes_total"] += m.deviceReadBytes or 0
+        t["last_device_read_bytes_per_second"] = m.deviceReadRate or 0
+        t["last_write_bytes_per_second"] = m.writeRate
+        t["last_peak_rss_bytes"] = m.peakRss
+
+    def writeTextfile(self):
+        """ Write the Prometheus textfile, atomically """
+        lines = []
+        for name, kind, help in _promMetrics:
+            lines += [f"# HELP drip_stage_{name} {help}", f"# TYPE drip_stage_{name} {kind}"]
+            for stage, values in sorted(self.totals.items()):
+                lines.append(f'drip_stage_{name}{{stage="{stage}"}} {values[name]}')
+        tmp = self.textfilePath + ".tmp"
+        with open(tmp, "w") as fileobj:
+            fileobj.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.textfilePath)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encode a title as segments in parallel ffmpeg processes.
+
+The input is split at video keyframes into time segments, which are encoded
+(video only) by a pool of ffmpeg processes. The encoded segments are then
+joined with ffmpeg's concat demuxer and muxed with the audio and subtitle
+streams from the input, without re-encoding.
+
+The ffmpeg command for a single encode should be given after '--', in the form
+generated by :meth:`ffmpegwidget.ParamView.getParams`, i.e.
+
+    ffmpeg [input options] -i INPUT [-option value ...] OUTPUT
+
+If the ffmpeg command asks for `-progress`, combined progress for all segments
+is written to stdout in the same key=value format.
+
+Segments are checkpoints: each is written to a temporary file and renamed when
+it is complete. If an encode is interrupted, running it again with the same
+command continues from the finished segments. With `-j 1`, this gives a
+resumable encode in a single process.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+THREADS_PER_SEGMENT = 4
+""" Number of threads to give each libx264 process; SD content doesn't scale much past this """
+
+_processes = set()
+""" Running segment encode processes """
+
+_processLock = threading.Lock()
+
+_stopped = threading.Event()
+""" Set on SIGTERM, so that no more segment encodes are started """
+
+_copyOptions = ["-codec:a", "-codec:s", "-c:a", "-c:s", "-acodec", "-scodec"]
+
+class FfmpegCmd:
+    """ Split an ffmpeg command into its components """
+
+    def __init__(self, cmd):
+        if "-i" not in cmd:
+            raise ValueError("ffmpeg command has no input")
+        idx = cmd.index("-i")
+        self.ffmpeg = cmd[0]
+        self.inputOptions = []
+        self.progress = False
+        
+        args = iter(cmd[1:idx])
+        for arg in args:
+            if arg == "-nostats":
+                continue
+            elif arg == "-progress":
+                next(args)
+                self.progress = True
+            else:
+                self.inputOptions.append(arg)
+        self.input = cmd[idx+1]
+        self.output = cmd[-1]
+
+        self.maps = []
+        self.metadata = []
+        self.videoOptions = []
+        self.threads = None
+
+        args = cmd[idx+2:-1]
+        for name, value in zip(args[::2], args[1::2]):
+            if name == "-map":
+                self.maps.append(value)
+            elif name.startswith("-metadata"):
+                self.metadata += [name, value]
+            elif name == "-threads":
+                self.threads = int(value)
+            elif name not in _copyOptions:
+                self.videoOptions += [name, value]
+
+def _formatTime(seconds):
+    return f"{int(seconds // 3600):02d}:{int(seconds // 60 % 60):02d}:{seconds % 60:05.2f}"
+
+def probe(ffmpegCmd):
+    """ Return dict of ffprobe format and stream info for input of `ffmpegCmd` """
+    cmd = ["ffprobe", "-v", "error"] + ffmpegCmd.inputOptions
+    cmd += ["-show_format", "-show_streams", "-of", "json", ffmpegCmd.input]
+    return json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout)
+
+def nextKeyframe(ffmpegCmd, t, window=10):
+    """ Return time of first video keyframe at or after `t` seconds, or `t` if none found """
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-read_intervals", f"{t}%+{window}",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", ffmpegCmd.input]
+    out = subprocess.run(cmd, capture_output=True, text=True).stdout
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        try:
+            pts = float(pts)
+        except ValueError:
+            continue
+        if "K" in flags and pts >= t:
+            return pts
+    return t
+
+def splitPoints(ffmpegCmd, info, numSegments, jobs=None):
+    """ Return list of (start, duration) segments, relative to the start of the input """
+    start = float(info['format'].get('start_time', 0))
+    duration = float(info['format']['duration'])
+    targets = [start + duration * n / numSegments for n in range(1, numSegments)]
+    with ThreadPoolExecutor(jobs) as executor:
+        points = list(executor.map(lambda t: nextKeyframe(ffmpegCmd, t), targets))
+    points = sorted(set(p - start for p in points if start < p < start + duration))
+    bounds = [0] + points + [duration]
+    return [(a, b - a) for a, b in zip(bounds[:-1], bounds[1:])]
+
+def streamMaps(ffmpegCmd, info):
+    """ Return video map and list of other maps from `ffmpegCmd`
+
+        If the command has no maps, the first video stream and all audio and
+        subtitle streams are used.
+    """
+    if not ffmpegCmd.maps:
+        return "0:v:0", ["0:a?", "0:s?"]
+    types = {f"0:{s['index']}": s['codec_type'] for s in info['streams']}
+    video = [m for m in ffmpegCmd.maps if types.get(m) == "video"]
+    other = [m for m in ffmpegCmd.maps if types.get(m) != "video"]
+    return (video[0] if video else "0:v:0"), other
+
+def segmentCmd(ffmpegCmd, videoMap, start, duration, threads, outpath):
+    """ Return ffmpeg command to encode video of one segment """
+    cmd = [ffmpegCmd.ffmpeg, "-y", "-nostdin", "-v", "error"] + ffmpegCmd.inputOptions
+    if start > 0:
+        cmd += ["-ss", f"{start:.6f}"]
+    cmd += ["-i", ffmpegCmd.input, "-t", f"{duration:.6f}", "-map", videoMap, "-an", "-sn", "-dn"]
+    cmd += ["-threads", str(threads)] + ffmpegCmd.videoOptions + [outpath]
+    return cmd
+
+def joinCmd(ffmpegCmd, listPath, otherMaps):
+    """ Return ffmpeg command to join segments and mux with streams from the input """
+    cmd = [ffmpegCmd.ffmpeg, "-y", "-nostdin", "-f", "concat", "-safe", "0", "-i", listPath]
+    cmd += ffmpegCmd.inputOptions + ["-i", ffmpegCmd.input, "-map", "0:v"]
+    for m in otherMaps:
+        cmd += ["-map", "1" + m[m.index(":"):]]
+    cmd += ["-c", "copy"] + ffmpegCmd.metadata + [ffmpegCmd.output]
+    return cmd
+
+class SegmentProgress:
+    """ Combine the `-progress` output of all segment processes """
+
+    def __init__(self, numSegments, interval=0.5):
+        self.values = [{} for _ in range(numSegments)]
+        self.running = set()
+        self.interval = interval
+        self._last = 0
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, n, key, value):
+        with self._lock:
+            if key == "progress":
+                if value == "end":
+                    self.running.discard(n)
+                else:
+                    self.running.add(n)
+                now = time.monotonic()
+                if now - self._last >= self.interval:
+                    self._last = now
+                    self.write()
+            else:
+                self.values[n][key] = value
+
+    def _sum(self, key, segments=None):
+        if segments is None:
+            segments = range(len(self.values))
+        total = 0
+        for n in segments:
+            try:
+                total += float(self.values[n].get(key, 0))
+            except ValueError:
+                pass
+        return total
+
+    def write(self, end=False):
+        outTime = self._sum("out_time_us")
+        size = self._sum("total_size")
+        elapsed = time.monotonic() - self._t0
+        lines = [f"frame={self._sum('frame'):.0f}",
+                 f"fps={self._sum('fps', self.running):.2f}",
+                 f"bitrate={8 * size / outTime * 1e3:.1f}kbits/s" if outTime else "bitrate=N/A",
+                 f"total_size={size:.0f}",
+                 f"out_time_us={outTime:.0f}",
+                 f"speed={outTime / 1e6 / elapsed:.3f}x" if elapsed else "speed=N/A",
+                 "progress=end" if end else "progress=continue"]
+        print("\n".join(lines), flush=True)
+
+def _partPath(path):
+    """ Return path of the temporary file a segment is written to """
+    root, ext = os.path.splitext(path)
+    return f"{root}.part{ext}"
+
+def _logPath(path):
+    return os.path.splitext(path)[0] + ".log"
+
+def runSegment(cmd, n, progress=None):
+    """ Run segment encode `cmd`, passing its progress output to `progress`. Returns returncode.
+
+        The output is written to a temporary file, which is renamed to the
+        output path of `cmd` if the encode succeeds, or removed if it fails.
+        If the encode has been stopped, nothing is run and None is returned.
+    """
+    outpath = cmd[-1]
+    cmd = cmd[:-1] + [_partPath(outpath)]
+    if progress is not None:
+        cmd = cmd[:1] + ["-nostats", "-progress", "pipe:1"] + cmd[1:]
+    with open(_logPath(outpath), "w") as log:
+        with _processLock:
+            if _stopped.is_set():
+                return None
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log, text=True)
+            _processes.add(process)
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if progress is not None:
+                progress.update(n, key, value)
+        rc = process.wait()
+        _processes.discard(process)
+    if rc == 0:
+        os.replace(_partPath(outpath), outpath)
+    elif os.path.exists(_partPath(outpath)):
+        os.remove(_partPath(outpath))
+    return rc
+
+def loadPlan(segDir, ffmpegCmd):
+    """ Return segments from a previous run of `ffmpegCmd` in `segDir`, or None """
+    try:
+        with open(os.path.join(segDir, "plan.json")) as fileobj:
+            plan = json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+    if plan.get('key') != _planKey(ffmpegCmd):
+        return None
+    return [tuple(segment) for segment in plan['segments']]
+
+def savePlan(segDir, ffmpegCmd, segments):
+    with open(os.path.join(segDir, "plan.json"), "w") as fileobj:
+        json.dump({'key': _planKey(ffmpegCmd), 'segments': segments}, fileobj)
+
+def _planKey(ffmpegCmd):
+    """ Return the parts of `ffmpegCmd` which change the encoded segments """
+    return [ffmpegCmd.inputOptions, ffmpegCmd.input, ffmpegCmd.videoOptions]
+
+def defaultJobs(threads=None):
+    """ Return number of parallel ffmpeg processes to use for `threads` (default all cores) """
+    if threads is None:
+        threads = os.cpu_count()
+    return max(1, threads // THREADS_PER_SEGMENT)
+
+def encode(ffmpegCmd, jobs=None, numSegments=None, segmentDuration=None, log=print):
+    """ Encode with `jobs` parallel processes. Returns True if successful.
+
+        The number of segments can be given directly, or as the approximate
+        duration of each segment in seconds. By default, there are twice as many
+        segments as jobs.
+
+        If a previous run of the same command was interrupted, segments which
+        were finished are not encoded again.
+    """
+    if jobs is None:
+        jobs = defaultJobs(ffmpegCmd.threads)
+    threads = max(1, (ffmpegCmd.threads or os.cpu_count()) // jobs)
+
+    info = probe(ffmpegCmd)
+    totalDuration = float(info['format']['duration'])
+    if numSegments is None:
+        if segmentDuration is not None:
+            numSegments = max(1, math.ceil(totalDuration / segmentDuration))
+        else:
+            # more segments than jobs, so that a slow segment doesn't hold up the others
+            numSegments = 2 * jobs
+
+    segDir = ffmpegCmd.output + ".segments"
+    os.makedirs(segDir, exist_ok=True)
+    if (segments := loadPlan(segDir, ffmpegCmd)) is None:
+        segments = splitPoints(ffmpegCmd, info, numSegments, jobs)
+        savePlan(segDir, ffmpegCmd, segments)
+    videoMap, otherMaps = streamMaps(ffmpegCmd, info)
+    log(f"Duration: {_formatTime(totalDuration)}")
+
+    segPaths = [os.path.join(segDir, f"segment_{n:04d}.mkv") for n in range(len(segments))]
+    todo = [n for n, path in enumerate(segPaths) if not os.path.exists(path)]
+    if len(todo) < len(segments):
+        log(f"Resuming: {len(segments) - len(todo)} of {len(segments)} segments already encoded")
+    log(f"Encoding {len(todo)} segments with {jobs} processes, {threads} threads each")
+
+    progress = SegmentProgress(len(segments)) if ffmpegCmd.progress else None
+    if progress is not None:
+        for n in set(range(len(segments))) - set(todo):
+            progress.values[n]['out_time_us'] = segments[n][1] * 1e6
+    t0 = time.monotonic()
+    ok = True
+    executor = ThreadPoolExecutor(jobs)
+    try:
+        futures = {executor.submit(runSegment, segmentCmd(ffmpegCmd, videoMap, *segments[n],
+                                                          threads, segPaths[n]), n, progress): n
+                   for n in todo}
+        for count, future in enumerate(as_completed(futures), start=1):
+            n = futures[future]
+            if (rc := future.result()) is None:
+                # stopped
+                ok = False
+                break
+            if rc != 0:
+                ok = False
+                with open(_logPath(segPaths[n])) as fileobj:
+                    log(f"Segment {n} failed:\n{fileobj.read().strip()}")
+            else:
+                log(f"Segment {n} done ({count}/{len(todo)}, {time.monotonic()-t0:.1f}s)")
+    finally:
+        # when stopped (e.g. by SIGTERM raising SystemExit here), don't start queued segments
+        executor.shutdown(cancel_futures=_stopped.is_set())
+    if not ok:
+        return False
+
+    listPath = os.path.join(segDir, "segments.txt")
+    with open(listPath, "w") as fileobj:
+        for path in segPaths:
+            path = path.replace("'", "'\\''")
+            fileobj.write(f"file '{path}'\n")
+    cmd = joinCmd(ffmpegCmd, listPath, otherMaps)
+    log(" ".join(cmd))
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        log(result.stderr.strip())
+        return False
+    shutil.rmtree(segDir)
+    if progress is not None:
+        progress.write(end=True)
+    log(f"Encoded in {time.monotonic()-t0:.1f}s")
+    return True
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" not in argv:
+        print("ffmpeg command should be given after '--'", file=sys.stderr)
+        return 2
+    idx = argv.index("--")
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-j", "--jobs", type=int, help="Number of parallel ffmpeg processes")
+    parser.add_argument("-n", "--segments", type=int, help="Number of segments")
+    parser.add_argument("-d", "--segment-duration", type=float,
+                        help="Approximate duration of each segment, in seconds")
+    args = parser.parse_args(argv[:idx])
+
+    # SIGTERM from the process manager should stop the segment encodes too; 
+    # finished segments are kept, so the encode can be resumed
+    def terminate(signum, frame):
+        with _processLock:
+            _stopped.set()
+            for process in list(_processes):
+                process.terminate()
+        sys.exit(128 + signum)
+    signal.signal(signal.SIGTERM, terminate)
+
+    ok = encode(FfmpegCmd(argv[idx+1:]), jobs=args.jobs, numSegments=args.segments,
+                segmentDuration=args.segment_duration, log=lambda msg: print(msg, flush=True))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""
+Directories for DRip's logs, caches and other files, following the XDG base
+directory spec.
+"""
+import os
+
+def _xdgDir(var, default, parts):
+    base = os.environ.get(var) or os.path.join(os.path.expanduser("~"), *default)
+    path = os.path.join(base, "drip", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def stateDir(*parts):
+    """ Return (and create) directory for persistent state, e.g. logs """
+    return _xdgDir("XDG_STATE_HOME", [".local", "state"], parts)
+
+def cacheDir(*parts):
+    """ Return (and create) directory for cached data """
+    return _xdgDir("XDG_CACHE_HOME", [".cache"], parts)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Set the CPU priority, I/O class, CPU affinity and cgroup CPU weight of
+processes, as described by a :class:`ResourcePolicy`.
+
+Policies are written as space-separated settings, e.g.
+
+    nice=10 io=best-effort:7 cpus=0-3,6 weight=50
+
+where `io` is 'realtime', 'best-effort' or 'idle', optionally with a level
+from 0 (highest) to 7, `cpus` is a list of CPUs and ranges, and `weight` is a
+cgroup v2 `cpu.weight` (1-10000, default 100). Any setting can be left out.
+
+Run as a script, this applies a policy to itself and then execs the command
+given after '--', so the policy is in place before the command starts any
+threads:
+
+    priority.py --policy "nice=10 io=idle" -- ffmpeg ...
+
+Cgroup weights are only used if the DRIP_CGROUP environment variable names a
+cgroup v2 directory that DRip may create child groups in (e.g. one delegated
+with `systemd-run --user --scope -p Delegate=yes`). Processes already in that
+cgroup are moved to a 'drip-main' child, so that the cpu controller can be
+enabled for its children. If a weight can't be set, the error is printed to
+stderr and the weight is ignored.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+from dataclasses import dataclass
+import argparse
+import ctypes
+import os
+import platform
+import sys
+
+IO_CLASSES = {"none": 0, "realtime": 1, "best-effort": 2, "idle": 3}
+
+_ioprioSetSyscalls = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314,
+                      "ppc64le": 273, "s390x": 282, "riscv64": 30}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+
+_cgroupErrors = set()
+""" Weights which couldn't be set, so the error is only reported once """
+
+@dataclass
+class ResourcePolicy:
+    nice: int = None
+    ioClass: str = None
+    """ One of :attr:`IO_CLASSES` """
+    ioLevel: int = None
+    """ Priority within the I/O class, from 0 (highest) to 7 """
+    cpus: frozenset = None
+    """ CPUs the process may run on """
+    cpuWeight: int = None
+    """ cgroup v2 cpu.weight """
+
+    @classmethod
+    def fromString(cls, text):
+        """ Make ResourcePolicy from string of space-separated 'key=value' settings """
+        policy = cls()
+        for item in text.split():
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"Invalid policy setting '{item}'")
+            if key == "nice":
+                policy.nice = int(value)
+            elif key == "io":
+                ioClass, _, level = value.partition(":")
+                if ioClass not in IO_CLASSES:
+                    raise ValueError(f"Unknown I/O class '{ioClass}'")
+                policy.ioClass = ioClass
+                policy.ioLevel = int(level) if level else None
+            elif key == "cpus":
+                policy.cpus = parseCpus(value)
+            elif key == "weight":
+                policy.cpuWeight = int(value)
+            else:
+                raise ValueError(f"Unknown policy setting '{key}'")
+        return policy
+
+    def __str__(self):
+        items = []
+        if self.nice is not None:
+            items.append(f"nice={self.nice}")
+        if self.ioClass is not None:
+            level = f":{self.ioLevel}" if self.ioLevel is not None else ""
+            items.append(f"io={self.ioClass}{level}")
+        if self.cpus:
+            items.append(f"cpus={formatCpus(self.cpus)}")
+        if self.cpuWeight is not None:
+            items.append(f"weight={self.cpuWeight}")
+        return " ".join(items)
+
+    def __bool__(self):
+        return bool(str(self))
+
+def parseCpus(text):
+    """ Return frozenset of CPUs from list of CPUs and ranges, e.g. '0-3,6' """
+    cpus = set()
+    for part in text.split(","):
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return frozenset(cpus)
+
+def formatCpus(cpus):
+    """ Return list of CPUs and ranges from set of `cpus` """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+def _tasks(pid):
+    """ Return list of thread ids of `pid` """
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+def setIoPriority(tid, ioClass, level=None):
+    """ Set I/O scheduling class and level of thread `tid`. Returns True if successful. """
+    number = _ioprioSetSyscalls.get(platform.machine())
+    if number is None:
+        return False
+    if level is None:
+        level = 4 if ioClass == "best-effort" else 0
+    value = (IO_CLASSES[ioClass] << _IOPRIO_CLASS_SHIFT) | level
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, value) == 0
+    except (OSError, AttributeError):
+        return False
+
+def _enableCpuController(root):
+    """ Enable the cpu controller for the child groups of cgroup `root`
+
+        A cgroup can only pass controllers on to its children if it has no
+        processes of its own, so any processes in `root` (e.g. DRip itself,
+        if `root` is the scope it was started in) are moved to the leaf group
+        'drip-main' first.
+    """
+    with open(os.path.join(root, "cgroup.subtree_control")) as fileobj:
+        if "cpu" in fileobj.read().split():
+            return None
+    with open(os.path.join(root, "cgroup.procs")) as fileobj:
+        pids = fileobj.read().split()
+    if pids:
+        leaf = os.path.join(root, "drip-main")
+        os.makedirs(leaf, exist_ok=True)
+        for pid in pids:
+            try:
+                with open(os.path.join(leaf, "cgroup.procs"), "w") as fileobj:
+                    fileobj.write(pid)
+            except OSError:
+                # e.g. the process has exited
+                pass
+    with open(os.path.join(root, "cgroup.subtree_control"), "w") as fileobj:
+        fileobj.write("+cpu")
+
+def cgroupPath(weight):
+    """ Return (and create) the child of DRIP_CGROUP with cpu.weight `weight`, or None """
+    root = os.environ.get("DRIP_CGROUP")
+    if not root:
+        return None
+    path = os.path.join(root, f"drip-weight-{weight}")
+    try:
+        _enableCpuController(root)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "cpu.weight"), "w") as fileobj:
+            fileobj.write(str(weight))
+    except OSError as err:
+        _cgroupError(weight, err)
+        return None
+    return path
+
+def _cgroupError(weight, err):
+    if weight not in _cgroupErrors:
+        _cgroupErrors.add(weight)
+        print(f"Could not set CPU weight {weight} in cgroup {os.environ.get('DRIP_CGROUP')}: {err}",
+              file=sys.stderr, flush=True)
+
+def applyPolicy(policy, pids):
+    """ Apply `policy` to every thread of each process in `pids`. Errors are ignored. """
+    cgroup = cgroupPath(policy.cpuWeight) if policy.cpuWeight is not None else None
+    for pid in pids:
+        if cgroup is not None:
+            try:
+                with open(os.path.join(cgroup, "cgroup.procs"), "w") as fileobj:
+                    fileobj.write(str(pid))
+            except OSError as err:
+                _cgroupError(policy.cpuWeight, err)
+        for tid in _tasks(pid):
+            try:
+                if policy.nice is not None:
+                    os.setpriority(os.PRIO_PROCESS, tid, policy.nice)
+                if policy.cpus:
+                    os.sched_setaffinity(tid, policy.cpus & os.sched_getaffinity(0) or policy.cpus)
+            except (OSError, AttributeError):
+                # e.g. lowering niceness without permission, or the thread has exited
+                pass
+            if policy.ioClass is not None:
+                setIoPriority(tid, policy.ioClass, policy.ioLevel)
+
+def policyCmd(policy, cmd):
+    """ Return `cmd` wrapped in a call to this script, to run it with `policy` """
+    return [sys.executable, os.path.abspath(__file__), "--policy", str(policy), "--"] + list(cmd)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" not in argv:
+        print("Command should be given after '--'", file=sys.stderr)
+        return 2
+    idx = argv.index("--")
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--policy", default="", help="Policy to apply, e.g. 'nice=10 io=idle'")
+    args = parser.parse_args(argv[:idx])
+    cmd = argv[idx+1:]
+    if not cmd:
+        print("No command given", file=sys.stderr)
+        return 2
+    try:
+        policy = ResourcePolicy.fromString(args.policy)
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 2
+    applyPolicy(policy, [os.getpid()])
+    try:
+        os.execvp(cmd[0], cmd)
+    except OSError as err:
+        print(f"Could not start {' '.join(cmd)}: {err}", file=sys.stderr)
+        return 127
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Stream discovery with ffprobe, and a persistent cache of the results.
+"""
+from dataclasses import dataclass, field
+from .paths import cacheDir
+from . import vobcat, discinfo
+import json
+import os
+
+PROBE_ARGS = ["-analyzeduration", "100M", "-probesize", "100M"]
+
+def probeCmd(path):
+    """ Return ffprobe command to get JSON format and stream info for `path`
+    
+        ffprobe's log is turned off, so its output is just the JSON.
+    """
+    return ["ffprobe", "-v", "quiet"] + PROBE_ARGS + ["-show_format", "-show_streams", "-of", "json",
+                                                     vobcat.inputUrl(path)]
+
+@dataclass(slots=True)
+class StreamInfo:
+    num: str
+    streamType: str
+    info: str
+    codec: str = ""
+    language: str = None
+    streamId: int = None
+    """ MPEG stream ID, for streams in a VOB """
+    duration: float = None
+    disposition: dict = field(default_factory=dict)
+    selected: bool = False
+    hasMetadata: bool = False
+    metadata: dict[str] = field(default_factory=dict)
+
+    @classmethod
+    def fromProbe(cls, stream):
+        """ Make StreamInfo from a stream dict from ffprobe's JSON output """
+        codec = stream.get('codec_name', "unknown")
+        streamType = stream.get('codec_type', "unknown").capitalize()
+        details = [codec]
+        if streamType == "Video":
+            if 'width' in stream:
+                details.append(f"{stream['width']}x{stream['height']}")
+            if (dar := stream.get('display_aspect_ratio')):
+                details.append(f"DAR {dar}")
+            if (rate := stream.get('avg_frame_rate', "0/0")) != "0/0":
+                num, den = rate.split("/")
+                details.append(f"{int(num) / int(den):.3g} fps")
+        elif streamType == "Audio":
+            if 'sample_rate' in stream:
+                details.append(f"{stream['sample_rate']} Hz")
+            if (layout := stream.get('channel_layout')):
+                details.append(layout)
+        language = stream.get('tags', {}).get('language')
+        duration = stream.get('duration')
+        try:
+            streamId = int(stream['id'], 16)
+        except (KeyError, ValueError):
+            streamId = None
+        return cls(num=f"0:{stream['index']}", streamType=streamType, info=", ".join(details),
+                   codec=codec, language=language, streamId=streamId,
+                   duration=float(duration) if duration is not None else None,
+                   disposition={k: v for k, v in stream.get('disposition', {}).items() if v})
+
+    @property
+    def label(self):
+        label = f"Stream #{self.num}: {self.streamType}: {self.info}"
+        if self.language:
+            label += f" ({self.language})"
+        if self.disposition:
+            label += " [" + ", ".join(self.disposition) + "]"
+        return label
+
+    @property
+    def stype(self):
+        return self.streamType.lower()
+
+    def setSelected(self, state):
+        selected = False if state == 0 else True # `state` is Qt.CheckState enum
+        self.selected = selected
+
+    def setMetadata(self, language=None, title=None):
+        self.hasMetadata = True
+        if language is not None:
+            self.metadata['language'] = language
+        if title is not None:
+            self.metadata['title'] = title
+
+    def setMetadataLanguage(self, language):
+        self.setMetadata(language=language)
+
+    def setMetadataTitle(self, title):
+        self.setMetadata(title=title)
+
+    def getStreamInfo(self, outputIndex=0) -> list[str]:
+        """ Return ffmpeg args to map this stream, if selected, and set its metadata
+
+            `outputIndex` is the index of the stream among the output's
+            streams of the same type, which the metadata is set on.
+        """
+        if not self.selected:
+            return None
+        cmd = ["-map", self.num]
+        if self.hasMetadata:
+            if self.stype == "audio":
+                metadataId = f"s:a:{outputIndex}"
+            elif self.stype == "subtitle":
+                metadataId = f"s:s:{outputIndex}"
+            if (language := self.metadata.get("language", None)) is not None:
+                cmd += [f"-metadata:{metadataId}", f"language={language}"]
+            if (title := self.metadata.get("title", None)) is not None:
+                cmd += [f"-metadata:{metadataId}", f"title={title}"]
+        return cmd
+
+@dataclass
+class ProbeResult:
+    duration: float = None
+    streams: list = field(default_factory=list)
+
+    @classmethod
+    def fromJson(cls, data):
+        """ Make ProbeResult from ffprobe's JSON output (as str or dict) """
+        if isinstance(data, str):
+            data = json.loads(data)
+        duration = data.get('format', {}).get('duration')
+        return cls(duration=float(duration) if duration is not None else None,
+                   streams=[StreamInfo.fromProbe(s) for s in data.get('streams', [])])
+
+def discLanguages(path):
+    """ Return dict of MPEG stream ID: language code for DVD title `path`, from its IFO file
+
+        `path` can be a VIDEO_TS directory or a VOB concatenated in one. If
+        there is no IFO file for the title VOBs, an empty dict is returned.
+    """
+    if not os.path.isdir(path):
+        path = os.path.dirname(path)
+    try:
+        vobs = vobcat.titleVobs(path)
+    except OSError:
+        return {}
+    if not vobs:
+        return {}
+    # VOBs are named VTS_xx_n.VOB
+    return discinfo.readStreamLanguages(path, int(os.path.basename(vobs[0])[4:6]))
+
+def _statKey(path):
+    """ Return (size, mtime) of `path`, or of the title VOBs if `path` is a directory """
+    paths = vobcat.titleVobs(path) if os.path.isdir(path) else [path]
+    stats = [os.stat(p) for p in paths]
+    return sum(st.st_size for st in stats), max((st.st_mtime for st in stats), default=0)
+
+class ProbeCache:
+    """ Cache of ffprobe JSON output, keyed by path, size and modification time
+
+        At most `maxEntries` results are kept; the least recently added are
+        removed first.
+    """
+
+    def __init__(self, path=None, maxEntries=500):
+        if path is None:
+            path = os.path.join(cacheDir(), "probe.json")
+        self.path = path
+        self.maxEntries = maxEntries
+        try:
+            with open(self.path) as fileobj:
+                self._cache = json.load(fileobj)
+        except (OSError, ValueError):
+            self._cache = {}
+
+    def _key(self, path):
+        size, mtime = _statKey(path)
+        return f"{os.path.abspath(path)}|{size}|{mtime}"
+
+    def get(self, path):
+        """ Return cached ffprobe data for `path`, or None """
+        try:
+            return self._cache.get(self._key(path))
+        except OSError:
+            return None
+
+    def set(self, path, data):
+        """ Store ffprobe `data` for `path` """
+        key = self._key(path)
+        prefix = key.rsplit("|", 2)[0] + "|"
+        # remove stale entries for this path
+        for k in [k for k in self._cache if k.startswith(prefix)]:
+            del self._cache[k]
+        self._cache[key] = data
+        while len(self._cache) > self.maxEntries:
+            del self._cache[next(iter(self._cache))]
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as fileobj:
+            json.dump(self._cache, fileobj)
+        os.replace(tmp, self.path)
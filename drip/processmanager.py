@@ -0,0 +1,404 @@
+"""
+Run any number of subprocesses from a single selector-driven thread.
+
+Each process can claim named resources, e.g. an optical drive or an encode
+slot. Processes wait in a queue until all of their resources are below their
+concurrency limits.
+
+While processes are running, their CPU, memory and I/O are sampled (see
+:mod:`metrics`). Each process is run with a :class:`ResourcePolicy` for its
+stage (see :mod:`priority`), which can be changed while it runs.
+
+Each process is started in its own process group, so it can be paused,
+resumed and cancelled together with any processes it runs. A cancelled
+process group which hasn't exited after `killTimeout` seconds is killed, and
+nothing in the group is left running when `onFinished` is called.
+
+Nothing here imports Qt. Callbacks are called from the manager's thread; an
+exception from a callback is printed, and doesn't stop the thread.
+"""
+from collections import deque, Counter
+import os
+import re
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from .metrics import ProcessSampler, MetricsExporter, processTree, descendants
+from .priority import ResourcePolicy, applyPolicy, policyCmd
+import shutil
+
+_lineEndRe = re.compile(rb"\r\n|\r(?!\Z)|\n")
+
+def _call(func, *args):
+    """ Return `func(*args)`, or None if `func` is None or raises an exception
+
+        Exceptions are printed rather than raised, so that a failing callback
+        doesn't stop the manager's thread.
+    """
+    if func is None:
+        return None
+    try:
+        return func(*args)
+    except Exception:
+        print(f"Error in {getattr(func, '__qualname__', func)}:", file=sys.stderr)
+        traceback.print_exc()
+        return None
+
+DEFAULT_LIMITS = {"drive:*": 1, "encode": int(os.environ.get("DRIP_MAX_ENCODES", 1))}
+""" Default concurrency limits. Resources not listed here (or matched by a 'prefix:*' entry) are unlimited. """
+
+DEFAULT_POLICIES = {
+    "info": ResourcePolicy(nice=0, ioClass="best-effort", ioLevel=0),
+    "rip": ResourcePolicy(nice=0, ioClass="best-effort", ioLevel=0),
+    "cat": ResourcePolicy(nice=5, ioClass="best-effort", ioLevel=4),
+    "remux": ResourcePolicy(nice=5, ioClass="best-effort", ioLevel=4),
+    "analyse": ResourcePolicy(nice=10, ioClass="best-effort", ioLevel=7, cpuWeight=50),
+    "tune": ResourcePolicy(nice=10, ioClass="best-effort", ioLevel=7, cpuWeight=50),
+    "encode": ResourcePolicy(nice=10, ioClass="best-effort", ioLevel=7, cpuWeight=50),
+}
+""" Default :class:`ResourcePolicy` for each stage: rips get the highest unprivileged I/O 
+    priority, so the drive isn't stalled by encodes, which run at background CPU 
+    priority. A stage's policy can be set with an environment variable, e.g. 
+    DRIP_POLICY_ENCODE="nice=15 io=idle cpus=2-7". 
+"""
+
+def stagePolicy(stage):
+    """ Return :class:`ResourcePolicy` for `stage`, from the environment or :attr:`DEFAULT_POLICIES` """
+    if stage is not None and (text := os.environ.get(f"DRIP_POLICY_{stage.upper()}")) is not None:
+        try:
+            return ResourcePolicy.fromString(text)
+        except ValueError:
+            pass
+    return DEFAULT_POLICIES.get(stage, ResourcePolicy())
+
+def driveResource(device):
+    """ Return resource name for optical drive `device` """
+    return f"drive:{os.path.realpath(device)}"
+
+class ManagedProcess:
+    """ A command submitted to the :class:`ProcessManager` """
+
+    def __init__(self, cmd, resources=(), onStarted=None, onOutput=None, onFinished=None,
+                 stage=None, policy=None, **kwargs):
+        self.cmd = cmd
+        self.resources = list(resources)
+        self.stage = stage
+        self.policy = policy
+        self.onStarted = onStarted
+        self.onOutput = onOutput
+        self.onFinished = onFinished
+        self.popenKwargs = kwargs
+        self.state = "queued"
+        self.paused = False
+        self.popen = None
+        self.returncode = None
+        self.sampler = None
+        self._cancelTime = None
+        self._buffer = b""
+        self._lines = []
+        self._batchSize = 0
+        self._lastEmit = 0
+
+    @property
+    def pid(self):
+        return self.popen.pid if self.popen is not None else None
+    
+    @property
+    def metrics(self):
+        """ :class:`ProcessMetrics` of this process, or None if it hasn't started """
+        return self.sampler.metrics if self.sampler is not None else None
+    
+    @property
+    def device(self):
+        """ Optical drive used by this process, or None """
+        for resource in self.resources:
+            if resource.startswith("drive:"):
+                return resource[len("drive:"):]
+        return None
+
+    def _feed(self, data):
+        *lines, self._buffer = _lineEndRe.split(self._buffer + data)
+        for line in lines:
+            line = line.decode(errors="replace").rstrip()
+            self._lines.append(line)
+            self._batchSize += len(line) + 1
+
+    def _flush(self, now, interval, maxBatchSize, force=False):
+        if force and (rest := self._buffer.rstrip(b"\r")):
+            self._buffer = b""
+            self._feed(rest + b"\n")
+        if not self._lines:
+            return None
+        if force or now - self._lastEmit >= interval or self._batchSize >= maxBatchSize:
+            lines, self._lines, self._batchSize = self._lines, [], 0
+            self._lastEmit = now
+            _call(self.onOutput, lines)
+
+class ProcessManager:
+    """ Run subprocesses, with per-resource concurrency limits
+
+        Output of each process is read in one background thread and passed to
+        its `onOutput` callback as lists of lines, at most every `interval`
+        seconds, or sooner if more than `maxBatchSize` characters are waiting.
+        
+        Metrics of running processes are sampled every `sampleInterval` seconds.
+        When a process finishes, its :class:`ProcessMetrics` are passed to each
+        function added with :meth:`addMetricsListener`.
+
+        Cancelled processes are sent SIGTERM, then SIGKILL if they are still
+        running after `killTimeout` seconds.
+    """
+
+    def __init__(self, limits=None, interval=0.1, maxBatchSize=64*1024, sampleInterval=1,
+                 killTimeout=10):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.interval = interval
+        self.maxBatchSize = maxBatchSize
+        self.sampleInterval = sampleInterval
+        self.killTimeout = killTimeout
+        self._lastSample = 0
+        self._metricsListeners = []
+        self._queue = deque()
+        self._running = []
+        self._usage = Counter()
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeRead, self._wakeWrite = os.pipe()
+        self._selector.register(self._wakeRead, selectors.EVENT_READ)
+        self._thread = None
+
+    def limit(self, resource):
+        """ Return the concurrency limit for `resource`, or None if unlimited """
+        if resource in self.limits:
+            return self.limits[resource]
+        prefix = resource.split(":")[0] + ":*"
+        return self.limits.get(prefix)
+
+    def setLimit(self, resource, limit):
+        """ Set the concurrency limit for `resource` (None for unlimited) """
+        with self._lock:
+            self.limits[resource] = limit
+        self._wake()
+
+    def addMetricsListener(self, func):
+        """ Call `func(metrics)` from the manager's thread when each process finishes """
+        self._metricsListeners.append(func)
+
+    def submit(self, cmd, resources=(), onStarted=None, onOutput=None, onFinished=None, stage=None,
+               policy=None, **kwargs):
+        """ Queue `cmd` to be run when `resources` are available. Returns :class:`ManagedProcess`.
+
+            `onStarted(process)` is called when the process starts, `onOutput(lines)`
+            with batches of output lines, and `onFinished(process)` when the process
+            has finished. If the process could not be started or was cancelled before
+            starting, its returncode is None. `stage` names the pipeline stage in 
+            the process's metrics. The process is run with :class:`ResourcePolicy`
+            `policy`, or the policy for `stage` if not given. Other kwargs are 
+            passed to `subprocess.Popen`.
+        """
+        if policy is None:
+            policy = stagePolicy(stage)
+        proc = ManagedProcess(cmd, resources, onStarted, onOutput, onFinished, stage, policy,
+                              **kwargs)
+        with self._lock:
+            self._queue.append(proc)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="ProcessManager", daemon=True)
+                self._thread.start()
+        self._wake()
+        return proc
+
+    def isWaiting(self, proc):
+        """ Return True if `proc` is waiting for resources """
+        with self._lock:
+            return proc in self._queue
+
+    def pause(self, proc):
+        """ Suspend `proc` and its process group with SIGSTOP. Returns True if it was paused. """
+        if proc.state != "running" or proc.paused or proc.sampler is None:
+            return False
+        proc.paused = True
+        proc.sampler.pause()
+        self._signal(proc, signal.SIGSTOP)
+        return True
+
+    def resume(self, proc):
+        """ Continue `proc` and its process group with SIGCONT. Returns True if it was resumed. """
+        if proc.state != "running" or not proc.paused or proc.sampler is None:
+            return False
+        proc.paused = False
+        proc.sampler.resume()
+        self._signal(proc, signal.SIGCONT)
+        return True
+
+    def cancel(self, proc):
+        """ Cancel `proc`: remove it from the queue, or terminate its process group if running """
+        with self._lock:
+            if proc in self._queue:
+                self._queue.remove(proc)
+                proc.state = "cancelled"
+                queued = True
+            elif proc.state == "starting":
+                # taken from the queue, but not started yet; _start will see this
+                proc.state = "cancelled"
+                return None
+            else:
+                queued = False
+        if queued:
+            if proc.onFinished is not None:
+                proc.onFinished(proc)
+        elif proc.state == "running":
+            proc.state = "cancelled"
+            proc._cancelTime = time.monotonic()
+            self._signal(proc, signal.SIGTERM)
+            if proc.paused:
+                # stopped processes only act on SIGTERM once they are continued
+                proc.paused = False
+                proc.sampler.resume()
+                self._signal(proc, signal.SIGCONT)
+
+    @staticmethod
+    def _signal(proc, signum):
+        """ Send `signum` to the process group of `proc` """
+        try:
+            os.killpg(proc.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def setPolicy(self, proc, policy):
+        """ Set the :class:`ResourcePolicy` of `proc`, applying it now if it is running """
+        proc.policy = policy
+        if proc.state == "running" and (pid := proc.pid) is not None:
+            applyPolicy(policy, [pid] + descendants(pid, processTree()))
+
+    @property
+    def running(self):
+        with self._lock:
+            return list(self._running)
+
+    def _wake(self):
+        os.write(self._wakeWrite, b"\0")
+
+    def _available(self, proc):
+        for resource in proc.resources:
+            if (limit := self.limit(resource)) is not None and self._usage[resource] >= limit:
+                return False
+        return True
+
+    def _startQueued(self):
+        with self._lock:
+            ready = []
+            for proc in list(self._queue):
+                if self._available(proc):
+                    self._queue.remove(proc)
+                    self._usage.update(proc.resources)
+                    proc.state = "starting"
+                    ready.append(proc)
+        for proc in ready:
+            self._start(proc)
+
+    def _start(self, proc):
+        with self._lock:
+            if (cancelled := proc.state == "cancelled"):
+                self._usage.subtract(proc.resources)
+        if cancelled:
+            _call(proc.onFinished, proc)
+            return None
+        cmd = proc.cmd
+        if proc.policy and shutil.which(cmd[0]) is not None:
+            # apply the policy before the command starts any threads
+            cmd = policyCmd(proc.policy, cmd)
+        try:
+            proc.popen = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                          start_new_session=True, **proc.popenKwargs)
+        except Exception as err:
+            # OSError, or e.g. ValueError for a NUL byte in an argument
+            proc.state = "finished"
+            with self._lock:
+                self._usage.subtract(proc.resources)
+            _call(proc.onOutput, [f"Could not start {proc.cmd[0]}: {err}"])
+            _call(proc.onFinished, proc)
+            return None
+        proc.sampler = _call(ProcessSampler, proc.popen.pid, proc.stage, proc.cmd, proc.device)
+        with self._lock:
+            if not (cancelled := proc.state == "cancelled"):
+                proc.state = "running"
+            self._running.append(proc)
+        self._selector.register(proc.popen.stdout, selectors.EVENT_READ, proc)
+        _call(proc.onStarted, proc)
+        if cancelled:
+            # cancelled while it was starting
+            proc._cancelTime = time.monotonic()
+            self._signal(proc, signal.SIGTERM)
+
+    def _finish(self, proc):
+        self._selector.unregister(proc.popen.stdout)
+        proc.popen.stdout.close()
+        if proc.sampler is not None:
+            _call(proc.sampler.sample)
+        # reap the process here, to get its resource usage
+        try:
+            _, status, rusage = os.wait4(proc.popen.pid, 0)
+        except ChildProcessError:
+            proc.returncode, rusage = proc.popen.wait(), None
+        else:
+            proc.returncode = proc.popen.returncode = os.waitstatus_to_exitcode(status)
+        if proc.sampler is not None and \
+                (metrics := _call(proc.sampler.finish, proc.returncode, rusage)) is not None:
+            for func in self._metricsListeners:
+                _call(func, metrics)
+        if proc.state == "cancelled":
+            # the process has exited, but anything it started may not have, e.g.
+            # a wrapper's children, which could still be writing partial output
+            self._signal(proc, signal.SIGKILL)
+        proc._flush(time.monotonic(), self.interval, self.maxBatchSize, force=True)
+        if proc.state == "running":
+            proc.state = "finished"
+        with self._lock:
+            self._running.remove(proc)
+            self._usage.subtract(proc.resources)
+        _call(proc.onFinished, proc)
+
+    def _loop(self):
+        while True:
+            self._startQueued()
+            for key, _ in self._selector.select(timeout=self.interval):
+                if key.fileobj == self._wakeRead:
+                    os.read(self._wakeRead, 4096)
+                    continue
+                proc = key.data
+                data = os.read(key.fileobj.fileno(), 65536)
+                if data:
+                    proc._feed(data)
+                else:
+                    self._finish(proc)
+            now = time.monotonic()
+            running = self.running
+            for proc in running:
+                proc._flush(now, self.interval, self.maxBatchSize)
+                if proc._cancelTime is not None and now - proc._cancelTime >= self.killTimeout:
+                    # ignored SIGTERM, or is taking too long to stop
+                    proc._cancelTime = None
+                    self._signal(proc, signal.SIGKILL)
+            if running and now - self._lastSample >= self.sampleInterval:
+                self._lastSample = now
+                tree = _call(processTree) or {}
+                for proc in running:
+                    if proc.sampler is not None:
+                        _call(proc.sampler.sample, tree)
+
+_manager = None
+_managerLock = threading.Lock()
+
+def getManager():
+    """ Return the shared :class:`ProcessManager` """
+    global _manager
+    with _managerLock:
+        if _manager is None:
+            _manager = ProcessManager()
+            _manager.addMetricsListener(MetricsExporter().record)
+        return _manager
@@ -0,0 +1,178 @@
+from qtpy.QtWidgets import (QPushButton, QWidget, QTableWidget, QTableWidgetItem, QTabWidget,
+                            QComboBox, QHBoxLayout, QVBoxLayout, QHeaderView, QAbstractItemView)
+from qtpy.QtGui import QIcon
+from qtpy.QtCore import Signal
+from customQObjects.widgets import VSplitter
+from .cmdwidget import CmdWidget
+from .jobqueue import JobQueue
+from .priority import ResourcePolicy
+import os.path
+import time
+
+class QueueWidget(VSplitter):
+    """ Widget to show the :class:`JobQueue` and the output of its stages """
+
+    requestRipAll = Signal()
+    """ **signal** requestRipAll()
+
+        Emitted when the 'rip all drives' button is clicked
+    """
+
+    encodePriorities = {
+        "Background encode": None,
+        "Idle encode": ResourcePolicy(nice=19, ioClass="idle", cpuWeight=1),
+        "Normal encode": ResourcePolicy(nice=0, ioClass="best-effort", ioLevel=4, cpuWeight=100),
+    }
+    """ Encode policies to choose from. None uses the default for each command. Raising the
+        priority of a running encode needs permission to lower its niceness. """
+
+    def __init__(self):
+        super().__init__()
+
+        self.queue = JobQueue()
+        self._rows = []
+
+        icon = QIcon.fromTheme("media-playback-start")
+        self.startButton = QPushButton(icon, "")
+        self.startButton.setCheckable(True)
+        self.startButton.toggled.connect(self._setRunning)
+        self.startButton.setToolTip("Start processing the queue")
+
+        icon = QIcon.fromTheme("list-remove")
+        removeButton = QPushButton(icon, "")
+        removeButton.clicked.connect(self._removeSelected)
+        removeButton.setToolTip("Remove selected jobs which are not running")
+
+        icon = QIcon.fromTheme("media-optical")
+        ripAllButton = QPushButton(icon, "Rip all drives")
+        ripAllButton.clicked.connect(self.requestRipAll)
+        ripAllButton.setToolTip("Queue the main title of the DVD in each drive, and start the queue")
+
+        self.policyBox = QComboBox()
+        for policy, description in JobQueue.POLICIES.items():
+            self.policyBox.addItem(description, policy)
+        self.policyBox.currentIndexChanged.connect(
+            lambda idx: self._setPolicy(self.policyBox.itemData(idx)))
+        self.policyBox.setToolTip("Order to run waiting jobs in, using times from the job history")
+
+        self.encodePriorityBox = QComboBox()
+        for name, policy in self.encodePriorities.items():
+            self.encodePriorityBox.addItem(name, policy)
+        self.encodePriorityBox.currentIndexChanged.connect(
+            lambda idx: self.queue.setStagePolicy("encode", self.encodePriorityBox.itemData(idx)))
+        self.encodePriorityBox.setToolTip("CPU and I/O priority of encodes, including the running encode")
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(self.startButton)
+        buttonLayout.addWidget(removeButton)
+        buttonLayout.addWidget(ripAllButton)
+        buttonLayout.addStretch()
+        buttonLayout.addWidget(self.encodePriorityBox)
+        buttonLayout.addWidget(self.policyBox)
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Job", "Status", "ETA"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        tableLayout = QVBoxLayout()
+        tableLayout.addLayout(buttonLayout)
+        tableLayout.addWidget(self.table)
+        tableWidget = QWidget()
+        tableWidget.setLayout(tableLayout)
+
+        self.encodeWidget = CmdWidget(logName="queue-encode")
+        self.ripWidgets = {}
+
+        self.cmdView = QTabWidget()
+        self.cmdView.addTab(self.encodeWidget, "Encode")
+
+        self.addWidget(tableWidget)
+        self.addWidget(self.cmdView)
+
+        self._connectStage(self.queue.encodeStage, self.encodeWidget)
+        self.queue.ripStageAdded.connect(self._addRipStage)
+        for stage in self.queue.ripStages.values():
+            self._addRipStage(stage)
+
+        self.queue.jobChanged.connect(self._updateJob)
+        self.queue.jobRemoved.connect(self._removeJob)
+
+    def _connectStage(self, stage, widget):
+        widget.requestRun.connect(self.start)
+        widget.requestPause.connect(stage.setPaused)
+        widget.requestCancel.connect(stage.cancel)
+        stage.stdout.connect(widget.appendText)
+        stage.progress.connect(widget.setProgress)
+        stage.cmdStarted.connect(widget.setCmd)
+        stage.jobStarted.connect(lambda job, w=widget: w.setRunning())
+        stage.jobFinished.connect(lambda job, success, w=widget: w.setRunComplete())
+
+    def _addRipStage(self, stage):
+        """ Add a tab showing the output of rip `stage` """
+        name = stage.name.replace("rip", "", 1).strip()
+        widget = CmdWidget(logName=f"queue-rip-{os.path.basename(name)}" if name else "queue-rip")
+        self._connectStage(stage, widget)
+        self.ripWidgets[stage] = widget
+        # rip tabs go before the encode tab
+        index = len(self.ripWidgets) - 1
+        self.cmdView.insertTab(index, widget, f"Rip {name}" if name else "Rip")
+
+    def addJob(self, job):
+        """ Add :class:`Job` to the queue """
+        self.queue.addJob(job)
+
+    def start(self):
+        """ Start processing the queue """
+        self.startButton.setChecked(True)
+
+    def _setRunning(self, running):
+        if running:
+            self.queue.start()
+            self.startButton.setIcon(QIcon.fromTheme("media-playback-pause"))
+            self.startButton.setToolTip("Stop starting new jobs")
+        else:
+            self.queue.stop()
+            self.startButton.setIcon(QIcon.fromTheme("media-playback-start"))
+            self.startButton.setToolTip("Start processing the queue")
+
+    def _setPolicy(self, policy):
+        self.queue.setPolicy(policy)
+        self._updateEtas()
+
+    def _updateJob(self, job):
+        if job not in self._rows:
+            row = len(self._rows)
+            self._rows.append(job)
+            self.table.insertRow(row)
+            self.table.setItem(row, 0, QTableWidgetItem(job.name))
+            self.table.setItem(row, 1, QTableWidgetItem())
+            self.table.setItem(row, 2, QTableWidgetItem())
+        else:
+            row = self._rows.index(job)
+        self.table.item(row, 1).setText(job.status)
+        self._updateEtas()
+
+    def _updateEtas(self):
+        """ Show the estimated finish time of each job """
+        finish = self.queue.finishTimes()
+        for row, job in enumerate(self._rows):
+            if job.status in JobQueue.FINISHED:
+                text = ""
+            elif (t := finish.get(job)) is None:
+                text = "?"
+            else:
+                text = time.strftime("%H:%M", time.localtime(t))
+            self.table.item(row, 2).setText(text)
+
+    def _removeJob(self, job):
+        row = self._rows.index(job)
+        self._rows.pop(row)
+        self.table.removeRow(row)
+
+    def _removeSelected(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True)
+        jobs = [self._rows[row] for row in rows]
+        for job in jobs:
+            self.queue.removeJob(job)
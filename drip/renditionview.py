@@ -0,0 +1,157 @@
+from qtpy.QtWidgets import (QTableView, QStyledItemDelegate, QLineEdit, QSpinBox, QComboBox,
+                            QHeaderView, QAbstractItemView)
+from qtpy.QtCore import Qt, QAbstractTableModel, QModelIndex, QRegularExpression, Signal
+from qtpy.QtGui import QRegularExpressionValidator
+from . import autotune
+
+class RenditionModel(QAbstractTableModel):
+    """ Table model of :class:`Rendition` objects, the extra outputs of an encode
+
+        Every column can be edited. Streams are given as a comma-separated
+        list of stream numbers, or left blank for all of the selected streams.
+    """
+
+    renditionsChanged = Signal()
+    """ **signal** renditionsChanged()
+
+        Emitted when a rendition is added, removed or edited
+    """
+
+    columns = ["Output", "CRF", "Preset", "Height", "Streams"]
+
+    def __init__(self, parent=None, mainOutname="output.mkv"):
+        super().__init__(parent)
+        self.renditions = []
+        self.mainOutname = mainOutname
+
+    def addRendition(self, rendition):
+        row = len(self.renditions)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.renditions.append(rendition)
+        self.endInsertRows()
+        self.renditionsChanged.emit()
+
+    def removeRendition(self, row):
+        if not 0 <= row < len(self.renditions):
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.renditions.pop(row)
+        self.endRemoveRows()
+        self.renditionsChanged.emit()
+
+    def uniqueName(self, outname=None):
+        """ Return output name, based on `outname`, which isn't used by any other output """
+        if outname is None:
+            outname = self.mainOutname
+        names = {rendition.outname for rendition in self.renditions} | {outname, self.mainOutname}
+        stem, ext = outname.rsplit(".", 1) if "." in outname else (outname, "mkv")
+        num = 2
+        while f"{stem}-{num}.{ext}" in names:
+            num += 1
+        return f"{stem}-{num}.{ext}"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.renditions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        rendition = self.renditions[index.row()]
+        column = index.column()
+        if column == 0:
+            return rendition.outname
+        if column == 1:
+            return rendition.crf
+        if column == 2:
+            return rendition.preset or ""
+        if column == 3:
+            if role == Qt.EditRole:
+                return rendition.height or 0
+            return str(rendition.height) if rendition.height else "source"
+        if rendition.streams is None:
+            return "" if role == Qt.EditRole else "selected"
+        return ", ".join(rendition.streams)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        rendition = self.renditions[index.row()]
+        column = index.column()
+        if column == 0:
+            value = value.strip()
+            # each output needs its own file
+            others = {r.outname for r in self.renditions if r is not rendition} | {self.mainOutname}
+            if not value or value in others:
+                return False
+            rendition.outname = value
+        elif column == 1:
+            rendition.crf = int(value)
+        elif column == 2:
+            rendition.preset = value or None
+        elif column == 3:
+            # libx264 needs an even height
+            height = int(value)
+            rendition.height = height - height % 2 or None
+        else:
+            streams = [num.strip() for num in value.split(",") if num.strip()]
+            rendition.streams = streams or None
+        self.dataChanged.emit(index, index, [role])
+        self.renditionsChanged.emit()
+        return True
+
+class RenditionDelegate(QStyledItemDelegate):
+    """ Delegate to edit the columns of a :class:`RenditionModel` """
+
+    def createEditor(self, parent, option, index):
+        column = index.column()
+        if column == 1:
+            editor = QSpinBox(parent)
+            editor.setRange(0, 51)
+        elif column == 2:
+            editor = QComboBox(parent)
+            editor.addItems(autotune.PRESETS)
+        elif column == 3:
+            editor = QSpinBox(parent)
+            editor.setRange(0, 4320)
+            editor.setSingleStep(2)
+            editor.setSpecialValueText("source")
+        else:
+            editor = QLineEdit(parent)
+            if column == 4:
+                editor.setValidator(QRegularExpressionValidator(QRegularExpression("[0-9:, ]*"), editor))
+        return editor
+
+class RenditionView(QTableView):
+    """ View of a :class:`RenditionModel` """
+
+    def __init__(self, model=None):
+        super().__init__()
+        if model is None:
+            model = RenditionModel(self)
+        self.setModel(model)
+        self._delegate = RenditionDelegate(self)
+        self.setItemDelegate(self._delegate)
+
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+                             | QAbstractItemView.SelectedClicked)
+        self.setWordWrap(False)
+        self.verticalHeader().hide()
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(4, QHeaderView.Stretch)
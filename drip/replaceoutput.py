@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run an encode to a temporary file, then atomically replace its output with it.
+
+The command should be given after '--', and its last argument should be the
+output path. The command is run with its output in a hidden temporary file in
+the same directory, which is moved over the real output with `os.replace` only
+if the command succeeds. Until then, any existing output (e.g. a quick remux)
+stays playable.
+
+With `--idle`, the command is run at idle CPU and I/O priority, so it only
+uses resources that nothing else wants.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+
+def tempPath(outpath):
+    """ Return hidden temporary path for `outpath`, with the same extension """
+    head, tail = os.path.split(outpath)
+    stem, ext = os.path.splitext(tail)
+    return os.path.join(head, f".{stem}.partial{ext}")
+
+def setIdlePriority():
+    """ Set idle CPU scheduling (or lowest niceness) for this process and its children """
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (AttributeError, OSError):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+
+def idleIoCmd(cmd):
+    """ Return `cmd` run with the idle I/O scheduling class, if `ionice` is available """
+    if shutil.which("ionice") is None:
+        return cmd
+    return ["ionice", "-c", "3"] + cmd
+
+def run(cmd, idle=False):
+    """ Run `cmd` to a temporary file and move it over the output. Returns returncode. """
+    outpath = cmd[-1]
+    tmp = tempPath(outpath)
+    if os.path.isfile(tmp):
+        # left by an interrupted run
+        os.remove(tmp)
+    cmd = cmd[:-1] + [tmp]
+    if idle:
+        setIdlePriority()
+        cmd = idleIoCmd(cmd)
+    print(" ".join(cmd), flush=True)
+    process = subprocess.Popen(cmd)
+
+    def terminate(signum, frame):
+        process.terminate()
+    signal.signal(signal.SIGTERM, terminate)
+
+    rc = process.wait()
+    if rc != 0:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        return rc
+    os.replace(tmp, outpath)
+    print(f"Replaced {outpath}", flush=True)
+    return 0
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--" not in argv:
+        print("Command should be given after '--'", file=sys.stderr)
+        return 2
+    idx = argv.index("--")
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--idle", action="store_true", help="Run at idle CPU and I/O priority")
+    args = parser.parse_args(argv[:idx])
+    cmd = argv[idx+1:]
+    if not cmd:
+        print("No command given", file=sys.stderr)
+        return 2
+    return run(cmd, idle=args.idle)
+
+if __name__ == '__main__':
+    sys.exit(main())
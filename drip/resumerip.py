@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rip a DVD title with dvdbackup in chapter chunks, so an interrupted rip can
+be resumed.
+
+Each chunk of chapters is ripped to its own directory, and marked as done when
+dvdbackup finishes successfully. When run again with the same arguments,
+chunks which are already done are skipped, so only the missing chapters are
+read from the disc. When all chunks are done, their VOBs are moved into the
+title's VIDEO_TS directory, in the same layout as `dvdbackup -t`.
+
+DVD names (volume IDs) are often generic, e.g. 'DVD_VIDEO', so if the disc's
+`--fingerprint` is given, it is written to the chunk directory and the done
+marker. Chunks and marks left by a different disc with the same name are
+discarded rather than reused.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+
+_vobRe = re.compile(r"VTS_(?P<titleset>\d\d)_(?P<part>\d+)\.VOB$", re.IGNORECASE)
+
+def chunks(numChapters, chunkChapters=1):
+    """ Return list of (start, end) chapter ranges """
+    if not numChapters:
+        return [(None, None)]
+    return [(start, min(start + chunkChapters - 1, numChapters))
+            for start in range(1, numChapters + 1, chunkChapters)]
+
+def chunkName(start, end):
+    if start is None:
+        return "all"
+    return f"ch{start:03d}-{end:03d}"
+
+def partsPath(outdir, name, title):
+    """ Return directory where chunks of `title` are ripped """
+    return os.path.join(outdir, name, f".title{title}.parts")
+
+def donePath(outdir, name, title):
+    """ Return path of the file marking `title` as completely ripped """
+    return os.path.join(outdir, name, "VIDEO_TS", f".title{title}.done")
+
+def _readFingerprint(path):
+    """ Return fingerprint written to file `path`, or None if it can't be read """
+    try:
+        with open(path) as fileobj:
+            return fileobj.read().strip()
+    except OSError:
+        return None
+
+def _writeFingerprint(path, fingerprint):
+    with open(path, "w") as fileobj:
+        if fingerprint is not None:
+            fileobj.write(fingerprint)
+
+def chunkVobs(path):
+    """ Return list of (title set, path) of VOBs ripped in chunk directory `path`, in order """
+    vobDir = os.path.join(path, "VIDEO_TS")
+    vobs = []
+    for fname in os.listdir(vobDir):
+        if (m := _vobRe.match(fname)) is not None and int(m.group('part')) > 0:
+            vobs.append((int(m.group('titleset')), int(m.group('part')), os.path.join(vobDir, fname)))
+    return [(ts, p) for ts, _, p in sorted(vobs)]
+
+def ripChunk(device, partsDir, title, start, end, extraArgs):
+    """ Rip chapters `start` to `end` of `title`. Returns dvdbackup's returncode. """
+    name = chunkName(start, end)
+    chunkDir = os.path.join(partsDir, name)
+    if os.path.exists(chunkDir):
+        # partial output of an interrupted rip
+        shutil.rmtree(chunkDir)
+    cmd = ["dvdbackup", "-i", device, "-o", partsDir, "-n", name, "-t", str(title)]
+    if start is not None:
+        cmd += ["-s", str(start), "-e", str(end)]
+    cmd += extraArgs
+    print(" ".join(cmd), flush=True)
+    try:
+        rc = subprocess.run(cmd).returncode
+    except BaseException:
+        # cancelled; chapters already ripped are kept
+        shutil.rmtree(chunkDir, ignore_errors=True)
+        raise
+    if rc == 0:
+        open(chunkDir + ".done", "w").close()
+    else:
+        shutil.rmtree(chunkDir, ignore_errors=True)
+    return rc
+
+def assemble(partsDir, names, vobDir, title):
+    """ Move ripped VOBs from chunk directories `names` into `vobDir` """
+    os.makedirs(vobDir, exist_ok=True)
+    vobs = [vob for name in names for vob in chunkVobs(os.path.join(partsDir, name))]
+    for titleSet in {ts for ts, _ in vobs}:
+        # remove parts of a previous rip of this title set, so they aren't concatenated
+        for fname in os.listdir(vobDir):
+            if (m := _vobRe.match(fname)) is not None and int(m.group('titleset')) == titleSet \
+                    and int(m.group('part')) > 0:
+                os.remove(os.path.join(vobDir, fname))
+    for part, (titleSet, path) in enumerate(vobs, start=1):
+        os.replace(path, os.path.join(vobDir, f"VTS_{titleSet:02d}_{part}.VOB"))
+    # keep the IFO and BUP files from the first chunk
+    firstDir = os.path.join(partsDir, names[0], "VIDEO_TS")
+    for fname in os.listdir(firstDir):
+        if fname.upper().endswith((".IFO", ".BUP")):
+            os.replace(os.path.join(firstDir, fname), os.path.join(vobDir, fname))
+
+def rip(device, outdir, name, title, numChapters=None, chunkChapters=1, extraArgs=(),
+        fingerprint=None):
+    """ Rip `title` to `outdir`/`name`/VIDEO_TS, resuming any previous rip. Returns returncode.
+
+        If the disc's `fingerprint` is given, a previous rip is only used if
+        it was of the same disc.
+    """
+    vobDir = os.path.join(outdir, name, "VIDEO_TS")
+    done = donePath(outdir, name, title)
+    if os.path.exists(done):
+        if fingerprint is None or _readFingerprint(done) == fingerprint:
+            print(f"Title {title} has already been ripped to {vobDir}", flush=True)
+            return 0
+        print(f"Title {title} in {vobDir} was ripped from a different disc; ripping again",
+              flush=True)
+        os.remove(done)
+    partsDir = partsPath(outdir, name, title)
+    fpPath = os.path.join(partsDir, "fingerprint")
+    if fingerprint is not None and os.path.isdir(partsDir) and _readFingerprint(fpPath) != fingerprint:
+        print("Discarding chapters ripped from a different disc", flush=True)
+        shutil.rmtree(partsDir)
+    os.makedirs(partsDir, exist_ok=True)
+    if fingerprint is not None:
+        _writeFingerprint(fpPath, fingerprint)
+    ranges = chunks(numChapters, chunkChapters)
+    names = [chunkName(start, end) for start, end in ranges]
+    for n, ((start, end), chunk) in enumerate(zip(ranges, names), start=1):
+        what = "all chapters" if start is None else f"chapters {start}-{end}"
+        if os.path.exists(os.path.join(partsDir, chunk + ".done")):
+            print(f"Skipping {what} ({n}/{len(ranges)}): already ripped", flush=True)
+            continue
+        print(f"Ripping {what} ({n}/{len(ranges)})", flush=True)
+        if (rc := ripChunk(device, partsDir, title, start, end, list(extraArgs))) != 0:
+            print(f"Rip of {what} failed; run again to resume", flush=True)
+            return rc
+    assemble(partsDir, names, vobDir, title)
+    shutil.rmtree(partsDir)
+    _writeFingerprint(done, fingerprint)
+    return 0
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    extraArgs = []
+    if "--" in argv:
+        idx = argv.index("--")
+        argv, extraArgs = argv[:idx], argv[idx+1:]
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("device")
+    parser.add_argument("outdir")
+    parser.add_argument("title", type=int)
+    parser.add_argument("-n", "--name", required=True, help="DVD name")
+    parser.add_argument("-c", "--chapters", type=int,
+                        help="Number of chapters in the title. If not given, the title is ripped in one chunk.")
+    parser.add_argument("--chunk-chapters", type=int, default=1, help="Number of chapters per chunk")
+    parser.add_argument("--fingerprint", help="Disc fingerprint, to check that a previous rip was of this disc")
+    args = parser.parse_args(argv)
+
+    # SIGTERM from the process manager should stop dvdbackup too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    return rip(args.device, args.outdir, args.name, args.title, args.chapters,
+               args.chunk_chapters, extraArgs, args.fingerprint)
+
+if __name__ == '__main__':
+    sys.exit(main())
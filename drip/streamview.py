@@ -0,0 +1,130 @@
+from qtpy.QtWidgets import (QTableView, QStyledItemDelegate, QLineEdit, QHeaderView,
+                            QAbstractItemView)
+from qtpy.QtCore import Qt, QAbstractTableModel, QModelIndex, QRegularExpression, Signal
+from qtpy.QtGui import QRegularExpressionValidator
+from .discinfo import languageName
+
+class StreamModel(QAbstractTableModel):
+    """ Table model of :class:`StreamInfo` objects
+
+        The first column can be checked to select a stream, and the language
+        and title of audio and subtitle streams can be edited.
+    """
+
+    streamChanged = Signal(object)
+    """ **signal** streamChanged(StreamInfo stream)
+
+        Emitted when a stream is (de)selected or its metadata is edited
+    """
+
+    columns = ["Stream", "Language", "Title"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.streams = []
+
+    def setStreams(self, streams):
+        """ Replace the streams in the model with `streams`
+
+            Audio and subtitle streams are given language and title metadata,
+            from the stream's language tag (or English), with the language's
+            name as the title.
+        """
+        self.beginResetModel()
+        self.streams = list(streams)
+        for stream in self.streams:
+            if self._hasMetadata(stream) and not stream.hasMetadata:
+                language = stream.language or "eng"
+                stream.setMetadata(language=language, title=languageName(language))
+        self.endResetModel()
+
+    def clear(self):
+        self.setStreams([])
+
+    @staticmethod
+    def _hasMetadata(stream):
+        return stream.stype in ['audio', 'subtitle']
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.streams)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        elif self._hasMetadata(self.streams[index.row()]):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        stream = self.streams[index.row()]
+        column = index.column()
+        if column == 0:
+            if role == Qt.DisplayRole or role == Qt.ToolTipRole:
+                return stream.label
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if stream.selected else Qt.Unchecked
+        elif role in (Qt.DisplayRole, Qt.EditRole) and self._hasMetadata(stream):
+            key = "language" if column == 1 else "title"
+            return stream.metadata.get(key, "")
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        stream = self.streams[index.row()]
+        column = index.column()
+        if column == 0 and role == Qt.CheckStateRole:
+            stream.selected = Qt.CheckState(value) == Qt.Checked
+        elif column > 0 and role == Qt.EditRole and self._hasMetadata(stream):
+            if column == 1:
+                stream.setMetadataLanguage(value)
+            else:
+                stream.setMetadataTitle(value)
+        else:
+            return False
+        self.dataChanged.emit(index, index, [role])
+        self.streamChanged.emit(stream)
+        return True
+
+class LanguageDelegate(QStyledItemDelegate):
+    """ Delegate to edit ISO 639-2 language codes """
+
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setValidator(QRegularExpressionValidator(QRegularExpression("[a-z]{0,3}"), editor))
+        return editor
+
+class StreamView(QTableView):
+    """ View of a :class:`StreamModel` """
+
+    def __init__(self, model=None):
+        super().__init__()
+        if model is None:
+            model = StreamModel(self)
+        self.setModel(model)
+        self._languageDelegate = LanguageDelegate(self)
+        self.setItemDelegateForColumn(1, self._languageDelegate)
+
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+                             | QAbstractItemView.SelectedClicked)
+        self.setWordWrap(False)
+        self.verticalHeader().hide()
+        # fixed row heights, so the view doesn't measure every row
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.resizeSection(1, self.fontMetrics().horizontalAdvance("Language") + 16)
@@ -1,37 +1,189 @@
-from qtpy.QtCore import QObject, Signal, Slot
-import subprocess
+from qtpy.QtCore import QObject, Signal
+from .processmanager import getManager, stagePolicy
+from .commands import resourcesFor, stageFor, partialOutputs
+import os
 
-class SubprocessWorker(QObject):
-    processComplete = Signal()
+class ProcessRunner(QObject):
+    """ Run commands with the shared :class:`ProcessManager`
+    
+        Commands wait in the manager's queue until their resources are 
+        available. If `resources` is not given, they are found for each command 
+        by :func:`commands.resourcesFor`. Output is emitted in batches of lines; carriage returns 
+        are treated as line endings.
+        
+        If `progressParser` is given, lines of output it recognises are
+        passed to it instead of being emitted as `stdout`, and any
+        progress objects it returns are emitted as `progress`.
+        
+        Commands are run with :class:`ResourcePolicy` `policy`, or the 
+        default policy for their stage if it is None.
+        
+        The running command can be paused and resumed, and while the runner is
+        paused, new commands are paused as soon as they start. If a command is
+        cancelled, any partial output it wrote (see :func:`commands.partialOutputs`)
+        is removed.
+        
+        Other kwargs are passed to `subprocess.Popen`.
+    """
+    
+    started = Signal()
+    """ **signal** started() 
+    
+        Emitted when a command is submitted
+    """
+    
+    finished = Signal()
+    """ **signal** finished() 
+    
+        Emitted when a command has finished or been cancelled
+    """
     
     stdout = Signal(str)
+    """ **signal** stdout(str text) 
+    
+        Output from the command
+    """
+    
+    output = Signal(list)
+    """ **signal** output(list lines) 
+    
+        Lines of output from the command itself, without the echoed command 
+        and status messages which are included in `stdout`
+    """
+    
+    progress = Signal(object)
+    """ **signal** progress(object progress) 
+    
+        Progress from the command, if a `progressParser` was given
+    """
+    
+    metrics = Signal(object)
+    """ **signal** metrics(ProcessMetrics metrics) 
     
-    def __init__(self, cmd=None, **kwargs):
+        Wall time, I/O, CPU and memory use of the command, emitted when it finishes
+    """
+    
+    def __init__(self, progressParser=None, resources=None, manager=None, policy=None, **kwargs):
         super().__init__()
-        self.cmd = cmd
+        self.progressParser = progressParser
+        self.resources = resources
+        self.policy = policy
+        self._manager = manager
+        self._kwargs = kwargs
         self.process = None
-        self.pkwargs = kwargs
+        self.paused = False
+        self._returncode = None
+        
+    @property
+    def manager(self):
+        if self._manager is None:
+            self._manager = getManager()
+        return self._manager
+        
+    @property
+    def returncode(self):
+        """ Return code of the last command, or None """
+        return self._returncode
+    
+    @property
+    def running(self):
+        """ True if a command is queued or running """
+        return self.process is not None and self.process.state in ("queued", "starting", "running")
+        
+    def start(self, cmd, resources=None):
+        """ Submit `cmd` to the process manager
+        
+            If `resources` are given, they are used instead of this runner's `resources`.
+        """
+        if resources is None:
+            resources = self.resources if self.resources is not None else resourcesFor(cmd)
+        self._returncode = None
+        self.process = self.manager.submit(cmd, resources, onStarted=self._processStarted,
+                                           onOutput=self._output, onFinished=self._processFinished,
+                                           stage=stageFor(cmd), policy=self.policy, **self._kwargs)
+        self.started.emit()
+        if self.manager.isWaiting(self.process):
+            self.stdout.emit(f"Waiting for {', '.join(resources)}")
+        
+    def setPolicy(self, policy):
+        """ Set the :class:`ResourcePolicy` for commands, including the current one 
+        
+            If `policy` is None, the default policy for each command's stage is used.
+        """
+        self.policy = policy
+        if self.process is not None:
+            if policy is None:
+                policy = stagePolicy(self.process.stage)
+            self.manager.setPolicy(self.process, policy)
         
-    def start(self):
-        if self.cmd is None:
-            return self._finished()
+    def setPaused(self, paused):
+        """ Pause (with SIGSTOP) or resume (with SIGCONT) the current command """
+        self.paused = paused
+        if self.process is None:
+            return None
+        if paused and self.manager.pause(self.process):
+            self.stdout.emit("Paused")
+        elif not paused and self.manager.resume(self.process):
+            self.stdout.emit("Resumed")
         
+    def cancel(self):
+        """ Cancel the current command, whether it is queued or running """
+        if self.process is not None:
+            self.manager.cancel(self.process)
+        
+    def connectCmdWidget(self, cmdWidget):
+        """ Show output and running state in `cmdWidget`, and pause or cancel from it """
+        self.stdout.connect(cmdWidget.appendText)
+        self.progress.connect(cmdWidget.setProgress)
+        self.started.connect(cmdWidget.setRunning)
+        self.finished.connect(cmdWidget.setRunComplete)
+        cmdWidget.requestPause.connect(self.setPaused)
+        cmdWidget.requestCancel.connect(self.cancel)
+        
+    # the methods below are called from the manager's thread; signals are 
+    # queued to receivers in the GUI thread
+        
+    def _processStarted(self, process):
         # echo command
-        self.stdout.emit(" ".join(self.cmd))
-        
-        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                        **self.pkwargs)
-        while True:
-            line = self.process.stdout.readline()
-            if not line:
-                break
-            self.stdout.emit(line.decode().rstrip())
-        rc = self.process.wait()
-        self.stdout.emit(f"Completed with returncode {rc}")
-        self._finished()
-        
-    @Slot()
-    def _finished(self):
-        self.process = None
-        self.cmd = None
-        self.processComplete.emit()
\ No newline at end of file
+        self.stdout.emit(" ".join(process.cmd))
+        if self.paused and self.manager.pause(process):
+            self.stdout.emit("Paused")
+        
+    def _output(self, lines):
+        self.output.emit(lines)
+        if self.progressParser is not None:
+            text = []
+            for line in lines:
+                progress = self.progressParser.feed(line)
+                if progress is not None:
+                    self.progress.emit(progress)
+                if not self.progressParser.isProgressLine(line):
+                    text.append(line)
+            lines = text
+        if lines:
+            self.stdout.emit("\n".join(lines))
+        
+    def _processFinished(self, process):
+        self._returncode = process.returncode
+        if process.metrics is not None:
+            self.stdout.emit(str(process.metrics))
+            self.metrics.emit(process.metrics)
+        if process.state == "cancelled":
+            if process.metrics is not None:
+                self._removePartialOutputs(process)
+            self.stdout.emit("Cancelled")
+        elif process.returncode is not None:
+            self.stdout.emit(f"Completed with returncode {process.returncode}")
+        self.finished.emit()
+        
+    def _removePartialOutputs(self, process):
+        """ Remove output files written by cancelled `process` """
+        for path in partialOutputs(process.cmd):
+            try:
+                # leave files the process didn't write to
+                if os.path.getmtime(path) < process.metrics.start:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            self.stdout.emit(f"Removed partial output {path}")
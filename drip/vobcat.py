@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concatenate the *.VOB files of a DVD title, without a shell.
+
+Data is copied in the kernel with `copy_file_range` (or `sendfile`) where
+available, in large chunks, and progress is written to stdout.
+
+This module does not import anything else from drip, so it can be run as a
+script by path.
+"""
+import argparse
+import hashlib
+import os
+import re
+import signal
+import sys
+import tempfile
+import time
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+_vobRe = re.compile(r"VTS_(?P<titleset>\d\d)_(?P<part>\d+)\.VOB$", re.IGNORECASE)
+
+def titleVobs(path, titleSet=None):
+    """ Return list of title VOBs in `path`, in playback order
+
+        Menu VOBs (VIDEO_TS.VOB and VTS_xx_0.VOB) are left out. If `titleSet`
+        is not given and `path` contains more than one title set, the title set
+        with the most data is used.
+    """
+    sets = {}
+    for name in os.listdir(path):
+        if (m := _vobRe.match(name)) is None:
+            continue
+        ts, part = int(m.group('titleset')), int(m.group('part'))
+        if part == 0:
+            continue
+        sets.setdefault(ts, []).append((part, os.path.join(path, name)))
+
+    if not sets:
+        return []
+    if titleSet is None:
+        titleSet = max(sets, key=lambda ts: sum(os.path.getsize(p) for _, p in sets[ts]))
+    return [p for _, p in sorted(sets.get(int(titleSet), []))]
+
+def inputUrl(path, titleSet=None):
+    """ Return ffmpeg input for `path`
+
+        If `path` is a directory containing title VOBs, return a 'concat:' URL,
+        so ffmpeg can read the VOBs directly without writing an intermediate
+        file (or a 'concatf:' URL, if a path contains '|'; this needs ffmpeg 
+        5.0 or later). Otherwise, return `path` unchanged.
+    """
+    if not os.path.isdir(path) or not (paths := titleVobs(path, titleSet)):
+        return path
+    if any("|" in p for p in paths):
+        return "concatf:" + _concatList(paths)
+    return "concat:" + "|".join(paths)
+
+def _concatDir():
+    """ Return (and create) the user's cache directory for concat lists, as :func:`paths.cacheDir` """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "drip", "concat")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+def _concatList(paths):
+    """ Write `paths` to a list file for ffmpeg's 'concatf:' protocol, and return its path
+
+        'concat:' URLs are split at '|', which can be in a DVD's name. The 
+        list is written to the user's cache directory (not the shared 
+        temporary directory), named from a hash of its contents. It is 
+        always rewritten, through a new temporary file, rather than trusting 
+        an existing file.
+    """
+    text = "".join(f"file:{os.path.abspath(p)}\n" for p in paths)
+    listDir = _concatDir()
+    listPath = os.path.join(listDir, f"{hashlib.sha1(text.encode()).hexdigest()[:16]}.txt")
+    fd, tmpPath = tempfile.mkstemp(dir=listDir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fileobj:
+            fileobj.write(text)
+        os.replace(tmpPath, listPath)
+    except BaseException:
+        os.remove(tmpPath)
+        raise
+    return listPath
+
+def formatSize(size):
+    """ Return human-readable string of `size` bytes """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+def _copy(src, dst, count):
+    """ Copy up to `count` bytes from fd `src` to fd `dst`. Returns number of bytes copied. """
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src, dst, count)
+        except OSError:
+            # e.g. EXDEV on older kernels, or unsupported filesystem
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            return os.sendfile(dst, src, None, count)
+        except OSError:
+            pass
+    data = os.read(src, count)
+    return os.write(dst, data) if data else 0
+
+def concatVobs(paths, outpath, chunkSize=CHUNK_SIZE, progress=None, cancelled=None):
+    """ Concatenate files in `paths` to `outpath`
+
+        `progress` will be called with args (bytes done, total bytes, bytes/s).
+        If `cancelled` is given, it will be called between chunks; if it returns
+        True, the partial output is removed and False is returned.
+    """
+    total = sum(os.path.getsize(p) for p in paths)
+    done = 0
+    t0 = time.monotonic()
+
+    with open(outpath, "wb") as fout:
+        out = fout.fileno()
+        try:
+            for path in paths:
+                with open(path, "rb") as fin:
+                    src = fin.fileno()
+                    while True:
+                        if cancelled is not None and cancelled():
+                            raise InterruptedError
+                        n = _copy(src, out, chunkSize)
+                        if n == 0:
+                            break
+                        done += n
+                        if progress is not None:
+                            elapsed = time.monotonic() - t0
+                            progress(done, total, done / elapsed if elapsed > 0 else 0)
+        except (InterruptedError, KeyboardInterrupt):
+            fout.close()
+            os.remove(outpath)
+            return False
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("path", help="Directory containing *.VOB files")
+    parser.add_argument("output", help="Output file")
+    parser.add_argument("-t", "--titleset", type=int, help="Title set to concatenate")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Number of bytes to copy at a time")
+    args = parser.parse_args(argv)
+
+    paths = titleVobs(args.path, args.titleset)
+    if not paths:
+        print(f"No title *.VOB files found in {args.path}", flush=True)
+        return 1
+    for path in paths:
+        print(f"{path} ({formatSize(os.path.getsize(path))})", flush=True)
+
+    # SIGTERM from the worker should clean up like ctrl-c
+    stop = False
+    def handler(signum, frame):
+        nonlocal stop
+        stop = True
+    signal.signal(signal.SIGTERM, handler)
+
+    last = 0
+    def progress(done, total, rate):
+        nonlocal last
+        now = time.monotonic()
+        if now - last >= 0.5 or done == total:
+            last = now
+            pc = 100 * done / total if total else 100
+            print(f"{formatSize(done)} / {formatSize(total)} ({pc:.1f}%) {formatSize(rate)}/s",
+                  flush=True)
+
+    ok = concatVobs(paths, args.output, chunkSize=args.chunk_size, progress=progress,
+                    cancelled=lambda: stop)
+    if not ok:
+        print("Cancelled", flush=True)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())